@@ -30,6 +30,10 @@ from ConfigParser import SafeConfigParser
 # Our libraries
 from lib import log
 from nosql.TSserver import server
+from nosql.TShash import Hash
+from nosql.TShll import HyperLogLog
+from nosql.TSbloom import BloomFilter
+from nosql.TSdb import DB
 
 
 # If we are running from the command line...
@@ -54,12 +58,15 @@ if __name__ == '__main__':
                         help="init file [default: %default]")
     parser.add_option("-r","--rdump",dest="dbfile",metavar="file",
                         help="binary dump file [default: %default]")
+    parser.add_option("-s","--single",dest="single",action="store_true",
+                        help="run saves, slave updates and expirations on the event loop instead of in threads [default: %default]")
     parser.set_defaults(dbfile="TSnosql-rdump.db")
     parser.set_defaults(initfile="MDB.TXT")
     parser.set_defaults(redis="localhost:6379")
     parser.set_defaults(debug=False)
     parser.set_defaults(homedir=".")
     parser.set_defaults(master=False)
+    parser.set_defaults(single=False)
     (options, args) = parser.parse_args()
 
     # Logging, if necessary and make it look nice.
@@ -84,9 +91,30 @@ if __name__ == '__main__':
         uc = config.get("general","updateCount")
         if uc:
             server.updateCount = uc
+        if config.has_option("general","outputLimit"):
+            server.outputLimit = config.getint("general","outputLimit")
+
+        # How big a hash, list, set or HyperLogLog can get before it is held in a
+        # dictionary, deque, set or bytearray.
+        if config.has_option("general","hashMaxEntries"):
+            Hash.maxEntries = config.getint("general","hashMaxEntries")
+        if config.has_option("general","hashMaxValue"):
+            Hash.maxValue = config.getint("general","hashMaxValue")
+        if config.has_option("general","hllSparseMaxEntries"):
+            HyperLogLog.maxSparse = config.getint("general","hllSparseMaxEntries")
+
+        # The size of a Bloom filter made by BF.ADD or BF.MADD, rather than BF.RESERVE.
+        if config.has_option("general","bloomCapacity"):
+            BloomFilter.defaultCapacity = config.getint("general","bloomCapacity")
+        if config.has_option("general","bloomErrorRate"):
+            BloomFilter.defaultErrorRate = config.getfloat("general","bloomErrorRate")
+        for opt in ("listMaxEntries","listMaxValue","setMaxEntries","setMaxValue","intsetMaxEntries"):
+            if config.has_option("general",opt):
+                setattr(DB,opt,config.getint("general",opt))
 
     # Create the caching server
-    mserver = server(ip=options.redis,master=options.master,initfile=options.initfile,dbfile=options.dbfile)
+    mserver = server(ip=options.redis,master=options.master,initfile=options.initfile,dbfile=options.dbfile,
+                        threaded=not options.single)
     mserver.ourIP = ourIP
 
     # Setup stuff for invoking log setup. We do this because if the TSnosql server fails we want
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+# Database micro-benchmark.
+#
+# Times some of the DB operations as the number of keys in the database grows, to
+# show the time an operation takes doesn't depend on the size of the keyspace. For
+# each size we fill database 0 up to that many keys and then time each operation
+# against it:
+#
+#   exists  - DB.defined() on an existing key
+#   get     - DB.get() of an existing key
+#   set     - DB.set() of an existing key
+#   getset  - DB.getset() of an existing key
+#   sadd    - DB.sadd() of a new member to a set
+#   lpop    - DB.lpop() from a list
+#
+# and print the time per operation in microseconds. At the end the time at the
+# largest size is compared with the time at the smallest; if an operation got more
+# than --slack times slower the benchmark exits with status 1.
+#
+#   python bench/dbbench.py                     1k to 10M keys (needs a couple of GB)
+#   python bench/dbbench.py -m 1000000 -s       1k to 1M keys, without the locks
+#
+import sys
+import os
+import time
+import random
+import gc
+from optparse import OptionParser
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","redis"))
+from TSdb import DB
+
+def fill(db,start,end):
+    # Add the keys start..end-1 to database 0.
+    d = db.db["0"]
+    for i in xrange(start,end):
+        d["key:%d" % i] = "value:%d" % i
+
+def timeit(func,args):
+    # Run func over each of the argument tuples, returning the time per call in
+    # microseconds.
+    t = time.time()
+    for a in args:
+        func(*a)
+    return (time.time() - t) * 1000000.0 / len(args)
+
+def run(db,size,ops):
+    # Time each operation against a database holding size keys.
+    keys = ["key:%d" % random.randrange(size) for i in xrange(ops)]
+    db.db["0"].pop("bench:set",None)
+    db.db["0"]["bench:list"] = ["x"] * ops
+    return [
+        ("exists", timeit(db.defined,[("0",k) for k in keys])),
+        ("get",    timeit(db.get,[("0",k) for k in keys])),
+        ("set",    timeit(db.set,[("0",k,"new") for k in keys])),
+        ("getset", timeit(db.getset,[("0",k,"newer") for k in keys])),
+        ("sadd",   timeit(db.sadd,[("0","bench:set",["m%d" % i]) for i in xrange(ops)])),
+        ("lpop",   timeit(db.lpop,[("0","bench:list")] * ops)),
+        ]
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-m","--max",dest="max",type="int",
+                        help="largest number of keys to try [default: %default]")
+    parser.add_option("-n","--ops",dest="ops",type="int",
+                        help="operations timed at each size [default: %default]")
+    parser.add_option("-s","--single",dest="single",action="store_true",
+                        help="use the database the way the single threaded server does, without locks [default: %default]")
+    parser.add_option("--slack",dest="slack",type="float",
+                        help="how many times slower an operation may get [default: %default]")
+    parser.set_defaults(max=10000000,ops=20000,single=False,slack=3.0)
+    (options,args) = parser.parse_args()
+
+    db = DB(os.devnull,threaded=not options.single)
+    db.flushAll()
+
+    # The collector only slows the filling down; nothing here makes cycles.
+    gc.disable()
+
+    sizes = []
+    size = 1000
+    while size <= options.max:
+        sizes.append(size)
+        size *= 10
+
+    results = []
+    have = 0
+    for size in sizes:
+        fill(db,have,size)
+        have = size
+        r = run(db,size,options.ops)
+        results.append(r)
+        print "%10d keys: " % size + "  ".join(["%s %.2fus" % (name,t) for name,t in r])
+        sys.stdout.flush()
+
+    # Compare the largest keyspace with the smallest.
+    rc = 0
+    for (name,first),(n,last) in zip(results[0],results[-1]):
+        ratio = last / first
+        flag = ""
+        if ratio > options.slack:
+            flag = "  ** grows with the keyspace"
+            rc = 1
+        print "%-7s %8.2fus -> %8.2fus  (x%.2f)%s" % (name,first,last,ratio,flag)
+    sys.exit(rc)
@@ -596,10 +596,9 @@ class nosql(object):
             Protocol::
                     Client to server:   KEYS <pattern>\\r\\n
 
-                    Server to client:   $<length of value>\\r\\n<value>\\r\\n
+                    Server to client:   *<No.entries>\\r\\n<key1>\\r\\n<key2>\\r\\n ...\\r\\n<keyN>\\r\\n
 
-                                        where <value> is a string with the format of
-                                        <key1> <key2> ... <keyN>
+                                        where each <keyN> is $<length of name>\\r\\n<name>
 
                                         -ERR <error message>\\r\\n
 
@@ -611,7 +610,7 @@ class nosql(object):
         try:
             self.lock.acquire()
             self._write('KEYS %s\r\n' % pattern)
-            rc = self.get_response().split()
+            rc = self.get_response()
         finally:
             self.lock.release()
         return rc
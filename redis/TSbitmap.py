@@ -0,0 +1,116 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from binascii import hexlify, unhexlify
+
+from TSexcept import ERR
+
+# Bitmaps.
+#
+# A bitmap is a string variable used as an array of bits: bit 0 is the high bit of the
+# first byte, bit 8 the high bit of the second, and so on. Once SETBIT changes one it is
+# held in a bytearray so the bit can be changed in place. To everything else it is still
+# a string: GET returns it and it is saved and sent to slaves the same way.
+#
+# Counting and combining bits is done a whole string at a time, without a Python loop
+# over the bytes:
+#
+#   - popcount() uses translate() to turn each byte into the number of bits set in it,
+#     then counts how many bytes have each of the nine possible values.
+#   - bitop() reads each string as one big number and lets Python's long integers do
+#     the AND, OR or XOR on all of it at once.
+#
+MAXOFFSET = 2**32 - 1
+
+# The number of bits set in each byte value, as a byte.
+BITCOUNT = "".join([chr(bin(i).count("1")) for i in xrange(256)])
+
+def parseOffset(s):
+    """
+    Return a bit offset given in a command.
+    """
+    try:
+        n = int(s)
+    except ValueError:
+        n = -1
+    if n < 0 or n > MAXOFFSET:
+        raise ERR("-ERR bit offset is not an integer or out of range")
+    return n
+
+def parseBit(s):
+    """
+    Return a bit value given in a command, which must be 0 or 1.
+    """
+    if s != "0" and s != "1":
+        raise ERR("-ERR bit is not an integer or out of range")
+    return int(s)
+
+def setbit(b,offset,bit):
+    """
+    Set a bit of the bytearray b, growing it with zero bytes if need be. Returns
+    the bit's old value.
+    """
+    i = offset >> 3
+    if i >= len(b):
+        b.extend("\0" * (i + 1 - len(b)))
+    mask = 0x80 >> (offset & 7)
+    old = 1 if b[i] & mask else 0
+    if bit:
+        b[i] |= mask
+    else:
+        b[i] &= ~mask
+    return old
+
+def getbit(s,offset):
+    """
+    Return a bit of the string (or bytearray) s. Bits past the end are 0.
+    """
+    i = offset >> 3
+    if i >= len(s):
+        return 0
+    c = s[i]
+    if type(c) is str:
+        c = ord(c)
+    return 1 if c & (0x80 >> (offset & 7)) else 0
+
+def popcount(s):
+    """
+    Return the number of bits set in the string (or bytearray) s.
+    """
+    t = s.translate(BITCOUNT)
+    n = 0
+    for k in xrange(1,9):
+        n += k * t.count(chr(k))
+    return n
+
+def bitop(op,values):
+    """
+    Return the AND, OR or XOR of the strings in values, or the NOT of the one
+    string in it. Shorter strings are taken as padded with zero bytes to the
+    length of the longest.
+    """
+    n = max([len(v) for v in values]) if values else 0
+    if n == 0:
+        return ""
+    nums = [int(hexlify(v) + "00" * (n - len(v)),16) for v in values]
+    if op == "not":
+        x = ~nums[0] & ((1 << 8*n) - 1)
+    else:
+        x = nums[0]
+        if op == "and":
+            for y in nums[1:]: x &= y
+        elif op == "or":
+            for y in nums[1:]: x |= y
+        else:
+            for y in nums[1:]: x ^= y
+    return unhexlify("%0*x" % (2*n,x))
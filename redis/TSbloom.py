@@ -0,0 +1,124 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from hashlib import md5
+from math import ceil, log
+from struct import unpack
+
+from TSexcept import ERR
+
+# Bloom filters.
+#
+# A Bloom filter answers "has this item been added?" with either "no" or "probably":
+# it can be wrong about an item that wasn't added, at a rate fixed when it is made,
+# but never about one that was. It takes a few bits an item however long the items
+# are, so a service can ask it before going to look something up that is most likely
+# not there.
+#
+# An item sets k bits in an array of m, both worked out from how many items the filter
+# is meant to hold and the error rate wanted. The k bit positions come from one MD5
+# digest of the item, split into two 64 bit numbers h1 and h2: position i is
+# h1 + i*h2, modulo m. They don't change from one run (or machine) to the next, so a
+# saved filter can go on being used.
+#
+# A filter can be no bigger than the longest string (512MB), MAXBITS bits.
+#
+MAXBITS = 512*1024*1024*8
+
+def parseErrorRate(s):
+    """
+    Return an error rate given in a command, which must be between 0 and 1.
+    """
+    try:
+        p = float(s)
+    except ValueError:
+        p = 0.0
+    if not 0.0 < p < 1.0:
+        raise ERR("-ERR error rate must be between 0 and 1")
+    return p
+
+def parseCapacity(s):
+    """
+    Return a capacity given in a command, which must be a positive integer.
+    """
+    try:
+        n = int(s)
+    except ValueError:
+        n = 0
+    if n <= 0:
+        raise ERR("-ERR capacity must be a positive integer")
+    return n
+
+class BloomFilter(object):
+    """
+    A Bloom filter of m bits, held in the bytearray bits, setting k of them for each
+    item. count is the number of items added that weren't already there (as far as
+    the filter could tell).
+    """
+    __slots__ = ("bits","m","k","count","capacity","errorRate")
+
+    # What a filter made by adding to a variable that doesn't exist is sized for.
+    # The server sets them from the config file.
+    defaultCapacity = 100
+    defaultErrorRate = 0.01
+
+    def __init__(self,capacity=None,errorRate=None):
+        self.capacity = capacity or self.defaultCapacity
+        self.errorRate = errorRate or self.defaultErrorRate
+
+        # The number of bits (rounded up to whole bytes) and hashes that give the
+        # error rate at full capacity.
+        ln2 = log(2)
+        m = int(ceil(-self.capacity * log(self.errorRate) / (ln2 * ln2)))
+        if m > MAXBITS:
+            raise ERR("-ERR capacity too large for the error rate")
+        self.m = (m + 7) & ~7
+        self.k = max(1,int(round(float(self.m) / self.capacity * ln2)))
+        self.bits = bytearray(self.m >> 3)
+        self.count = 0
+
+    def __getstate__(self):
+        return (str(self.bits),self.m,self.k,self.count,self.capacity,self.errorRate)
+
+    def __setstate__(self,state):
+        bits,self.m,self.k,self.count,self.capacity,self.errorRate = state
+        self.bits = bytearray(bits)
+
+    def __repr__(self):
+        return "<BloomFilter %d bits %d hashes>" % (self.m,self.k)
+
+    def _positions(self,item):
+        h1,h2 = unpack("<QQ",md5(item).digest())
+        m = self.m
+        return [(h1 + i*h2) % m for i in xrange(self.k)]
+
+    def add(self,item):
+        """
+        Add an item. Returns 1 if it wasn't there, 0 if it probably was.
+        """
+        bits = self.bits
+        rc = 0
+        for p in self._positions(item):
+            mask = 0x80 >> (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                rc = 1
+        self.count += rc
+        return rc
+
+    def __contains__(self,item):
+        bits = self.bits
+        for p in self._positions(item):
+            if not bits[p >> 3] & (0x80 >> (p & 7)):
+                return False
+        return True
@@ -11,7 +11,10 @@
 
 """
 
+import asyncore
+import logging
 import socket
+from collections import deque
 
 from TSexcept import ConnectionError, InvalidResponse, ResponseError
 
@@ -59,7 +62,7 @@ class SlaveComm:
 
     def replaceDB(self,version,pickle):
         self.connect()
-        self._write("REPLACEDB %d %d\r\n" % (version,len(pickle)) + pickle)
+        self._write("REPLACEDB %d %d\r\n" % (version,len(pickle)) + pickle + "\r\n")
         return self.get_response()
 
     def get_response(self):
@@ -121,3 +124,100 @@ class SlaveComm:
         else:
             self._sock = sock
             self._fp = self._sock.makefile('r')
+
+# The connection to a slave when the server runs single threaded.
+#
+# Sending a change to a slave with SlaveComm waits for the slave to answer, and on the
+# event loop's thread every client would wait with it. Once a slave has its copy of
+# the database, its socket is handed to a SlaveLink instead, which the loop runs like
+# any client connection: changes are queued and go out as the socket takes them, and
+# the slave's answers are read as they come in. An error from the slave (a version
+# mismatch, say) drops it, as it did before.
+#
+class SlaveLink(asyncore.dispatcher):
+    """
+    A slave's connection, run by the event loop. key is its (host,port) in the
+    server's remoteList.
+    """
+    def __init__(self, comm, server, key):
+        asyncore.dispatcher.__init__(self, comm._sock)
+        comm._sock = None
+        comm._fp = None
+        self.host = comm.host
+        self.port = comm.port
+        self.server = server
+        self.key = key
+        self.outq = deque()
+        self.outOffset = 0
+        self.outBytes = 0
+        self.inbuf = ""
+        self.closing = False
+
+    def write(self, s):
+        """
+        Queue a command for the slave, and send what the socket will take now.
+        """
+        self.outq.append(s)
+        self.outBytes += len(s)
+        if self.outBytes > self.server.outputLimit:
+            logging.log(logging.CRITICAL,"Slave %s:%s is too far behind" % (self.host,self.port))
+            self.drop()
+            return
+        self.handle_write()
+        if self.server.loop: self.server.loop.update(self)
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return self.outBytes > 0
+
+    def handle_write(self):
+        q = self.outq
+        while q:
+            s = q[0]
+            sent = self.send(buffer(s, self.outOffset))
+            if not sent:
+                break
+            self.outBytes -= sent
+            self.outOffset += sent
+            if self.outOffset < len(s):
+                break
+            q.popleft()
+            self.outOffset = 0
+        if self.closing and not q:
+            self.close()
+
+    def handle_read(self):
+        # Each command gets a one line answer: +OK, or -ERR and what went wrong.
+        data = self.recv(64*1024)
+        if not data:
+            return
+        lines = (self.inbuf + data).split("\r\n")
+        self.inbuf = lines.pop()
+        for line in lines:
+            if line[:1] == "-":
+                logging.log(logging.CRITICAL,"Failure in TSnosql slave - IP %s: %s" % (self.host,line))
+                self.drop()
+                return
+
+    def handle_close(self):
+        logging.log(logging.CRITICAL,"Lost connection to TSnosql slave - IP %s" % (self.host))
+        self.drop()
+
+    def drop(self):
+        # Close the connection and forget the slave.
+        self.close()
+        if self.server.remoteList.get(self.key) is self:
+            self.server.removeConnection(*self.key)
+
+    def disconnect(self):
+        self.close()
+
+    def closeWhenSent(self):
+        """
+        Close the connection once everything queued for the slave has gone out.
+        """
+        self.closing = True
+        if not self.outq:
+            self.close()
@@ -13,8 +13,52 @@
 
 import asyncore
 import logging
+import socket
+import time
+import cPickle as pickle
+from cStringIO import StringIO
+from collections import deque
+from itertools import islice
 
 from TSexcept import ERR
+from TScomm import SlaveComm
+from TSproto import RequestBuffer
+from TSreply import Reply, multiBulk, BIGVALUE
+from TSzset import parseScore, parseBound, formatScore
+from TSbitmap import parseOffset, parseBit
+from TSbloom import parseErrorRate, parseCapacity
+
+# Sending replies. Pieces of output smaller than SENDSIZE are gathered together into
+# one send(), so a lot of small replies don't each take a system call.
+SENDSIZE = 64*1024
+
+# The most pipelined GETs and SETs run as one batch, so one client can't hold a
+# database's lock for too long.
+BATCHMAX = 1000
+
+class Command(object):
+    """
+    Everything parse() needs to know about a command, so it is found with a single
+    lookup:
+
+        name    - the command name, in lower case
+        handler - the PyNoSql method that carries it out
+        arity   - the number of arguments it takes, or -1 if that varies
+        write   - True if the command changes the database; these are refused
+                  by a slave or a server shutting down
+        keyType - the type ("string", "list", "set", "zset", "hash", "hll" or
+                  "bloom") the variable named by the first argument must be, or
+                  None. parse() doesn't check it: the database does (DB.__check),
+                  under the lock it takes anyway, as the command runs.
+    """
+    __slots__ = ("name","handler","arity","write","keyType")
+
+    def __init__(self,name,handler,arity,write,keyType=None):
+        self.name = name
+        self.handler = handler
+        self.arity = arity
+        self.write = write
+        self.keyType = keyType
 
 # Actual per-connection server support
 class PyNoSql(asyncore.dispatcher):
@@ -24,7 +68,13 @@ class PyNoSql(asyncore.dispatcher):
     def __init__(self,sock,who,server,db):
         asyncore.dispatcher.__init__(self, sock=sock)
         self.IP = who
-        self.output = None
+
+        # Output not yet sent to the client: a queue of string pieces, how far into
+        # the first one we have sent and the number of bytes still to go.
+        self.outq = deque()
+        self.outOffset = 0
+        self.outBytes = 0
+        self.request = RequestBuffer(self.bulkCmds)
         self.server = server
         self.closeFlag = False
         self.master = server.master
@@ -90,10 +140,9 @@ class PyNoSql(asyncore.dispatcher):
             $<len>\r\n<value>, if it does exist.
 
         """
-        ret = "*%d" % len(parts)
-        for i in parts:
-            ret = ret + "\r\n"
-            ret += self.getFunc([i])
+        ret = Reply().header(len(parts))
+        for v in self.db.batch(self.whichdb,[("get",i) for i in parts]):
+            ret.bulk(v if type(v) is str else None)
         return ret
 
     def getset(self,parts,wdb=None,q=True):
@@ -136,11 +185,43 @@ class PyNoSql(asyncore.dispatcher):
 
             Returns :1\r\n if the operation worked, otherwise :0\r\n.
         """
-        rc = ":0"
-        if not self.db.defined(self.whichdb,parts[0]):
-            if self.setFunc(parts,wdb,q) in ["+OK"]:
-                rc = ":1"
-        return rc
+        wdb = wdb or self.whichdb
+        rc = self.db.msetnx(wdb,[(parts[0],parts[1])])
+        if rc and q == True: self.server.addToQueue(wdb,"set",parts[0],parts[1])
+        return ":%d" % rc
+
+    def msetFunc(self,parts,wdb=None,q=True):
+        """
+            Set several variables at once.
+
+            MSET <varName1> <value1> <varName2> <value2> ...\r\n
+
+            Always returns +OK\r\n
+        """
+        if not parts or len(parts) % 2:
+            raise ERR("-ERR wrong number of arguments for MSET")
+        wdb = wdb or self.whichdb
+        self.db.batch(wdb,[("set",parts[i],parts[i+1]) for i in xrange(0,len(parts),2)])
+        if q == True: self.server.addToQueue(wdb,"mset",*parts)
+        return "+OK"
+
+    def msetnxFunc(self,parts,wdb=None,q=True):
+        """
+            Set several variables at once, unless any of them already exists; then
+            none of them are set.
+
+            MSETNX <varName1> <value1> <varName2> <value2> ...\r\n
+
+            Returns :1\r\n if they were set, otherwise :0\r\n.
+        """
+        if not parts or len(parts) % 2:
+            raise ERR("-ERR wrong number of arguments for MSETNX")
+        wdb = wdb or self.whichdb
+        rc = self.db.msetnx(wdb,[(parts[i],parts[i+1]) for i in xrange(0,len(parts),2)])
+
+        # A slave is sent the variables to set only if they were set here.
+        if rc and q == True: self.server.addToQueue(wdb,"mset",*parts)
+        return ":%d" % rc
 
     def delFunc(self,parts,wdb=None,q=True):
         """
@@ -150,14 +231,28 @@ class PyNoSql(asyncore.dispatcher):
 
             Returns the count of successful deletes, as :<cnt>\r\n
         """
-        cnt = 0
         wdb = wdb or self.whichdb
-        for i in parts:
-            if self.db.defined(wdb,i) :
-                self.db.remove(wdb,i)
-                if q == True: self.server.addToQueue(wdb,"del",i)
-                cnt = cnt +1
-        return ":%d" % cnt
+        rc = self.db.batch(wdb,[("del",i) for i in parts])
+
+        # Send a slave only the variables that were deleted.
+        gone = [i for i,r in zip(parts,rc) if r]
+        if gone and q == True: self.server.addToQueue(wdb,"del",*gone)
+        return ":%d" % len(gone)
+
+    def ldelFunc(self,parts,wdb=None,q=True):
+        """
+            Delete a list variable.
+
+            LDEL <varName>\r\n
+
+            Returns :1\r\n if the list was deleted, :0\r\n if there was no such variable.
+        """
+        wdb = wdb or self.whichdb
+        if not self.db.defined(wdb,parts[0]):
+            return ":0"
+        self.db.remove(wdb,parts[0],"list")
+        if q == True: self.server.addToQueue(wdb,"del",parts[0])
+        return ":1"
 
     def incrByFunc(self,parts,wdb=None,q=True):
         """
@@ -211,6 +306,286 @@ class PyNoSql(asyncore.dispatcher):
         """
         return self.incrByFunc([parts[0],"-1"],wdb=wdb,q=q )
 
+    def incrByFloatFunc(self,parts,wdb=None,q=True):
+        """
+            Increment a numeric string variable by a floating point value
+
+            INCRBYFLOAT <varName> <incrValue>\r\n
+
+            Returns the new value as $<len>\r\n<value>\r\n
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.addFloat(wdb,parts[0],parseScore(parts[1]))
+        if q == True: self.server.addToQueue(wdb,"incrbyfloat",parts[0],parts[1])
+        return "$%d\r\n%s" % (len(rc),rc)
+
+    def mincrbyFunc(self,parts,wdb=None,q=True):
+        """
+            Increment several numeric string variables at once. If any of them can't
+            be incremented, none of them are.
+
+            MINCRBY <varName1> <incrValue1> <varName2> <incrValue2> ...\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n:<value1>\r\n....
+
+            with the new value of each variable, in the order given.
+        """
+        if len(parts) == 0 or len(parts) % 2:
+            raise ERR("-ERR syntax error")
+        try:
+            pairs = [(parts[i],int(parts[i+1])) for i in xrange(0,len(parts),2)]
+        except ValueError:
+            raise ERR("-ERR value is not an integer")
+        wdb = wdb or self.whichdb
+        rc = self.db.mincrby(wdb,pairs)
+        if q == True: self.server.addToQueue(wdb,"mincrby",*parts)
+        ret = Reply().header(len(rc))
+        for i in rc:
+            ret.integer(i)
+        return ret
+
+    def appendFunc(self,parts,wdb=None,q=True):
+        """
+            Add a value to the end of a string variable, creating it if need be.
+
+            APPEND <varName> <valueLen>\r\n<value>\r\n
+
+            Returns the new length as :<len>\r\n
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.append(wdb,parts[0],parts[1])
+        if q == True: self.server.addToQueue(wdb,"append",parts[0],parts[1])
+        return ":%d" % rc
+
+    def setrangeFunc(self,parts,wdb=None,q=True):
+        """
+            Overwrite part of a string variable, starting at offset. A string shorter
+            than offset is padded with zero bytes first.
+
+            SETRANGE <varName> <offset> <valueLen>\r\n<value>\r\n
+
+            Returns the new length as :<len>\r\n
+        """
+        try:
+            offset = int(parts[1])
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise ERR("-ERR offset is out of range")
+        wdb = wdb or self.whichdb
+        rc = self.db.setrange(wdb,parts[0],offset,parts[2])
+        if parts[2] and q == True: self.server.addToQueue(wdb,"setrange",parts[0],parts[1],parts[2])
+        return ":%d" % rc
+
+    def getrangeFunc(self,parts):
+        """
+            Return bytes start through end of a string variable, counting back from
+            the end if negative.
+
+            GETRANGE <varName> <start> <end>\r\n
+
+            Returns $<len>\r\n<value>\r\n
+        """
+        try:
+            s,e = int(parts[1]),int(parts[2])
+        except ValueError:
+            raise ERR("-ERR value is not an integer")
+        rc = self.db.getrange(self.whichdb,parts[0],s,e)
+        return "$%d\r\n%s" % (len(rc),rc)
+
+    def strlenFunc(self,parts):
+        """
+            Return the length of a string variable, 0 if it doesn't exist.
+
+            STRLEN <varName>\r\n
+
+            Returns :<len>\r\n
+        """
+        return ":%d" % self.db.strlen(self.whichdb,parts[0])
+
+    def setbitFunc(self,parts,wdb=None,q=True):
+        """
+            Set or clear one bit of a string variable, growing the string if need be.
+            Bit 0 is the high bit of the first byte.
+
+            SETBIT <varName> <offset> <0|1>\r\n
+
+            Returns the old value of the bit as :<value>\r\n
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.setbit(wdb,parts[0],parseOffset(parts[1]),parseBit(parts[2]))
+        if q == True: self.server.addToQueue(wdb,"setbit",parts[0],parts[1],parts[2])
+        return ":%d" % rc
+
+    def getbitFunc(self,parts):
+        """
+            Return one bit of a string variable; bits past the end are 0.
+
+            GETBIT <varName> <offset>\r\n
+
+            Returns :0\r\n or :1\r\n
+        """
+        return ":%d" % self.db.getbit(self.whichdb,parts[0],parseOffset(parts[1]))
+
+    def bitcountFunc(self,parts):
+        """
+            Count the bits set in a string variable, or in bytes start through end of
+            it (counting back from the end if negative).
+
+            BITCOUNT <varName> [<start> <end>]\r\n
+
+            Returns :<count>\r\n
+        """
+        if len(parts) not in (1,3):
+            raise ERR("-ERR syntax error")
+        try:
+            r = [int(i) for i in parts[1:]]
+        except ValueError:
+            raise ERR("-ERR value is not an integer")
+        return ":%d" % self.db.bitcount(self.whichdb,parts[0],*r)
+
+    def bitopFunc(self,parts,wdb=None,q=True):
+        """
+            Combine string variables bit by bit, storing the result in dstName.
+            Shorter strings are padded with zero bytes. NOT takes one variable.
+
+            BITOP <AND|OR|XOR|NOT> <dstName> <varName1> <varName2> ...\r\n
+
+            Returns the length of the result as :<len>\r\n
+        """
+        if len(parts) < 3:
+            raise ERR("-ERR syntax error")
+        op = parts[0].lower()
+        if op not in ("and","or","xor","not") or (op == "not" and len(parts) != 3):
+            raise ERR("-ERR syntax error")
+        wdb = wdb or self.whichdb
+        rc = self.db.bitop(wdb,op,parts[1],parts[2:])
+        if q == True: self.server.addToQueue(wdb,"bitop",*parts)
+        return ":%d" % rc
+
+    def pfadd(self,parts,wdb=None,q=True):
+        """
+            Add members to a HyperLogLog, creating it if need be.
+
+            PFADD <varName> <member1> <member2> ...\r\n
+
+            Returns :1\r\n if the estimated count may have changed, :0\r\n if not.
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.pfadd(wdb,parts[0],parts[1:])
+        if rc and q == True: self.server.addToQueue(wdb,"pfadd",*parts)
+        return ":%d" % rc
+
+    def pfcount(self,parts):
+        """
+            Return the estimated number of different members added to one or more
+            HyperLogLogs, taken together.
+
+            PFCOUNT <varName1> <varName2> ...\r\n
+
+            Returns :<count>\r\n
+        """
+        if len(parts) < 1:
+            raise ERR("-ERR syntax error")
+        return ":%d" % self.db.pfcount(self.whichdb,parts)
+
+    def pfmerge(self,parts,wdb=None,q=True):
+        """
+            Merge HyperLogLogs into dstName, which is created if need be. The
+            estimated count of dstName is then that of all of them taken together.
+
+            PFMERGE <dstName> <varName1> <varName2> ...\r\n
+
+            Returns +OK\r\n
+        """
+        if len(parts) < 1:
+            raise ERR("-ERR syntax error")
+        wdb = wdb or self.whichdb
+        self.db.pfmerge(wdb,parts[0],parts[1:])
+        if q == True: self.server.addToQueue(wdb,"pfmerge",*parts)
+        return "+OK"
+
+    def bfReserve(self,parts,wdb=None,q=True):
+        """
+            Make an empty Bloom filter sized to hold capacity items with the given
+            rate of false positives. The variable must not exist.
+
+            BF.RESERVE <varName> <errorRate> <capacity>\r\n
+
+            Returns +OK\r\n
+        """
+        wdb = wdb or self.whichdb
+        self.db.bfreserve(wdb,parts[0],parseErrorRate(parts[1]),parseCapacity(parts[2]))
+        if q == True: self.server.addToQueue(wdb,"bf.reserve",parts[0],parts[1],parts[2])
+        return "+OK"
+
+    def bfAdd(self,parts,wdb=None,q=True):
+        """
+            Add an item to a Bloom filter, creating one of the default size if need be.
+
+            BF.ADD <varName> <item>\r\n
+
+            Returns :1\r\n if the item wasn't there, :0\r\n if it probably was.
+        """
+        wdb = wdb or self.whichdb
+        changed,rc = self.db.bfadd(wdb,parts[0],parts[1:])
+        if changed and q == True: self.server.addToQueue(wdb,"bf.add",parts[0],parts[1])
+        return ":%d" % rc[0]
+
+    def bfMadd(self,parts,wdb=None,q=True):
+        """
+            Add several items to a Bloom filter, creating one of the default size if
+            need be.
+
+            BF.MADD <varName> <item1> <item2> ...\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n:<1 or 0>\r\n....
+
+            With a 1 for each item that wasn't there and a 0 for each that probably was.
+        """
+        if len(parts) < 2:
+            raise ERR("-ERR syntax error")
+        wdb = wdb or self.whichdb
+        changed,rc = self.db.bfadd(wdb,parts[0],parts[1:])
+        if changed and q == True: self.server.addToQueue(wdb,"bf.madd",*parts)
+        ret = Reply().header(len(rc))
+        for i in rc:
+            ret.integer(i)
+        return ret
+
+    def bfExists(self,parts):
+        """
+            Check whether an item has been added to a Bloom filter.
+
+            BF.EXISTS <varName> <item>\r\n
+
+            Returns :1\r\n if the item is probably there, :0\r\n if it isn't.
+        """
+        return ":%d" % self.db.bfexists(self.whichdb,parts[0],parts[1:])[0]
+
+    def bfMexists(self,parts):
+        """
+            Check whether several items have been added to a Bloom filter.
+
+            BF.MEXISTS <varName> <item1> <item2> ...\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n:<1 or 0>\r\n....
+
+            With a 1 for each item that is probably there and a 0 for each that isn't.
+        """
+        if len(parts) < 2:
+            raise ERR("-ERR syntax error")
+        ret = Reply().header(len(parts)-1)
+        for i in self.db.bfexists(self.whichdb,parts[0],parts[1:]):
+            ret.integer(i)
+        return ret
+
     def saveFunc(self,parts,wdb=None,q=True):
         """
             Save the database to local disk.
@@ -252,12 +627,13 @@ class PyNoSql(asyncore.dispatcher):
 
             KEYS <globName>\r\n
 
-        Returns a list of variable names that match the given argument of the
-        format: $<lenOfValue>\r\n<value>. <value> is a space separated lists of
-        names.
+        Returns list looks like:
+
+            *<numEntriesinList>\r\n<Entry1>\r\n....
+
+        Where each <EntryN> is the name of a variable that matches, $<len>\r\n<name>
         """
-        s = self.db.keys(self.whichdb,parts[0])
-        return "$%d\r\n%s" % (len(s),s)
+        return multiBulk(self.db.keys(self.whichdb,parts[0]))
 
     def reFunc(self,parts):
         """
@@ -343,7 +719,7 @@ class PyNoSql(asyncore.dispatcher):
 
             Always returns +OK\r\n
         """
-        self.server.dumpSema.set()
+        self.server.triggerDump()
         if q == True: self.server.addToQueueNoVersion(wdb or self.whichdb,"bgsave")
         return "+OK"
 
@@ -388,7 +764,7 @@ class PyNoSql(asyncore.dispatcher):
 
             TYPE <varName>\r\n
 
-            Returns one of: +none\r\n, +string\r\n, +list\r\n +set\r\n
+            Returns one of: +none\r\n, +string\r\n, +list\r\n, +set\r\n, +zset\r\n, +hash\r\n
         """
         val = self.db.getType(self.whichdb,parts[0])
         return "+" + val
@@ -419,6 +795,11 @@ class PyNoSql(asyncore.dispatcher):
         dt = time.time() - st
         s = """version:%s\r\nconnected_clients:%d\r\nconnected_slaves:%d\r\nused_memory:%d\r\nchanges_since_last_save:%d\r\nlast_save_time:%d\r\ntotal_connections_received:%d\r\ntotal_commands_processed:%d\r\nuptime_in_seconds:%d\r\nuptime_in_days:%d\r\nbgsave_in_progress:1\r\nrole:master""" % (v,
                 NCC,0,0,tcO,ls,NTC,tO,dt,dt/(60*60*24))
+
+        # How many lists, sets, hashes and HyperLogLogs are held in their compact form,
+        # and how many not.
+        for k,n in sorted(self.db.encodings().items()):
+            s += "\r\nencoding_%s:%d" % (k,n)
         return "$%d\r\n" % len(s) + s
 
     def shutFunc(self,parts,wdb=None,q=True):
@@ -436,7 +817,7 @@ class PyNoSql(asyncore.dispatcher):
         self.server.serverClose()
 
         # Make sure the dumper exits...
-        self.server.dumpSema.set()
+        self.server.triggerDump()
 
     def lastFunc(self,parts):
         """
@@ -514,41 +895,41 @@ class PyNoSql(asyncore.dispatcher):
 
     def lpush(self,parts,wdb=None,q=True):
         """
-            Create a list or for an existing list put the element at the head.
+            Create a list or for an existing list put the elements at the head, one
+            after the other, so the last one ends up first.
 
-            LPUSH  <varName> <elem>\r\n
+            LPUSH  <varName> <elem1> <elem2> ...\r\n
 
             Returns +OK\r\n
         """
-        # This sets up a set.
+        if len(parts) < 2:
+            raise ERR("-ERR wrong number of arguments for LPUSH")
+
+        # This sets up the list if need be.
         wdb = wdb or self.whichdb
-        t = self.db.getType(wdb,parts[0])
-        if t  == "none" :
-            self.db.set(wdb,parts[0],[])
-        self.db.insert(wdb,parts[0],0,parts[1])
-        if q == True: self.server.addToQueue(wdb,"lpush",parts[0], parts[1])
+        self.db.push(wdb,parts[0],parts[1:],True)
+        if q == True: self.server.addToQueue(wdb,"lpush",*parts)
         return "+OK"
 
     def rpush(self,parts,wdb=None,q=True):
         """
-            Create a list or for an existing list put the element at the end.
+            Create a list or for an existing list put the elements at the end.
 
-            RPUSH  <varName> <elem>\r\n
+            RPUSH  <varName> <elem1> <elem2> ...\r\n
 
             Returns +OK\r\n
         """
-        # This sets up a set.
+        if len(parts) < 2:
+            raise ERR("-ERR wrong number of arguments for RPUSH")
+
+        # This sets up the list if need be.
         wdb = wdb or self.whichdb
-        t = self.db.getType(wdb,parts[0])
-        if t  == "none" :
-            self.db.set(wdb,parts[0],[])
-        self.db.insert(wdb,parts[0],-1,parts[1])
-        if q == True: self.server.addToQueue(wdb,"rpush",parts[0], parts[1])
+        self.db.push(wdb,parts[0],parts[1:])
+        if q == True: self.server.addToQueue(wdb,"rpush",*parts)
         return "+OK"
 
     def llen(self,parts):
         # Get the length of a list...
-        t = self.db.getType(self.whichdb,parts[0])
         return ":%d" % self.db.listlen(self.whichdb,parts[0])
 
     def lrange(self,parts):
@@ -557,10 +938,7 @@ class PyNoSql(asyncore.dispatcher):
             start = int(parts[1])
             i = parts[2]
             end = int(parts[2])
-            l = self.db.lrange(self.whichdb,parts[0],start,end)
-            ret = "*%d" % len(l)
-            for i in l:
-                ret = ret + "\r\n$%d\r\n%s" % (len(i),i)
+            ret = multiBulk(self.db.lrange(self.whichdb,parts[0],start,end))
         except ValueError:
             ret = "-ERR %s is not an integer value" % i
         return ret
@@ -572,7 +950,7 @@ class PyNoSql(asyncore.dispatcher):
             start = int(parts[1])
             i = parts[2]
             end = int(parts[2])
-            self.db.ltrim(wdb,parts[0],start,end+1)
+            self.db.ltrim(wdb,parts[0],start,end)
             if q == True: self.server.addToQueue(wdb,"ltrim",parts[0],parts[1],parts[2] )
         except ValueError:
             return "-ERR %s is not an integer value" % i
@@ -626,16 +1004,17 @@ class PyNoSql(asyncore.dispatcher):
 
     def sadd(self,parts,wdb=None,q=True):
         """
-            Add an item to a set, optionally creating the set.
+            Add items to a set, optionally creating the set.
 
-            SADD <varName> <item>\r\n
+            SADD <varName> <item1> <item2> ...\r\n
 
-            Returns :0\r\n if the element was already in the set, otherwise return
-            :1\r\n
+            Returns the number of items that weren't already in the set, as :<cnt>\r\n
         """
+        if len(parts) < 2:
+            raise ERR("-ERR wrong number of arguments for SADD")
         wdb = wdb or self.whichdb
-        rc =  self.db.sadd(wdb,parts[0],parts[1])
-        if rc and q == True: self.server.addToQueue(wdb,"sadd",parts[0],parts[1])
+        rc =  self.db.sadd(wdb,parts[0],parts[1:])
+        if rc and q == True: self.server.addToQueue(wdb,"sadd",*parts)
         return  ":%d" % (rc)
 
     def scard(self,parts):
@@ -670,24 +1049,22 @@ class PyNoSql(asyncore.dispatcher):
 
             Where each <EntryN> looks like  $<len>\r\n<value>, if it does exist.
         """
-        rlist = self.db.smembers(self.whichdb,parts[0])
-        rc = "*%d" % (len(rlist))
-        for i in rlist:
-            rc = rc + "\r\n" + "$%d\r\n%s" % (len(i),i)
-        return rc
+        return multiBulk(self.db.smembers(self.whichdb,parts[0]))
 
     def srem(self,parts,wdb=None,q=True):
         """
-            Remove a member from a set.
+            Remove members from a set.
 
-            SREM <varName> <memberName>\r\n
+            SREM <varName> <memberName1> <memberName2> ...\r\n
 
-            Returns :1\r\n if the member was in the set and was removed.
-            Otherwise it returns a :0\r\n if the member wasn't in the set.
+            Returns the number of members that were in the set and were removed,
+            as :<cnt>\r\n
         """
+        if len(parts) < 2:
+            raise ERR("-ERR wrong number of arguments for SREM")
         wdb = wdb or self.whichdb
-        rc =  self.db.srem(wdb,parts[0],parts[1])
-        if rc and q == True: self.server.addToQueue(wdb,"srem",parts[0],parts[1])
+        rc =  self.db.srem(wdb,parts[0],parts[1:])
+        if rc and q == True: self.server.addToQueue(wdb,"srem",*parts)
         return ":%d" % (rc)
 
     def sinter(self,parts):
@@ -702,11 +1079,7 @@ class PyNoSql(asyncore.dispatcher):
 
             Where each <EntryN> looks like  $<len>\r\n<value>, if it does exist.
         """
-        rlist = self.db.sinter(self.whichdb,parts)
-        rc = "*%d" % (len(rlist))
-        for i in rlist:
-            rc = rc + "\r\n" + "$%d\r\n%s" % (len(i),i)
-        return rc
+        return multiBulk(self.db.sinter(self.whichdb,parts))
 
     def sunion(self,parts):
         """
@@ -720,11 +1093,7 @@ class PyNoSql(asyncore.dispatcher):
 
             Where each <EntryN> looks like  $<len>\r\n<value>, if it does exist.
         """
-        rlist = self.db.sunion(self.whichdb,parts)
-        rc = "*%d" % (len(rlist))
-        for i in rlist:
-            rc = rc + "\r\n" + "$%d\r\n%s" % (len(i),i)
-        return rc
+        return multiBulk(self.db.sunion(self.whichdb,parts))
 
     def sdiff(self,parts):
         """
@@ -738,11 +1107,7 @@ class PyNoSql(asyncore.dispatcher):
 
             Where each <EntryN> looks like  $<len>\r\n<value>, if it does exist.
         """
-        rlist = self.db.sdiff(self.whichdb,parts)
-        rc = "*%d" % (len(rlist))
-        for i in rlist:
-            rc = rc + "\r\n" + "$%d\r\n%s" % (len(i),i)
-        return rc
+        return multiBulk(self.db.sdiff(self.whichdb,parts))
 
     def sinterstore(self,parts,wdb=None,q=True):
         """
@@ -755,7 +1120,7 @@ class PyNoSql(asyncore.dispatcher):
         """
         wdb = wdb or self.whichdb
         self.db.sinterstore(wdb,parts[0],parts[1:])
-        if q == True: self.server.addToQueue(wdb,"sinterstore",parts[0],parts[1:])
+        if q == True: self.server.addToQueue(wdb,"sinterstore",*parts)
         return "+OK"
 
     def sunionstore(self,parts,wdb=None,q=True):
@@ -769,7 +1134,7 @@ class PyNoSql(asyncore.dispatcher):
         """
         wdb = wdb or self.whichdb
         self.db.sunionstore(wdb,parts[0],parts[1:])
-        if q  == True: self.server.addToQueue(wdb,"sunionstore",parts[0],parts[1])
+        if q == True: self.server.addToQueue(wdb,"sunionstore",*parts)
         return "+OK"
 
     def sdiffstore(self,parts,wdb=None,q=True):
@@ -783,7 +1148,7 @@ class PyNoSql(asyncore.dispatcher):
         """
         wdb = wdb or self.whichdb
         self.db.sdiffstore(wdb,parts[0],parts[1:])
-        if q == True: self.server.addToQueue(wdb,"sdiffstore",parts[0],parts[1:])
+        if q == True: self.server.addToQueue(wdb,"sdiffstore",*parts)
         return "+OK"
 
     def spop(self,parts,wdb=None,q=True):
@@ -817,6 +1182,248 @@ class PyNoSql(asyncore.dispatcher):
         if rc == 1 and q == True: self.server.addToQueue(wdb,"smove",parts[0],parts[1],parts[2])
         return ":%d" % rc if rc != -1 else "-ERR*Works on sets only"
 
+    def zadd(self,parts,wdb=None,q=True):
+        """
+            Add a member to a sorted set, or change the score of one already there, optionally
+            creating the sorted set.
+
+            ZADD <varName> <score> <memberLen>\r\n<member>\r\n
+
+            Returns :1\r\n if the member was added, :0\r\n if it was there and its score
+            was changed.
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.zadd(wdb,parts[0],parts[2],parseScore(parts[1]))
+        if q == True: self.server.addToQueue(wdb,"zadd",parts[0],parts[1],parts[2])
+        return ":%d" % rc
+
+    def zincrby(self,parts,wdb=None,q=True):
+        """
+            Add to the score of a member of a sorted set. A member that isn't in the set is
+            added, with the increment as its score.
+
+            ZINCRBY <varName> <increment> <memberLen>\r\n<member>\r\n
+
+            Returns the new score as $<len>\r\n<score>\r\n
+        """
+        wdb = wdb or self.whichdb
+        rc = formatScore(self.db.zincrby(wdb,parts[0],parts[2],parseScore(parts[1])))
+        if q == True: self.server.addToQueue(wdb,"zincrby",parts[0],parts[1],parts[2])
+        return "$%d\r\n%s" % (len(rc),rc)
+
+    def zrem(self,parts,wdb=None,q=True):
+        """
+            Remove a member from a sorted set.
+
+            ZREM <varName> <memberLen>\r\n<member>\r\n
+
+            Returns :1\r\n if the member was removed, :0\r\n if it wasn't in the set.
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.zrem(wdb,parts[0],parts[1])
+        if rc and q == True: self.server.addToQueue(wdb,"zrem",parts[0],parts[1])
+        return ":%d" % rc
+
+    def zcard(self,parts):
+        """
+            Return the number of members in a sorted set.
+
+            ZCARD <varName>\r\n
+
+            Returns :<count>\r\n
+        """
+        return ":%d" % self.db.zcard(self.whichdb,parts[0])
+
+    def zscore(self,parts):
+        """
+            Return the score of a member of a sorted set.
+
+            ZSCORE <varName> <memberLen>\r\n<member>\r\n
+
+            Returns $<len>\r\n<score>\r\n, or $-1\r\n if the member isn't in the set.
+        """
+        rc = self.db.zscore(self.whichdb,parts[0],parts[1])
+        if rc is None:
+            return "$-1"
+        rc = formatScore(rc)
+        return "$%d\r\n%s" % (len(rc),rc)
+
+    def zrank(self,parts):
+        """
+            Return the rank of a member of a sorted set, counting from 0 at the lowest score.
+
+            ZRANK <varName> <memberLen>\r\n<member>\r\n
+
+            Returns :<rank>\r\n, or $-1\r\n if the member isn't in the set.
+        """
+        rc = self.db.zrank(self.whichdb,parts[0],parts[1])
+        return "$-1" if rc is None else ":%d" % rc
+
+    def zreply(self,pairs,withScores):
+        # The multi-bulk reply for a range of a sorted set: the members, each followed
+        # by its score if withScores is set.
+        if not withScores:
+            return multiBulk([m for m,s in pairs])
+        ret = Reply().header(2*len(pairs))
+        for m,s in pairs:
+            ret.bulk(m)
+            ret.bulk(formatScore(s))
+        return ret
+
+    def zrange(self,parts):
+        """
+            Return the members of a sorted set from rank start through rank end. Negative
+            ranks count back from the end, -1 being the member with the highest score.
+
+            ZRANGE <varName> <start> <end> [WITHSCORES]\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n<Entry1>\r\n....
+
+            Where each <EntryN> looks like $<len>\r\n<value>. With WITHSCORES each member
+            is followed by its score.
+        """
+        if len(parts) not in (3,4) or (len(parts) == 4 and parts[3].lower() != "withscores"):
+            raise ERR("-ERR syntax error")
+        try:
+            start = int(parts[1])
+            end = int(parts[2])
+        except ValueError:
+            raise ERR("-ERR value is not an integer")
+        return self.zreply(self.db.zrange(self.whichdb,parts[0],start,end),len(parts) == 4)
+
+    def zrangebyscore(self,parts):
+        """
+            Return the members of a sorted set with scores between min and max, in order.
+            A bound starting with ( leaves out that score; -inf and +inf may be used.
+
+            ZRANGEBYSCORE <varName> <min> <max> [WITHSCORES] [LIMIT <offset> <count>]\r\n
+
+            Returns the same kind of list as ZRANGE.
+        """
+        if len(parts) < 3:
+            raise ERR("-ERR syntax error")
+        lo,loEx = parseBound(parts[1])
+        hi,hiEx = parseBound(parts[2])
+        withScores = False
+        offset,count = 0,-1
+        a = parts[3:]
+        i = 0
+        while i < len(a):
+            opt = a[i].lower()
+            if opt == "withscores":
+                withScores = True
+                i += 1
+            elif opt == "limit" and i+2 < len(a):
+                try:
+                    offset = int(a[i+1])
+                    count = int(a[i+2])
+                except ValueError:
+                    raise ERR("-ERR value is not an integer")
+                i += 3
+            else:
+                raise ERR("-ERR syntax error")
+        if offset < 0:
+            return multiBulk([])
+        pairs = self.db.zrangebyscore(self.whichdb,parts[0],lo,hi,loEx,hiEx,offset,count)
+        return self.zreply(pairs,withScores)
+
+    def hset(self,parts,wdb=None,q=True):
+        """
+            Set a field of a hash, optionally creating the hash.
+
+            HSET <varName> <field> <valueLen>\r\n<value>\r\n
+
+            Returns :1\r\n if the field is new, :0\r\n if it was there and its value
+            was changed.
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.hset(wdb,parts[0],parts[1],parts[2])
+        if q == True: self.server.addToQueue(wdb,"hset",parts[0],parts[1],parts[2])
+        return ":%d" % rc
+
+    def hget(self,parts):
+        """
+            Return the value of a field of a hash.
+
+            HGET <varName> <field>\r\n
+
+            Returns $<len>\r\n<value>\r\n, or $-1\r\n if the field isn't there.
+        """
+        rc = self.db.hget(self.whichdb,parts[0],parts[1])
+        return "$%d\r\n%s" % (len(rc),rc) if rc is not None else "$-1"
+
+    def hmget(self,parts):
+        """
+            Return the values of several fields of a hash.
+
+            HMGET <varName> <field1> <field2> ...\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n<Entry1>\r\n....
+
+            Where each <EntryN> looks like $-1 if the field isn't there or
+            $<len>\r\n<value>, if it is.
+        """
+        if len(parts) < 2:
+            raise ERR("-ERR syntax error")
+        ret = Reply().header(len(parts)-1)
+        for v in self.db.hmget(self.whichdb,parts[0],parts[1:]):
+            ret.bulk(v)
+        return ret
+
+    def hgetall(self,parts):
+        """
+            Return all the fields of a hash and their values.
+
+            HGETALL <varName>\r\n
+
+            Returns list looks like:
+
+                *<numEntriesinList>\r\n<Entry1>\r\n....
+
+            Where the entries are each field followed by its value.
+        """
+        pairs = self.db.hgetall(self.whichdb,parts[0])
+        ret = Reply().header(2*len(pairs))
+        for f,v in pairs:
+            ret.bulk(f)
+            ret.bulk(v)
+        return ret
+
+    def hincrby(self,parts,wdb=None,q=True):
+        """
+            Add to the integer value of a field of a hash. A field that isn't there
+            is set to the increment.
+
+            HINCRBY <varName> <field> <incrValue>\r\n
+
+            Returns the new value as :<value>\r\n
+        """
+        try:
+            incr = int(parts[2])
+        except ValueError:
+            raise ERR("-ERR value is not an integer")
+        wdb = wdb or self.whichdb
+        rc = self.db.hincrby(wdb,parts[0],parts[1],incr)
+        if q == True: self.server.addToQueue(wdb,"hincrby",parts[0],parts[1],parts[2])
+        return ":%d" % rc
+
+    def hdel(self,parts,wdb=None,q=True):
+        """
+            Remove a field from a hash.
+
+            HDEL <varName> <field>\r\n
+
+            Returns :1\r\n if the field was removed, :0\r\n if it wasn't there.
+        """
+        wdb = wdb or self.whichdb
+        rc = self.db.hdel(wdb,parts[0],parts[1])
+        if rc and q == True: self.server.addToQueue(wdb,"hdel",parts[0],parts[1])
+        return ":%d" % rc
+
     def randomkey(self,parts):
         rc = self.db.randomkey(self.whichdb)
         return "$%d\r\n%s" % (len(rc),rc) if rc else "$-1"
@@ -928,9 +1535,12 @@ class PyNoSql(asyncore.dispatcher):
         else:
             keyFunc = None
 
-        self.db.lock.acquire()
-        sl = sorted(rl,cmp=cmpFunc,key=keyFunc,reverse=ascFlag)
-        self.db.lock.release()
+        lock = self.db.lockFor(self.whichdb)
+        lock.acquire()
+        try:
+            sl = sorted(rl,cmp=cmpFunc,key=keyFunc,reverse=ascFlag)
+        finally:
+            lock.release()
 
         # See if we have a limit...
         if limitValue[0] :
@@ -948,9 +1558,7 @@ class PyNoSql(asyncore.dispatcher):
             pass
         else:
             # No, just just return the right stuff...
-            rc = "*%d" % (len(sl))
-            for i in sl:
-                rc = rc + "\r\n" + "$%d\r\n%s" % (len(i),i)
+            rc = multiBulk(sl)
 
         # Return the results.
         return rc
@@ -971,15 +1579,14 @@ class PyNoSql(asyncore.dispatcher):
         return ":%d" % (self.db.version)
 
     # Commands supported by DO (inter-server functions)
-    cmds = {"set":setFunc,"del":delFunc,"save":saveFunc,"incrby":incrByFunc,
-                "decrby":decrByFunc,"rename":renFunc,"incr":incrFunc,
-                "decr":decrFunc, "renamenx":renxFunc, "bgsave":bgFunc,
-                "flushall":flushall,"flushdb":flushdb,"setnx":setnxFunc,
-                "expire":expireFunc,"move":moveFunc,"shutdown":shutFunc,
-                "lpush":lpush,"rpush":rpush,"ldel":delFunc, "ltrim":ltrim,
-                "lset":lset, "lrem":lrem, "lpop":lpop, "rpop":rpop,
-                "sadd":sadd, "srem":srem, "sinterstore":sinterstore, "spop":spop,
-                "sunionstore":sunionstore, "sdiffstore":sdiffstore, "smove":smove }
+    doCmds = frozenset(["set","del","save","incrby","decrby","rename","incr",
+                "decr","renamenx","bgsave","flushall","flushdb","setnx",
+                "expire","move","shutdown","lpush","rpush","ldel","ltrim",
+                "lset","lrem","lpop","rpop","sadd","srem","sinterstore","spop",
+                "sunionstore","sdiffstore","smove","zadd","zincrby","zrem",
+                "hset","hincrby","hdel","incrbyfloat","mincrby","setbit","bitop",
+                "pfadd","pfmerge","bf.reserve","bf.add","bf.madd",
+                "append","setrange","mset"])
 
     def doFunc(self,parts):
         """
@@ -1033,7 +1640,9 @@ class PyNoSql(asyncore.dispatcher):
         # This implies that a Master can talk to N slaves, each of which can be connected to other slaves. Hence
         # a web like model.
         try:
-            func = self.cmds[l[1][1]]
+            if l[1][1] not in self.doCmds:
+                raise ERR("-ERR '%s' can't be done by DO" % l[1][1])
+            func = self.commands[l[1][1]].handler
             logging.debug("Executing function %s with args = %s wdb = %s q = False" % (l[1][1],l[1][2:],l[1][0]))
             rc = func(self,list(l[1][2:]),wdb=l[1][0],q=self.server.anySlave())
         except Exception,e:
@@ -1043,138 +1652,134 @@ class PyNoSql(asyncore.dispatcher):
         # Return the result
         return rc
 
-    # Commands supported and functions that handle them.
-    cmds = {"get":getFunc,"set":setFunc,"del":delFunc,"keys":keysFunc,
-                "ping":pingFunc,"save":saveFunc,"incrby":incrByFunc,
-                "decrby":decrByFunc,"do":doFunc,"quit":quitFunc,
-                "exists":existsFunc,"rename":renFunc,"incr":incrFunc,
-                "decr":decrFunc, "renamenx":renxFunc, "bgsave":bgFunc,
-                "dbsize":dbsizeFunc, "mget":mgetFunc,"flushall":flushall,
-                "flushdb":flushdb,"setnx":setnxFunc, "type":typeFunc,
-                "expire":expireFunc, "select":selectFunc, "info":infoFunc,
-                "move":moveFunc,"shutdown":shutFunc, "lastsave":lastFunc,
-                "auth":authFunc,"getset":getset, "ttl":ttlFunc,
-                "slave":slaveFunc,"lpush":lpush,"rpush":rpush, "llen":llen,
-                "ldel":delFunc, "lrange":lrange, "ltrim":ltrim, "lindex":lindex,
-                "lset":lset, "lrem":lrem, "lpop":lpop, "rpop":rpop,
-                "sadd":sadd, "scard":scard, "sismember":sismember,
-                "smembers":smembers, "srem":srem, "sinter":sinter,
-                "sunion":sunion, "sinterstore":sinterstore, "spop":spop,
-                "sunionstore":sunionstore, "sdiff":sdiff, "sdiffstore":sdiffstore,
-                "smove":smove, "randomkey":randomkey, "sort":sortFunc, "replacedb":replacedb,
-                "version":version, "re":reFunc }
-
-    # No. of arguments each command takes. -1 means undefined. Otherwise
-    # the number is the number of parameters passed to the function.
-    noArgs = {"get":1,"set":-1,"del":-1,"keys":1,
-                "ping":0,"save":0,"incrby":2,
-                "decrby":2,"do":-1,"quit":0,
-                "exists":1,"rename":2,"incr":1,
-                "decr":1, "renamenx":2, "bgsave":0,
-                "dbsize":0, "mget":-1,"flushall":0,
-                "flushdb":0,"setnx":2, "type":1,
-                "expire":2, "select":1, "info":0,
-                "move":2, "shutdown":0, "lastsave":0,
-                "auth":1, "getset":2, "ttl":1,
-                "slave":1,"lpush":2, "rpush":2,  "llen":1,
-                "ldel":1, "lrange":3, "ltrim":3, "lindex":2,
-                "lset":3, "lrem":3, "lpop":1, "rpop":1,
-                "sadd":2, "scard":1, "sismember":2, "smembers":1,
-                "srem":2, "sinter":-1, "sunion":-1, "sinterstore":-1,
-                "sunionstore":-1, "sdiff":-1, "sdiffstore":-1, "spop":1,
-                "smove":3, "randomkey":0, "sort":-1, "replacedb":2,
-                "version":0, "re":1 }
-
-    # In slave mode we allow ReplaceDB and Do along with any command
-    # that has value of 1. In master mode we allow them all.
-    #
-    #   0   -> command modifies database
-    #   1   -> command doesn't modify database
-    #  -1   -> special command allowed all the time (ReplaceDB,Slave,etc)
+    # Commands supported and how they are handled. In slave mode we allow only the
+    # commands that don't write to the database, along with ReplaceDB, Slave and Do
+    # (which are how a master changes a slave). In master mode we allow them all.
     #
-    noMod = {"get":1,"set":0,"del":0,"keys":1,
-                "ping":1,"save":1,"incrby":0,
-                "decrby":0,"do":-1,"quit":1,
-                "exists":1,"rename":0,"incr":0,
-                "decr":0, "renamenx":0, "bgsave":1,
-                "dbsize":1, "mget":1,"flushall":0,
-                "flushdb":0,"setnx":0, "type":1,
-                "expire":0, "select":1, "info":1,
-                "move":0, "shutdown":1, "lastsave":1,
-                "auth":0, "getset":0, "ttl":1,
-                "slave":-1, "lpush":0, "rpush":0, "llen":1,
-                "ldel":0, "lrange":1, "ltrim":0, "lindex":1,
-                "lset":0, "lrem":0, "lpop":0, "rpop":0,
-                "sadd":0, "scard":1, "sismember":1,
-                "smembers":1, "srem":0, "sinter":1,
-                "sunion":1, "sinterstore":0, "sunionstore":0,
-                "sdiff":1, "sdiffstore":0, "spop":0,
-                "smove":0, "randomkey":1, "sort":1, "replacedb":-1,
-                "version":1, "re":1 }
-
-    # Type of primary argument. The result can be:
-    #
-    #    0 - string or none
-    #   10 - string (must exist)
-    #    1 - list or none
-    #   11 - list (must exist)
-    #    2 - set or none
-    #   12 - set (must exist)
-    #    3 - unknown (function will determine argument type)
-    #
-    argType = {"get":0,"set":3,"del":3,"keys":3,
-                "ping":3,"save":3,"incrby":0,
-                "decrby":0,"do":3,"quit":3,
-                "exists":3,"rename":3,"incr":0,
-                "decr":0, "renamenx":3, "bgsave":3,
-                "dbsize":3, "mget":3,"flushall":3,
-                "flushdb":3,"setnx":0, "type":3,
-                "expire":3, "select":3, "info":3,
-                "move":3, "shutdown":3, "lastsave":3,
-                "auth":3, "getset":0, "ttl":3,
-                "slave":3, "lpush":1, "rpush":1, "llen":11,
-                "ldel":1, "lrange":1, "ltrim":11, "lindex":11,
-                "lset":11, "lrem":11, "lpop":1, "rpop":1,
-                "sadd":2, "scard":2, "sismember":2,
-                "smembers":2, "srem":12, "sinter":3,
-                "sunion":3, "sinterstore":3, "sunionstore":3,
-                "sdiff":3, "sdiffstore":3, "spop":2, "smove":3,
-                "randomkey":3, "sort":3, "replacedb":3,
-                "version":3, "re":3 }
-
-    def parse(self,data):
+    #          name           handler      arity  write  keyType
+    commands = dict((c.name,c) for c in [
+        Command("get",          getFunc,        1, False, "string"),
+        Command("set",          setFunc,       -1, True),
+        Command("del",          delFunc,       -1, True),
+        Command("keys",         keysFunc,       1, False),
+        Command("ping",         pingFunc,       0, False),
+        Command("save",         saveFunc,       0, False),
+        Command("incrby",       incrByFunc,     2, True,  "string"),
+        Command("decrby",       decrByFunc,     2, True,  "string"),
+        Command("do",           doFunc,        -1, False),
+        Command("quit",         quitFunc,       0, False),
+        Command("exists",       existsFunc,     1, False),
+        Command("rename",       renFunc,        2, True),
+        Command("incr",         incrFunc,       1, True,  "string"),
+        Command("decr",         decrFunc,       1, True,  "string"),
+        Command("incrbyfloat",  incrByFloatFunc,2, True,  "string"),
+        Command("mincrby",      mincrbyFunc,   -1, True),
+        Command("append",       appendFunc,     2, True,  "string"),
+        Command("setrange",     setrangeFunc,   3, True,  "string"),
+        Command("getrange",     getrangeFunc,   3, False, "string"),
+        Command("strlen",       strlenFunc,     1, False, "string"),
+        Command("setbit",       setbitFunc,     3, True,  "string"),
+        Command("getbit",       getbitFunc,     2, False, "string"),
+        Command("bitcount",     bitcountFunc,  -1, False, "string"),
+        Command("bitop",        bitopFunc,     -1, True),
+        Command("renamenx",     renxFunc,       2, True),
+        Command("bgsave",       bgFunc,         0, False),
+        Command("dbsize",       dbsizeFunc,     0, False),
+        Command("mget",         mgetFunc,      -1, False),
+        Command("mset",         msetFunc,      -1, True),
+        Command("msetnx",       msetnxFunc,    -1, True),
+        Command("flushall",     flushall,       0, True),
+        Command("flushdb",      flushdb,        0, True),
+        Command("setnx",        setnxFunc,      2, True,  "string"),
+        Command("type",         typeFunc,       1, False),
+        Command("expire",       expireFunc,     2, True),
+        Command("select",       selectFunc,     1, False),
+        Command("info",         infoFunc,       0, False),
+        Command("move",         moveFunc,       2, True),
+        Command("shutdown",     shutFunc,       0, False),
+        Command("lastsave",     lastFunc,       0, False),
+        Command("auth",         authFunc,       1, True),
+        Command("getset",       getset,         2, True,  "string"),
+        Command("ttl",          ttlFunc,        1, False),
+        Command("slave",        slaveFunc,      1, False),
+        Command("lpush",        lpush,         -1, True,  "list"),
+        Command("rpush",        rpush,         -1, True,  "list"),
+        Command("llen",         llen,           1, False, "list"),
+        Command("ldel",         ldelFunc,       1, True,  "list"),
+        Command("lrange",       lrange,         3, False, "list"),
+        Command("ltrim",        ltrim,          3, True,  "list"),
+        Command("lindex",       lindex,         2, False, "list"),
+        Command("lset",         lset,           3, True,  "list"),
+        Command("lrem",         lrem,           3, True,  "list"),
+        Command("lpop",         lpop,           1, True,  "list"),
+        Command("rpop",         rpop,           1, True,  "list"),
+        Command("sadd",         sadd,          -1, True,  "set"),
+        Command("scard",        scard,          1, False, "set"),
+        Command("sismember",    sismember,      2, False, "set"),
+        Command("smembers",     smembers,       1, False, "set"),
+        Command("srem",         srem,          -1, True,  "set"),
+        Command("sinter",       sinter,        -1, False),
+        Command("sunion",       sunion,        -1, False),
+        Command("sinterstore",  sinterstore,   -1, True),
+        Command("sunionstore",  sunionstore,   -1, True),
+        Command("sdiff",        sdiff,         -1, False),
+        Command("sdiffstore",   sdiffstore,    -1, True),
+        Command("spop",         spop,           1, True,  "set"),
+        Command("smove",        smove,          3, True),
+        Command("randomkey",    randomkey,      0, False),
+        Command("sort",         sortFunc,      -1, False),
+        Command("replacedb",    replacedb,      2, False),
+        Command("version",      version,        0, False),
+        Command("re",           reFunc,         1, False),
+        Command("zadd",         zadd,           3, True,  "zset"),
+        Command("zincrby",      zincrby,        3, True,  "zset"),
+        Command("zrem",         zrem,           2, True,  "zset"),
+        Command("zcard",        zcard,          1, False, "zset"),
+        Command("zscore",       zscore,         2, False, "zset"),
+        Command("zrank",        zrank,          2, False, "zset"),
+        Command("zrange",       zrange,        -1, False, "zset"),
+        Command("zrangebyscore",zrangebyscore, -1, False, "zset"),
+        Command("hset",         hset,           3, True,  "hash"),
+        Command("hget",         hget,           2, False, "hash"),
+        Command("hmget",        hmget,         -1, False, "hash"),
+        Command("hgetall",      hgetall,        1, False, "hash"),
+        Command("hincrby",      hincrby,        3, True,  "hash"),
+        Command("hdel",         hdel,           2, True,  "hash"),
+        Command("pfadd",        pfadd,         -1, True,  "hll"),
+        Command("pfcount",      pfcount,       -1, False),
+        Command("pfmerge",      pfmerge,       -1, True),
+        Command("bf.reserve",   bfReserve,      3, True,  "bloom"),
+        Command("bf.add",       bfAdd,          2, True,  "bloom"),
+        Command("bf.madd",      bfMadd,        -1, True,  "bloom"),
+        Command("bf.exists",    bfExists,       2, False, "bloom"),
+        Command("bf.mexists",   bfMexists,     -1, False, "bloom"),
+        ])
+
+    # Commands whose last argument is the length of the "bulk" data that follows
+    # the command line, e.g. SET <varName> <valueLen>\r\n<value>\r\n
+    bulkCmds = frozenset(["set","setnx","getset","lpush","rpush","lset","lrem",
+                "sadd","srem","sismember","smove","do","replacedb",
+                "zadd","zincrby","zrem","zscore","zrank","hset","append",
+                "setrange"])
+
+    def parse(self,parts):
+        # The parts are the command name and its arguments, as handed back by the
+        # RequestBuffer. They look the same whether the client sent the inline or
+        # the multi-bulk form of the command.
         try:
-            # Split out the command into parts and make the actaul command
-            # all lower case. Do it the hard way because we don't want to
-            # touch, the possibly binary, data.
-            halves = data.split("\r\n",1)
-            parts = halves[0].split(" ")
-
-            # See if we have "mass" data for the call. If we do, we need to determine the
-            # size from the message. The size must be an integer, and if it is we will
-            # truncate the mass data to the exact size (meaning we get rid of the ending
-            # \r\n characters). We have to be careful with the mass data because it might
-            # have embedded \r\n!
-            if len(halves[1]):
-                try:
-                    i = len(parts)-1
-                    parts[i] = halves[1][:int(parts[i])]
-                except ValueError,e:
-                    raise ERR("-ERR length in message is not an integer [%s]" % (e.__str__()))
-
             cmd = parts[0].lower()
-            if len(parts) > 1 and len(parts[1]) == 0: del parts[1]
 
             # See what we need to do about authentication
             if self.auth == False and not cmd == "auth":
                 raise ERR( "-ERR Must be authenticated first" )
 
             # Execute the command! First make sure we have a command we know about.
-            if cmd not in self.cmds.keys():
+            c = self.commands.get(cmd)
+            if c is None:
                 raise ERR( "-ERR '%s' is an unknown command" % cmd )
 
             # Get the number of arguments we expect and make sure we have them.
-            n = self.noArgs[cmd]
+            n = c.arity
             if n > 0 and len(parts)-1 != n:
                 raise ERR( "-ERR poorly formed command %s - missing arguments. Expected %d got %d" % (cmd,n,len(parts)-1) )
 
@@ -1182,34 +1787,21 @@ class PyNoSql(asyncore.dispatcher):
             # Figure out if we allow the operation to execute. If the operations is reading
             # something, we always allow it. If it is writing, we only allow this to happen
             # on a server running in master mode and not terminating.
-            modCmd = self.noMod[cmd]
-            if modCmd == 0 and not self.master :
-                raise ERR("-ERR server is operating in slave only mode; redirect to master")
-            if modCmd == 0 and (self.server.halting or self.closeFlag) :
-                raise ERR("-ERR server shutting down and command not allowed.")
-
-            # See if we have the right type of the first (primary) argument, but only if we expect one.
-            typeOfArg = self.argType[cmd]
-            if typeOfArg != 3:
-                t = self.db.getType(self.whichdb,parts[1])
-                if  (typeOfArg ==  0 and t not in ["string","none"]) or \
-                    (typeOfArg == 10 and t not in ["string"] ) or \
-                    (typeOfArg ==  1 and t not in ["list","none"]) or \
-                    (typeOfArg == 11 and t not in ["list"] ) or \
-                    (typeOfArg ==  2 and t not in ["set","none"]) or \
-                    (typeOfArg == 12 and t not in ["set"] ) :
-                        raise ERR("-ERR Operation against a key holding the wrong kind of value")
-
-            # Everything checked out, so execute the command.
-            s = self.cmds[cmd](self,parts[1:])
+            if c.write:
+                if not self.master :
+                    raise ERR("-ERR server is operating in slave only mode; redirect to master")
+                if self.server.halting or self.closeFlag :
+                    raise ERR("-ERR server shutting down and command not allowed.")
+
+            # Everything checked out, so execute the command. The type of the first
+            # (primary) argument is checked by the database as the command runs.
+            s = c.handler(self,parts[1:])
 
             # Log the operation and result
-            logging.debug( "PyNoSql.parse: CMD: %s  ARGS: %s  RESULTS: %s" % (parts[0],parts[1:],s) )
+            logging.debug( "PyNoSql.parse: CMD: %s  ARGS: %s  RESULTS: %s", parts[0],parts[1:],s )
 
             # See if we need to write out the changes to the backing store...
-            if self.db.totalChangeOperations - self.server.mark >= self.server.updateCount:
-                self.saveFunc([])
-                self.server.mark = self.db.totalChangeOperations
+            self.saveIfDue()
 
             # Return the results.
             return s
@@ -1226,6 +1818,70 @@ class PyNoSql(asyncore.dispatcher):
             logging.exception(e.__str__())
             return "-ERR Unhandled exception [%s]" % (e.__str__())
 
+    def saveIfDue(self):
+        # Have the changes written out to the backing store, in the background, if
+        # there have been enough of them.
+        if self.db.totalChangeOperations - self.server.mark >= self.server.updateCount:
+            self.bgFunc([])
+            self.server.mark = self.db.totalChangeOperations
+
+    def parseBatch(self,run):
+        # Run GETs and SETs that a client sent one after the other as one batch, taking
+        # the database's lock once and stepping the version number once, and queue their
+        # replies. The SETs are sent to the slaves as a single MSET. Anything the batch
+        # can't do the usual way (before AUTH, say, or a SET on a slave) is left to
+        # parse(), one command at a time.
+        if not run:
+            return
+        try:
+            write = False
+            for parts in run:
+                if len(parts) == 3: write = True
+            if len(run) == 1 or self.auth == False or \
+                    (write and (not self.master or self.server.halting or self.closeFlag)):
+                for parts in run:
+                    self.queueReply(self.parse(parts))
+                return
+
+            ops = [("get",p[1]) if len(p) == 2 else ("set",p[1],p[2]) for p in run]
+            try:
+                results = self.db.batch(self.whichdb,ops)
+            except Exception,e:
+                logging.exception(e.__str__())
+                for parts in run:
+                    self.queueReply("-ERR Unhandled exception [%s]" % (e.__str__()))
+                return
+            logging.debug("PyNoSql.parseBatch: %d GET/SET commands", len(run))
+            sets = []
+            replies = []
+            for parts,v in zip(run,results):
+                if len(parts) == 3:
+                    sets.extend(parts[1:])
+                    last = len(replies)
+                    replies.append("+OK")
+                elif v is None:
+                    replies.append("$-1")
+                elif type(v) is str:
+                    replies.append("$%d\r\n%s" % (len(v),v))
+                else:
+                    replies.append(v.__str__())
+
+            # See if we need to write out the changes, as parse() does. If that fails
+            # the last SET, the one that made it due, gets the error for its reply.
+            if sets:
+                self.server.addToQueue(self.whichdb,"mset",*sets)
+                try:
+                    self.saveIfDue()
+                except ERR,e:
+                    replies[last] = e.__str__()
+                except Exception,e:
+                    logging.exception(e.__str__())
+                    replies[last] = "-ERR Unhandled exception [%s]" % (e.__str__())
+            for s in replies:
+                self.queueReply(s)
+        finally:
+            del run[:]
+
     def handle_read(self):
         # Get data. If the connection has been closed we get a string of zero
         # length, so catch it. If we get a zero length string just close the connection
@@ -1233,36 +1889,101 @@ class PyNoSql(asyncore.dispatcher):
         data = self.recv(4024*1024)
         if len(data) == 0:
             self.close()
+            return
+
+        # Add it to what we already have and run every complete command in it, in
+        # the order they were sent. A partial command stays in the buffer until the
+        # rest of it arrives.
+        # Pipelined GETs and SETs, the bulk of what cache warmers and readers send, are
+        # gathered up and run as a batch (see parseBatch).
+        self.request.feed(data)
+        before = self.outBytes
+        run = []
+        while not self.closeFlag:
+            try:
+                parts = self.request.next()
+            except ERR,e:
+                self.parseBatch(run)
+                self.queueReply(e.__str__())
+                continue
+            if parts is None:
+                break
+            n = len(parts)
+            if n == 2 or n == 3:
+                cmd = parts[0].lower()
+                if (n == 2 and cmd == "get") or (n == 3 and cmd == "set"):
+                    run.append(parts)
+                    if len(run) >= BATCHMAX:
+                        self.parseBatch(run)
+                    continue
+            self.parseBatch(run)
+            self.queueReply(self.parse(parts))
+        self.parseBatch(run)
+
+        # If the command was quit, now is the time to handle it...just
+        # close the connection. Otherwise start returning the results of the
+        # commands to the client, all in as few writes as we can.
+        if self.closeFlag is True:
+            self.close()
+        elif self.outBytes and not before:
+            self.handle_write()
+
+    def queueReply(self,s):
+        # Add the reply to a command to the output queue. We tack a CR-LF on to each
+        # plain string result so it is in the right format. We don't worry about binary
+        # data being returned since we are merely adding the characters to the end. A
+        # Reply already has them.
+        if s is None:
+            return
+        if isinstance(s,Reply):
+            self.outq.extend(s.parts)
+            self.outBytes += sum(map(len,s.parts))
+        elif len(s) > BIGVALUE:
+            self.outq.append(s)
+            self.outq.append("\r\n")
+            self.outBytes += len(s) + 2
         else:
-            # We have some data, so process it. We take on a CR-LF to the returned
-            # data so it is in the right format. We don't worry about binary data
-            # being returned since we are merely adding the characters to the end.
-            s = self.parse(data) + "\r\n"
-
-            # If the command was quit, now is the time to handle it...just
-            # close the connection. Otherwise take the results of the command
-            # processing and return it to the client.
-            if self.closeFlag is True:
-                self.close()
-            else:
-                self.output = s
+            self.outq.append(s + "\r\n")
+            self.outBytes += len(s) + 2
 
-    def writeable(self):
+    def readable(self):
+        # Stop reading from a client that isn't reading its replies. Once the
+        # output queued for it drops back under the limit we start again.
+        return self.outBytes < self.server.outputLimit
+
+    def writable(self):
         # If there is still output to process, make sure it is sent.
-        return bool(self.output)
+        return self.outBytes > 0
 
     def handle_write(self):
-        # If we have output, do...
-        if self.output :
-            # Pickup the data and send it out.
-            data = self.output
-            self.output = None
-            sent = self.send(data)
-
-            # If we still have more to send, make sure it goes out.
-            if sent < len(data):
-                remaining = data[sent:]
-                self.output = remaining
+        # Send as much of the queued output as the socket will take.
+        q = self.outq
+        if not q:
+            return
+        first = q[0]
+        off = self.outOffset
+
+        if len(first) - off >= SENDSIZE or len(q) == 1:
+            # Large values go out on their own, without being copied.
+            sent = self.send(memoryview(first)[off:] if off else first)
+        else:
+            # Gather small pieces together into one send. What is left of a piece
+            # that was only partly sent is sliced off as a string, since join()
+            # won't take a memoryview.
+            parts = [first[off:]]
+            size = len(parts[0])
+            for i in islice(q,1,None):
+                if size + len(i) > SENDSIZE: break
+                parts.append(i)
+                size += len(i)
+            sent = self.send("".join(parts))
+
+        # Drop whatever was sent from the front of the queue.
+        self.outBytes -= sent
+        sent += self.outOffset
+        while q and sent >= len(q[0]):
+            sent -= len(q.popleft())
+        self.outOffset = sent
 
     def handle_close(self):
         # We get here when the socket is closed. So update the current conection count
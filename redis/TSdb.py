@@ -12,6 +12,7 @@
 """
 
 
+import os
 import threading
 import cPickle as pickle
 import time
@@ -19,13 +20,49 @@ import Queue
 import logging
 import sched
 import re
-import fnmatch
 import random
+from types import MethodType
+from collections import deque
+from itertools import islice
 from cStringIO import StringIO
 
 
-from decorators import synchronized
+from decorators import synchronized, synchronizedOn, synchronizedAll
 from TSexcept import ERR
+from TSzset import SortedSet, formatScore
+from TShash import Hash
+from TShll import HyperLogLog
+from TSbloom import BloomFilter
+from TSkeyspace import Keyspace
+from TSintset import IntSet, toInt
+import TSsetops as setops
+import TSbitmap as bitmap
+
+# Returned when a command is applied to a variable holding the wrong type of value.
+WRONGTYPE = "-ERR Operation against a key holding the wrong kind of value"
+
+# The kind of variable each type of value is. Counters are held as ints (see
+# DB.add), bitmaps as bytearrays (see DB.setbit), and small lists and sets in a
+# compact form (see DB.listMaxEntries), so those kinds have more than one type.
+KINDS = {str:"string", int:"string", long:"string", bytearray:"string", list:"list", deque:"list",
+         tuple:"set", set:"set", IntSet:"set", SortedSet:"zset", Hash:"hash",
+         HyperLogLog:"hll", BloomFilter:"bloom"}
+
+# The range of a counter.
+MININT = -2**63
+MAXINT = 2**63 - 1
+
+# The largest a string can be made by SETRANGE.
+MAXSTRING = 512*1024*1024
+
+def byteRange(n,s,e):
+    # Return the slice of a string of length n that bytes s through e (counting
+    # back from the end if negative) are, as (start,stop), or None if it is empty.
+    # Like Redis, an end that is still before the start of the string is byte 0.
+    if s < 0: s = max(n + s,0)
+    if e < 0: e = max(n + e,0)
+    if e >= n: e = n - 1
+    return (s,e + 1) if s <= e else None
 
 
 # Delete object via timer support
@@ -105,8 +142,15 @@ class DB(object):
     db = {"0":{}}
     expiredb = {}
 
-    # Lock for synchronization
+    # Locks for synchronization. Each database (which) has a lock of its own, in
+    # locks, so a client working on one database doesn't hold up the rest, nor the
+    # Dumper saving another. Operations on the database as a whole (like flushing
+    # all of them, or loading them) take lock and then every database lock. The
+    # counters shared by all the databases (the version number in particular) have
+    # countLock.
     lock = threading.Lock()
+    locks = {}
+    countLock = threading.Lock()
 
     # Various flags and counters...
     #
@@ -125,11 +169,44 @@ class DB(object):
     # generation of this database...this is incremented for each change of the  database
     version = 0
 
-    def __init__(self,dbfile="rdump.db",expfile="expfile.db"):
+    # Small lists and sets are held compactly: a list in a plain list rather than a
+    # deque (an empty deque alone is over 600 bytes) and a set in a tuple rather than
+    # a set (which starts at over 200). Most lists and sets have only a few members,
+    # and at that size looking through them is as quick as hashing. A list or set
+    # changes to the full structure for good once it has more than MaxEntries members
+    # or is given one longer than MaxValue bytes. The server sets these from the
+    # config file.
+    listMaxEntries = 16
+    listMaxValue = 64
+    setMaxEntries = 16
+    setMaxValue = 64
+
+    # A set whose members are all integers is held in an IntSet (a sorted array),
+    # up to this many members. Adding to one moves the members after the new one
+    # along, so past this it is changed to a set.
+    intsetMaxEntries = 512
+
+    def __init__(self,dbfile="rdump.db",expfile="expfile.db",scheduler=None,threaded=True):
         self.dbfile = dbfile
         self.expfile = expfile
 
-    @synchronized(lock)
+        # If we are given a scheduler (the server's event loop, when running single
+        # threaded) expirations are timed calls on it rather than on the timer queue.
+        self.scheduler = scheduler
+
+        # If only one thread ever touches the database there is nothing for the lock
+        # to protect us from, and taking it (with the extra call the decorator makes)
+        # costs more than most of the operations themselves. So in that case this
+        # object calls the undecorated methods directly. Saves and replication then
+        # happen between commands, which is when the loop gets around to them.
+        self.threaded = threaded
+        if not threaded:
+            for name in dir(DB):
+                f = getattr(getattr(DB,name),"unsynchronized",None)
+                if f is not None:
+                    setattr(self,name,MethodType(f,self,DB))
+
+    @synchronized(countLock)
     def changedDB(self):
         """
         Return the existing changed flag and set it to 0.
@@ -138,6 +215,33 @@ class DB(object):
         self.changed = 0
         return r
 
+    def lockFor(self,which):
+        """
+        Return the lock for a database, making one if it has none.
+        """
+        l = self.locks.get(which)
+        if l is None:
+            self.lock.acquire()
+            try:
+                l = self.locks.setdefault(which,threading.Lock())
+            finally:
+                self.lock.release()
+        return l
+
+    def __newLocks(self):
+        # This function is run with the whole database locked! Give any databases
+        # that have been created a lock.
+        for which in self.db:
+            if which not in self.locks:
+                self.locks[which] = threading.Lock()
+
+    @synchronized(countLock)
+    def __changed(self):
+        # Flag the database as changed and step the version number. The databases
+        # are locked separately, so two of them can be changing at the same time.
+        self.changed = 1
+        self.version += 1
+
     def getStats(self):
         """
         Return the statistics: total operation count, total operations that changed the database,
@@ -145,30 +249,145 @@ class DB(object):
         """
         return [self.totalOperations, self.totalChangeOperations, self.timeofLastSave]
 
+    def encodings(self):
+        """
+        Return how many lists, sets, hashes and HyperLogLogs are held in each form, as a dictionary
+        keyed by kind and form, e.g. "list_compact". The databases are counted one at a
+        time, holding only that database's lock.
+        """
+        counts = dict.fromkeys(["list_compact","list_deque","set_compact","set_intset",
+                                "set_hashtable","hash_compact","hash_dict","hll_sparse",
+                                "hll_dense"],0)
+        forms = {list:"list_compact", deque:"list_deque", tuple:"set_compact", IntSet:"set_intset",
+                 set:"set_hashtable"}
+        for i in self.db.keys():
+            l = self.lockFor(i)
+            l.acquire()
+            try:
+                for v in self.db.get(i,{}).itervalues():
+                    t = type(v)
+                    if t in forms:
+                        counts[forms[t]] += 1
+                    elif t is Hash:
+                        counts["hash_" + v.encoding()] += 1
+                    elif t is HyperLogLog:
+                        counts["hll_" + v.encoding()] += 1
+            finally:
+                l.release()
+        return counts
+
     def __clearExpire(self,which,var):
         # This function is run with the lock already acquired! It is a convenience function
         # for use only inside this class and any instances.
-        if which in self.expiredb.keys():
-            if var in self.expiredb[which].keys():
+        if which in self.expiredb:
+            if var in self.expiredb[which]:
                 del self.expiredb[which][var]
 
     def __setExpire(self,which,var,time):
         # This is an internal convenience function. It sets the entry in the expire
         # dictionary.
-        if which not in self.expiredb.keys():
+        if which not in self.expiredb:
             self.expiredb[which] = {}
         self.expiredb[which][var] = time
-        self.version += 1
+        self.__changed()
 
     def __isExpire(self,which,var):
         # This is a convenience function to return an indication if an expire time 
         # is set for some variable.
         rc = 0
-        if which in self.expiredb.keys():
-            if var in self.expiredb[which].keys():
+        if which in self.expiredb:
+            if var in self.expiredb[which]:
                 rc = 1
         return rc
 
+    def __check(self,which,var,kind,exists=False):
+        # This function is run with the lock already acquired! It returns the value
+        # of a variable, or None if it doesn't exist, after making sure it is of the
+        # kind ("string", "list", "set", "zset", "hash", "hll" or "bloom") the caller
+        # expects. If exists is set the variable has to be there. Doing the check
+        # here, rather than before the command runs, means we look the variable up
+        # once and only lock the database once.
+        val = self.db[which].get(var)
+        if val is None:
+            if exists: raise ERR(WRONGTYPE)
+        elif KINDS.get(type(val)) != kind:
+            raise ERR(WRONGTYPE)
+        return val
+
+    def __packSet(self,members):
+        # Return a set of members in the form it should be held in: an IntSet if
+        # they are all integers, or a tuple, if it is small enough, or a set. An
+        # IntSet or set given is used as it is, so it mustn't belong to another
+        # variable.
+        if not members:
+            return ()
+        if len(members) <= self.intsetMaxEntries:
+            if type(members) is IntSet:
+                return members
+            ints = [toInt(m) for m in members]
+            if None not in ints:
+                return IntSet(ints)
+        if len(members) <= self.setMaxEntries:
+            for m in members:
+                if len(m) > self.setMaxValue:
+                    return members if type(members) is set else set(members)
+            return tuple(members)
+        return members if type(members) is set else set(members)
+
+    def __sadd(self,which,var,v,item):
+        # Add an item to the set v (None if the variable doesn't exist yet) held in
+        # var, returning 1 if it is new. A new set starts as an IntSet if the item is
+        # an integer. An IntSet becomes a tuple or set once something else is added
+        # or it gets too big; a tuple is replaced by a new tuple, or by a set when it
+        # gets too big.
+        if not v:
+            v = self.db[which][var] = IntSet() if toInt(item) is not None else ()
+        if item in v:
+            return 0
+        t = type(v)
+        if t is set:
+            v.add(item)
+            return 1
+        if t is IntSet:
+            n = toInt(item)
+            if n is not None and len(v) < self.intsetMaxEntries:
+                v.add(n)
+                return 1
+            v = tuple(v)
+        if len(v) < self.setMaxEntries and len(item) <= self.setMaxValue:
+            self.db[which][var] = v + (item,)
+        else:
+            v = self.db[which][var] = set(v)
+            v.add(item)
+        return 1
+
+    def __srem(self,which,var,v,item):
+        # Remove an item from the set v held in var, returning 1 if it was there.
+        if item not in v:
+            return 0
+        if type(v) is set or type(v) is IntSet:
+            v.remove(item)
+        else:
+            self.db[which][var] = tuple([x for x in v if x != item])
+        return 1
+
+    def __setOf(self,which,var):
+        # Return the value of a set variable, or None if the variable doesn't exist
+        # or isn't a set. This is for the set operations (sinter and so on) which
+        # ignore the variables that aren't sets.
+        v = self.db[which].get(var)
+        return v if KINDS.get(type(v)) == "set" else None
+
+    def __listFor(self,which,var,v,val):
+        # Return the list v (None if the variable doesn't exist yet) held in var, ready
+        # to have val put in it: a new compact list, or the full deque if it has got
+        # too big for that.
+        if v is None:
+            v = self.db[which][var] = []
+        if type(v) is list and (len(v) >= self.listMaxEntries or len(val) > self.listMaxValue):
+            v = self.db[which][var] = deque(v)
+        return v
+
     def rawget(self,which,var):
         """
         This is the "essence" of a get() without the overhead.
@@ -176,34 +395,29 @@ class DB(object):
         This is mainly used in the sort() operation.
         """
         val = self.db[which][var]
-        if type(val) != type(""):
+        if KINDS.get(type(val)) != "string":
                 raise KeyError
-        return val
+        return val if type(val) is str else str(val)
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def get(self,which,var):
         """
         Return the value of a variable, throwing an KeyError excception
-        if the variable doesn't exist or isn't a string type.
+        if the variable doesn't exist, or ERR if it isn't a string type.
         """
 
-        # Get the variable from the database. If it isn't there
-        # Python will throw a KeyError exception. This should be
-        # caught by the caller and used to indicate the variable
-        # doesn't exist.
-        val = self.db[which][var]
-
-        # Make sure it is a "string" thinng. If not we throw
-        # a KeyError exception. After all the string variable
-        # doesn't exist.
-        if type(val) != type(""):
+        # Get the variable from the database, making sure it is a "string"
+        # thing. If it isn't there we throw a KeyError exception. This should
+        # be caught by the caller and used to indicate the variable doesn't exist.
+        val = self.__check(which,var,"string")
+        if val is None:
             raise KeyError
 
         # Increment the count against the database.
         self.totalOperations += 1
-        return val
+        return val if type(val) is str else str(val)
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def set(self,which,var,val):
         """
         Set a variable to a value. This will cancel any outstanding time expiration
@@ -220,10 +434,9 @@ class DB(object):
         # Update the statistics for the database
         self.totalOperations += 1
         self.totalChangeOperations += 1
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def getset(self,which,var,val):
         """
         Return the existing variable value, or None, at the same time giving
@@ -232,32 +445,28 @@ class DB(object):
 
         # If the variable exists, hold on to the orignal value. We will
         # return it to the caller.
-        if var not in self.db[which].keys():
-            oval = None
-        else:
-            oval = self.db[which][var]
+        oval = self.__check(which,var,"string")
 
         # Set the new value and clear out any timed expiry of the value.
         self.db[which][var] = val
         self.__clearExpire(which,var)
 
         # Indicate the database has changed and update the version counter.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # One more operation done against the database.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Return the original value
-        return oval
+        return oval if oval is None or type(oval) is str else str(oval)
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def select(self,which):
         """
         Make sure the selected database exits.
         """
-        if which not in self.db.keys():
+        if which not in self.db:
             self.db[which] = {}
 
         # Increment the total op. count.
@@ -265,17 +474,16 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def defined(self,which,var):
         """
         Returns 1 if a variable exists in the database 'which', or 0 otherwise.
         """
 
         # Does the variable exist? If so, return 1. If not, return 0.
-        if var in self.db[which].keys():
+        if var in self.db[which]:
             val = 1
         else:
             val = 0
@@ -286,24 +494,24 @@ class DB(object):
         # Return the flag.
         return val
 
-    @synchronized(lock)
+    @synchronizedOn(0,2)
     def move(self,fwhich,var,twhich):
         """
         Move a variable from one database, fwhich, to a new one, twhich. The variable
         must exist in the source database and not known in the new one.
         """
         # Make sure the target database exists.
-        if twhich not in self.db.keys():
+        if twhich not in self.db:
             self.db[twhich] = {}
 
         # Does the variable exist in the source database? If not
         # raise an error.
-        if var not in self.db[fwhich].keys():
+        if var not in self.db[fwhich]:
             raise ERR("%s not known in %s" % (var,fwhich))
 
         # Does the variable exist in the target database? If so
         # throw an error because of it.
-        if var in self.db[twhich].keys():
+        if var in self.db[twhich]:
             raise ERR("%s already known in %s" % (var,twhich))
 
         # Everything is fine...so move the variable over.
@@ -319,10 +527,9 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def rename(self,which,fvar,tvar):
         """
         Rename a variable,fvar, to a new name, tvar. The source variable must
@@ -341,25 +548,36 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
+
+    def __counter(self,which,var):
+        # This function is run with the lock already acquired! Return the value of
+        # a counter, 0 if it doesn't exist. A string (one that was SET) has to hold
+        # a whole number.
+        v = self.__check(which,var,"string")
+        if v is None:
+            return 0
+        if type(v) is not int and type(v) is not long:
+            try:
+                v = int(str(v))
+            except ValueError:
+                raise ERR("-ERR value is not an integer or out of range")
+        return v
+
+    def __inRange(self,val):
+        # Make sure a counter still fits in 64 bits.
+        if val < MININT or val > MAXINT:
+            raise ERR("-ERR increment or decrement would overflow")
+        return val
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def add(self,which,var,val):
 
-
-        # Does the variable exist and is it a string and numeric?
-        # If not, we will force it to exist and be "0".
-        if var not in self.db[which].keys():
-            self.db[which][var] = "0"
-        else:
-            v = self.db[which][var]
-            if type(v) != type("") or not v.isdigit():
-                self.db[which][var] = "0"
-
-        # Now add the value to it.
-        val = int(self.db[which][var]) + val
-        self.db[which][var] = str(val)
+        # Counters are held as ints, so adding to one doesn't go from a string
+        # and back each time. A string value is turned into an int the first time
+        # it is added to; it is only made a string again when it is read by get().
+        val = self.__inRange(self.__counter(which,var) + val)
+        self.db[which][var] = val
         self.__clearExpire(which,var)
 
         # Increment the total op. count.
@@ -367,12 +585,195 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # Return the results.
         return val
 
+    @synchronizedOn(0)
+    def addFloat(self,which,var,val):
+
+        # Add a floating point value to a variable. The result is held as a string,
+        # which add() can go on with if it is a whole number.
+        v = self.__check(which,var,"string")
+        try:
+            v = float(str(v)) if v is not None else 0.0
+        except ValueError:
+            raise ERR("-ERR value is not a valid float")
+        v += val
+        if v != v or v in (float("inf"),float("-inf")):
+            raise ERR("-ERR increment would produce NaN or Infinity")
+        v = formatScore(v)
+        self.db[which][var] = v
+        self.__clearExpire(which,var)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        # Return the new value.
+        return v
+
+    @synchronizedOn(0)
+    def mincrby(self,which,pairs):
+        """
+        Add to several counters, given as (var,increment) pairs, at once. Either
+        all of them are changed or (if any isn't a counter) none are. Returns the
+        new values, in order.
+        """
+        new = {}
+        rc = []
+        for var,incr in pairs:
+            v = new[var] if var in new else self.__counter(which,var)
+            new[var] = v = self.__inRange(v + incr)
+            rc.append(v)
+        for var,v in new.iteritems():
+            self.db[which][var] = v
+            self.__clearExpire(which,var)
+
+        # One operation, however many counters it changed.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        return rc
+
+    def __string(self,which,var):
+        # This function is run with the lock already acquired! Return the value of a
+        # string variable as a string (or bytearray), "" if it doesn't exist.
+        v = self.__check(which,var,"string")
+        if v is None:
+            return ""
+        return v if type(v) is str or type(v) is bytearray else str(v)
+
+    def __bytes(self,which,var):
+        # This function is run with the lock already acquired! Return the value of a
+        # string variable as a bytearray that can be changed in place, creating an
+        # empty one if it doesn't exist. The first time a string is changed this
+        # way it is copied; after that it stays a bytearray, so adding to its end
+        # doesn't copy it again.
+        v = self.__check(which,var,"string")
+        if type(v) is not bytearray:
+            v = self.db[which][var] = bytearray(str(v) if v is not None else "")
+        return v
+
+    @synchronizedOn(0)
+    def append(self,which,var,val):
+
+        v = self.__bytes(which,var)
+        v.extend(val)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        # Return the new length.
+        return len(v)
+
+    @synchronizedOn(0)
+    def setrange(self,which,var,offset,val):
+        """
+        Overwrite part of a string variable, starting at offset and padding it with
+        zero bytes if it is shorter than that. Returns the new length.
+        """
+        if offset + len(val) > MAXSTRING:
+            raise ERR("-ERR string exceeds maximum allowed size")
+        self.totalOperations += 1
+
+        # Nothing to write leaves the variable as it is (and doesn't create it).
+        if not val:
+            return len(self.__string(which,var))
+
+        v = self.__bytes(which,var)
+        if offset > len(v):
+            v.extend("\0" * (offset - len(v)))
+        v[offset:offset+len(val)] = val
+        self.totalChangeOperations += 1
+        self.__changed()
+        return len(v)
+
+    @synchronizedOn(0)
+    def getrange(self,which,var,s,e):
+
+        # Return bytes s through e, counting from the end if negative. Only the bytes
+        # asked for are copied.
+        v = self.__string(which,var)
+        r = byteRange(len(v),s,e) if s >= 0 or e >= 0 or s <= e else None
+        self.totalOperations += 1
+        return str(v[r[0]:r[1]]) if r else ""
+
+    @synchronizedOn(0)
+    def strlen(self,which,var):
+
+        self.totalOperations += 1
+        return len(self.__string(which,var))
+
+    @synchronizedOn(0)
+    def setbit(self,which,var,offset,bit):
+
+        # A bitmap is changed in place.
+        rc = bitmap.setbit(self.__bytes(which,var),offset,bit)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        # Return the old value of the bit.
+        return rc
+
+    @synchronizedOn(0)
+    def getbit(self,which,var,offset):
+
+        self.totalOperations += 1
+        return bitmap.getbit(self.__string(which,var),offset)
+
+    @synchronizedOn(0)
+    def bitcount(self,which,var,s=0,e=-1):
+
+        # Count the bits set in bytes s through e, counting from the end if negative.
+        v = self.__string(which,var)
+        r = byteRange(len(v),s,e)
+        self.totalOperations += 1
+        if r is None:
+            return 0
+        if r != (0,len(v)):
+            v = v[r[0]:r[1]]
+        return bitmap.popcount(v)
+
+    @synchronizedOn(0)
+    def bitop(self,which,op,var,listOfVars):
+        """
+        Store the AND, OR, XOR (or NOT, of one variable) of the string variables in
+        var, returning its length. Variables that don't exist count as empty strings;
+        if the result is empty var is deleted.
+        """
+        rc = bitmap.bitop(op,[self.__string(which,i) for i in listOfVars])
+        if rc:
+            self.db[which][var] = bytearray(rc)
+            self.__clearExpire(which,var)
+        else:
+            self.__remove(which,var)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        return len(rc)
+
     def __remove(self,which,var):
         # Special helper function - it assumes the table is already locked. This is 
         # used in the loading function when a variable needs to be removed.
@@ -380,10 +781,10 @@ class DB(object):
 
         # Do we have the specific sub-dictionary we need? If not, the
         # variable doesn't exist, so no need in gaing any further.
-        if which in self.db.keys():
+        if which in self.db:
 
             # Does the variable exist in the dictionary?
-            if var in self.db[which].keys():
+            if var in self.db[which]:
 
                 # Yes. So delete it from the dictionary.
                 del self.db[which][var]
@@ -391,9 +792,11 @@ class DB(object):
                 # If there is an expiry on the variable, get rid of it too.
                 self.__clearExpire(which,var)
 
-    @synchronized(lock)
-    def remove(self,which,var):
-        # Do the actual remove
+    @synchronizedOn(0)
+    def remove(self,which,var,kind=None):
+        # Do the actual remove, if given a kind of variable the variable
+        # must be one.
+        if kind: self.__check(which,var,kind)
         self.__remove(which,var)
 
         # Increment the total op. count.
@@ -401,31 +804,102 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
+
+    @synchronizedOn(0)
+    def batch(self,which,ops):
+        """
+        Run a list of operations on one database, holding its lock once for all of
+        them, and return a list of their results. Each operation is a tuple:
 
-    @synchronized(lock)
+            ("get",var)         - the value of a string variable, None if it doesn't
+                                  exist, or an ERR if it isn't a string
+            ("set",var,val)     - set a variable, clearing any expiry; gives None
+            ("del",var)         - delete a variable; gives 1 if it existed, 0 if not
+
+        The version number is stepped once, if anything changed.
+        """
+        return self.__batch(which,ops)
+
+    def __batch(self,which,ops):
+        # This function is run with the lock already acquired! It does the work of
+        # batch().
+        d = self.db[which]
+        rc = []
+        changes = 0
+        for op in ops:
+            name,var = op[0],op[1]
+            if name == "get":
+                val = d.get(var)
+                if val is not None and type(val) is not str:
+                    val = str(val) if KINDS.get(type(val)) == "string" else ERR(WRONGTYPE)
+                rc.append(val)
+            elif name == "set":
+                self.__clearExpire(which,var)
+                d[var] = op[2]
+                changes += 1
+                rc.append(None)
+            elif name == "del":
+                if var in d:
+                    self.__remove(which,var)
+                    changes += 1
+                    rc.append(1)
+                else:
+                    rc.append(0)
+            else:
+                raise ERR("-ERR unknown batch operation '%s'" % name)
+
+        # Increment the total op. count.
+        self.totalOperations += len(ops)
+        self.totalChangeOperations += changes
+
+        # Update the database change flag and the version number, once.
+        if changes:
+            self.__changed()
+        return rc
+
+    @synchronizedOn(0)
+    def msetnx(self,which,pairs):
+        """
+        Set the variables in the list of (var,val) pairs, unless any of them exists;
+        then none are set. Returns 1 if they were set, 0 if not.
+        """
+        d = self.db[which]
+        for var,val in pairs:
+            if var in d:
+                self.totalOperations += 1
+                return 0
+        self.__batch(which,[("set",var,val) for var,val in pairs])
+        return 1
+
+    @synchronizedOn(0)
     def keys(self,which,match):
         """
-        Return all the variable names in the database.
+        Return a list of the variable names in the database that match a glob
+        pattern.
         """
-        matched = [x for x in self.db[which].keys() if fnmatch.fnmatch(x,match)]
-        s = " ".join(matched)
+        # The first KEYS on a database makes it a Keyspace, which keeps an index of
+        # the names from then on. Until then it is a plain dictionary, and changing
+        # it costs nothing extra.
+        d = self.db[which]
+        if type(d) is not Keyspace:
+            d = self.db[which] = Keyspace(d)
+        matched = d.match(match)
 
         # Increment the total op. count.
         self.totalOperations += 1
 
         # Return results
-        return s
+        return matched
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def re(self,which,match):
         """
         Return all the variable names in the database that match
         a the regular expression.
         """
         p = re.compile(match)
-        matched = [x for x in self.db[which].keys() if p.match(x)]
+        matched = [x for x in self.db[which] if p.match(x)]
         s =  " ".join(matched)
 
         # Increment the total op. count.
@@ -434,7 +908,7 @@ class DB(object):
         # Return results
         return s
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def getType(self,which,var):
         """
         Return the type of a variable, which can be one of:
@@ -443,15 +917,11 @@ class DB(object):
             string - variable is a string type
             list - variable is a list
             set - variable is a set
+            zset - variable is a sorted set
+            hash - variable is a hash
         """
-        if var in self.db[which].keys():
-            val = self.db[which][var]
-            if type(val) is type(""):
-                val = "string"
-            elif type(val) is type([]):
-                val = "list"
-            else:
-                val = "set"
+        if var in self.db[which]:
+            val = KINDS[type(self.db[which][var])]
         else:
             val = "none"
 
@@ -468,9 +938,20 @@ class DB(object):
         self.__setExpire(which,var,dt)
 
         # Trigger an event to remove it.
-        self.timerque.enq({'data': [which,var,self], 'timestamp':dt })
+        if self.scheduler:
+            self.scheduler.callAt(dt,self._expired,which,var,dt)
+        else:
+            self.timerque.enq({'data': [which,var,self], 'timestamp':dt })
 
-    @synchronized(lock)
+    def _expired(self,which,var,dt):
+        # Called on the event loop when an expiration comes due. The variable is only
+        # removed if the expiration is still the one we set; the variable may have
+        # been changed (and the expiration cleared) since.
+        if which in self.expiredb and self.expiredb[which].get(var) == dt:
+            logging.debug("_expired: Deleting object '%s' from database '%s' because of expiration" % (var,which))
+            self.remove(which,var)
+
+    @synchronizedOn(0)
     def expire(self,which,var,secs):
         """
         Set an time to live limit on a variable. The variable must exist
@@ -478,7 +959,7 @@ class DB(object):
         invocations.
         """
         # Make sure we have the variable in the system.
-        if var not in self.db[which].keys():
+        if var not in self.db[which]:
             raise ERR("no such key")
 
         # See if there is an expiration already on the variable. If so
@@ -489,8 +970,7 @@ class DB(object):
             self.__expire(which,var,secs)
 
             # Things have changed...
-            self.changed = 1
-            self.version += 1
+            self.__changed()
 
         # UPdate the operation count.
         self.totalOperations += 1
@@ -498,7 +978,7 @@ class DB(object):
         # Return the results
         return 1
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def getTTL(self,which,var):
         """
         Get the current time to live value for a variable.
@@ -506,23 +986,23 @@ class DB(object):
         # Just check to see if the expire exists.
         pass
 
-    @synchronized(lock)
+    @synchronizedAll
     def flushAll(self):
         """
         Remove all the variables behind all the database tables.
         """
         self.db = {"0":{}}
         self.expiredb = {}
+        self.__newLocks()
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def flush(self,which):
         """
         Remove all the variables behind a specific table.
@@ -535,17 +1015,16 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def size(self,which):
         """
         Return the number of keys in a specific table.
         """
 
         # Compute how many keys are in the subdictionary
-        val = len(self.db[which].keys())
+        val = len(self.db[which])
 
         # Update the counters.
         self.totalOperations += 1
@@ -553,27 +1032,66 @@ class DB(object):
         # Return the count.
         return val
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def insert(self,which,var,index,val):
+        # Find the list, creating it if need be. Lists past the compact size are
+        # kept in a deque, so adding at either end takes the same time however long
+        # the list is.
+        v = self.__listFor(which,var,self.__check(which,var,"list"),val)
+
         # Insert it...
         if index == -1:
-            self.db[which][var].append(val)
+            v.append(val)
+        elif type(v) is list:
+            v.insert(index,val)
+        elif index == 0:
+            v.appendleft(val)
         else :
-            self.db[which][var].insert(index,val)
+            v.rotate(-index)
+            v.appendleft(val)
+            v.rotate(index)
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
+
+    @synchronizedOn(0)
+    def push(self,which,var,vals,head=False):
+        """
+        Add the values, one after the other, to the end of a list (or its head, so
+        the last value ends up first), creating the list if need be.
+        """
+        v = self.__check(which,var,"list")
+        if v is None:
+            v = self.db[which][var] = []
+
+        # A compact list that the values would make too big is changed for a deque
+        # once, rather than being added to a value at a time.
+        if type(v) is list and (len(v) + len(vals) > self.listMaxEntries or
+                                any(len(x) > self.listMaxValue for x in vals)):
+            v = self.db[which][var] = deque(v)
+        if not head:
+            v.extend(vals)
+        elif type(v) is list:
+            v[0:0] = vals[::-1]
+        else:
+            v.extendleft(vals)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
 
-    @synchronized(lock)
+        # Update the database change flag and the version number.
+        self.__changed()
+
+    @synchronizedOn(0)
     def listlen(self,which,var):
 
         # Get the length of the list
-        rc = len(self.db[which][var])
+        rc = len(self.__check(which,var,"list",True))
 
         # Update the total op. counter
         self.totalOperations += 1
@@ -581,17 +1099,17 @@ class DB(object):
         # Return the results.
         return rc
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def lrange(self,which,var,s,e):
 
         # Does the variable exist?
-        if var in self.db[which].keys():
+        v = self.__check(which,var,"list")
+        if v is not None:
             # Yes, so just extract the piece we want.
-            v = self.db[which][var]
-            if s < 0 : s = len(v) + s
+            if s < 0 : s = max(len(v) + s,0)
             if e < 0 : e = len(v) + e
             e = e + 1
-            rc = v[s:e]
+            rc = list(islice(v,s,max(e,s)))
         else:
             # Nope, return an empty list.
             rc = []
@@ -602,44 +1120,53 @@ class DB(object):
         # Return the results
         return rc
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def ltrim(self,which,var,s,e):
 
-        # Update the list variable...we keep the slice [s;e] of the list
-        v = self.db[which][var]
-        if e > len(v): e = len(v)
-        try:
-            self.db[which][var] = v[s:e]
-        except IndexError:
-            self.db[which][var] = []
+        # Update the list variable...we keep the elements s through e of the list,
+        # counting from the end if negative. Only the ends of the list are touched,
+        # so trimming a capped list after a push takes next to no time.
+        v = self.__check(which,var,"list",True)
+        n = len(v)
+        if s < 0: s = max(n + s,0)
+        if e < 0: e = n + e
+        if e >= n: e = n - 1
+        if type(v) is list:
+            v[:] = v[s:e+1] if s <= e else []
+        elif s > e:
+            v.clear()
+        else:
+            for i in xrange(s): v.popleft()
+            for i in xrange(n - 1 - e): v.pop()
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def lindex(self,which,var,i):
 
         try:
-            r = self.db[which][var][i]
+            r = self.__check(which,var,"list",True)[i]
         except IndexError:
             r = None
         self.totalOperations += 1
         return r
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def lset(self,which,var,i,val):
 
         # Find the variable and make sure we have a good
         # index.
-        r = self.db[which][var]
+        r = self.__check(which,var,"list",True)
         if  i >= len(r):
             self.totalOperations += 1
             return -1
+        if type(r) is list and len(val) > self.listMaxValue:
+            r = self.db[which][var] = deque(r)
         r[i] = val
 
         # Increment the total op. count.
@@ -647,70 +1174,80 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # Return the results
         return 0
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def lrem(self,which,var,num,val):
 
         # Get the list we are to change...we are going to remove
         # at least 'num' instances of 'val' from the list. If
-        # num is 0, we will remove all instances.
-        v = self.db[which][var]
-        if num >= 0 :
-            start = 0
-            end = len(v)
-            incr = 1
-            rev = 0
-            if num == 0: num = end
+        # num is 0, we will remove all instances. A negative num
+        # removes them starting from the end of the list.
+        #
+        # Elements are taken off the end we start from until we
+        # have removed enough, and the ones we kept are put back,
+        # so we never look further into the list than we have to.
+        v = self.__check(which,var,"list",True)
+        fromHead = num >= 0
+        if type(v) is list:
+            # A compact list is short enough to just go through.
+            idx = xrange(len(v)) if fromHead else xrange(len(v)-1,-1,-1)
+            drop = [i for i in idx if v[i] == val]
+            if num != 0: drop = drop[:abs(num)]
+            for i in sorted(drop,reverse=True):
+                del v[i]
+            cnt = len(drop)
+            num = 0
+        elif fromHead :
+            take = v.popleft
         else:
-            start = len(v)-1
-            end = -1
-            incr = -1
+            take = v.pop
             num = abs(num)
-            rev = 1
-        l = []
-        cnt = 0
-        for i in range(start,end,incr):
-            if v[i] != val:
-                l.append(v[i])
-            else:
-                if num > 0:
-                    cnt = cnt + 1
-                    num = num - 1
+        if type(v) is deque:
+            if num == 0: num = len(v)
+            kept = []
+            cnt = 0
+            while v and cnt < num:
+                i = take()
+                if i != val:
+                    kept.append(i)
                 else:
-                    l.append(v[i])
+                    cnt = cnt + 1
 
-        # Append always puts things at the end of the list, which is okay
-        # if we are scanning the list from 0 to the end ( num > -1). If we
-        # are scanning it the other way, we need to reverse the list.
-        if rev : l.reverse()
-        self.db[which][var] = l
+            # The kept elements are in the order we took them off, so
+            # they go back on in reverse.
+            kept.reverse()
+            if fromHead:
+                v.extendleft(kept)
+            else:
+                v.extend(kept)
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # Return the results.
         return cnt
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def lpop(self,which,var):
 
         try:
             # Does the variable exist? If so, pop it off the
             # front of the list. If not, return None!
-            if var in self.db[which].keys():
-                rc = self.db[which][var].pop(0)
-            else:
+            v = self.__check(which,var,"list")
+            if v is None:
                 rc = None
+            elif type(v) is list:
+                rc = v.pop(0)
+            else:
+                rc = v.popleft()
         except IndexError:
             rc = None
 
@@ -719,22 +1256,19 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # Return either None, if there is no list or nothing
         # on it or the thing.
         return rc
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def rpop(self,which,var):
 
         try:
             # See lpop for commentary...
-            if var in self.db[which].keys():
-                rc = self.db[which][var].pop()
-            else:
-                rc = None
+            v = self.__check(which,var,"list")
+            rc = v.pop() if v is not None else None
         except IndexError:
             rc = None
 
@@ -743,251 +1277,447 @@ class DB(object):
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
         # Return any defined values.
         return rc
 
-    @synchronized(lock)
-    def sadd(self,which,var,item):
-
-        if var not in self.db[which].keys():
-            self.db[which][var] = set()
-        if item in self.db[which][var]:
-            rc = 0
-        else:
-            self.db[which][var].add(item)
-            rc = 1
+    @synchronizedOn(0)
+    def sadd(self,which,var,items):
+        """
+        Add the items to a set, creating it if need be. Returns how many of them
+        were new.
+        """
+        d = self.db[which]
+        v = self.__check(which,var,"set")
+        rc = 0
+        for item in items:
+            rc += self.__sadd(which,var,v,item)
+            v = d[var]
 
         # Increment the total op. count.
         self.totalOperations += 1
         if rc:
             # The database has changed!
             self.totalChangeOperations += 1
-            self.changed = 1
-            self.version += 1
+            self.__changed()
 
         # Return the results
         return rc
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def scard(self,which,var):
 
-        if var not in self.db[which].keys():
-            self.db[which][var] = set()
+        v = self.__check(which,var,"set")
+        if v is None:
+            v = self.db[which][var] = ()
             self.totalChangeOperations += 1
-            self.changed = 1
-            self.version += 1
+            self.__changed()
 
         self.totalOperations += 1
-        return len(self.db[which][var])
+        return len(v)
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def sismember(self,which,var,member):
 
         rc = 0
-        if (var in self.db[which].keys()) and (member in self.db[which][var]):
+        v = self.__check(which,var,"set")
+        if v is not None and member in v:
             rc = 1
         self.totalOperations += 1
         return rc
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def smembers(self,which,var):
 
-        if var not in self.db[which].keys():
-            self.db[which][var] = set()
+        v = self.__check(which,var,"set")
+        if v is None:
+            v = self.db[which][var] = ()
             self.totalChangeOperations += 1
-            self.changed = 1
-            self.version += 1
+            self.__changed()
         self.totalOperations += 1
-        return list(self.db[which][var])
-
-    @synchronized(lock)
-    def srem(self,which,var,item):
+        return list(v)
 
-        rc = 1 if item in self.db[which][var] else 0
+    @synchronizedOn(0)
+    def srem(self,which,var,items):
+        """
+        Remove the items from a set, returning how many of them were there.
+        """
+        d = self.db[which]
+        v = self.__check(which,var,"set",True)
+        rc = 0
+        for item in items:
+            rc += self.__srem(which,var,v,item)
+            v = d[var]
         if rc:
-            self.db[which][var].remove(item)
             self.totalChangeOperations += 1
-            self.changed = 1
-            self.version += 1
+            self.__changed()
         self.totalOperations += 1
         return rc
 
-    @synchronized(lock)
-    def sinter(self,which,listOfVars):
+    def __setsOf(self,which,listOfVars):
+        # The values of the set variables named, with None for those that don't
+        # exist or aren't sets.
+        return [self.__setOf(which,i) for i in listOfVars]
 
-        result = None
+    @synchronizedOn(0)
+    def sinter(self,which,listOfVars):
+        """
+        Return the intersection of the sets, as a set (or IntSet) of our own.
+        """
         self.totalOperations += 1
-        for i in listOfVars:
-                # If a variable doesn't exist, it is like
-                # a set with no members. Any set that intersects
-                # with the empty set is empty. So we just return!
-                if i not in self.db[which].keys():
-                    return []
-                if type(self.db[which][i]) is not type(set()):
-                    return []
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.intersection(self.db[which][i])
-        return list(result) if result else []
+        return setops.inter(self.__setsOf(which,listOfVars))
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def sunion(self,which,listOfVars):
+        """
+        Return the union of the sets, as a set (or IntSet) of our own.
+        """
+        self.totalOperations += 1
+        return setops.union(self.__setsOf(which,listOfVars))
 
-        result = None
-        for i in listOfVars:
-                if i not in self.db[which].keys():
-                    continue
-                if type(self.db[which][i]) is not type(set()):
-                    continue
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.union(self.db[which][i])
+    @synchronizedOn(0)
+    def sdiff(self,which,listOfVars):
+        """
+        Return the members of the first set in none of the others, as a set (or
+        IntSet) of our own.
+        """
         self.totalOperations += 1
-        return list(result) if result else []
+        return setops.diff(self.__setsOf(which,listOfVars))
+
+    def __store(self,which,var,result):
+        # Store the result of a set operation (which is ours to keep) in var.
+        self.db[which][var] = self.__packSet(result)
+        self.__clearExpire(which,var)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
 
-    @synchronized(lock)
+        # Update the database change flag and the version number.
+        self.__changed()
+
+    @synchronizedOn(0)
     def sinterstore(self,which,var,listOfVars):
+        self.__store(which,var,setops.inter(self.__setsOf(which,listOfVars)))
+
+    @synchronizedOn(0)
+    def sunionstore(self,which,var,listOfVars):
+        self.__store(which,var,setops.union(self.__setsOf(which,listOfVars)))
+
+    @synchronizedOn(0)
+    def sdiffstore(self,which,var,listOfVars):
+        self.__store(which,var,setops.diff(self.__setsOf(which,listOfVars)))
+
+    @synchronizedOn(0)
+    def spop(self,which,var):
 
         result = None
-        for i in listOfVars:
-                # If a variable doesn't exist, it is like
-                # a set with no members. Any set that intersects
-                # with the empty set is empty. So we just return!
-                if i not in self.db[which].keys():
-                    result = set()
-                    break
-                if type(self.db[which][i]) is not type(set()):
-                    result = set()
-                    break
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.intersection(self.db[which][i])
-        self.db[which][var] = result
+        v = self.__check(which,var,"set")
+        if v:
+            if type(v) is tuple:
+                result = v[-1]
+                self.db[which][var] = v[:-1]
+            else:
+                result = v.pop()
+            self.totalChangeOperations += 1
+            self.__changed()
+        self.totalOperations += 1
+        return result
+
+    @synchronizedOn(0)
+    def smove(self,which,frm,to,member):
+
+        # The from and destination variables, if they exist must be sets.
+        self.totalOperations += 1
+        try:
+            f = self.__check(which,frm,"set")
+            t = self.__check(which,to,"set")
+        except ERR:
+            return -1
+
+        # Ok,so far. Set the default return to it failing.
+        result = 0
+
+        # Does the from variable exist and does the member exist in it?
+        if f is not None and member in f:
+            self.__srem(which,frm,f,member)
+            self.__sadd(which,to,self.db[which].get(to),member)
+            result = 1
+
+            # Increment the total op. count.
+            self.totalChangeOperations += 1
+
+            # Update the database change flag and the version number.
+            self.__changed()
+
+        return result
+
+    @synchronizedOn(0)
+    def zadd(self,which,var,member,score):
+
+        # Add the member, or give it its new score, creating the
+        # sorted set if need be.
+        v = self.__check(which,var,"zset")
+        if v is None:
+            v = self.db[which][var] = SortedSet()
+        rc = v.add(member,score)
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
-    def sunionstore(self,which,var,listOfVars):
+        # Return 1 if the member is new.
+        return rc
 
-        result = None
-        for i in listOfVars:
-                if i not in self.db[which].keys():
-                    continue
-                if type(self.db[which][i]) is not type(set()):
-                    continue
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.union(self.db[which][i])
-        self.db[which][var] = result
+    @synchronizedOn(0)
+    def zincrby(self,which,var,member,incr):
+
+        v = self.__check(which,var,"zset")
+        if v is None:
+            v = self.db[which][var] = SortedSet()
+        rc = v.incr(member,incr)
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
-    @synchronized(lock)
-    def sdiff(self,which,listOfVars):
+        # Return the new score.
+        return rc
 
-        result = None
-        for i in listOfVars:
-                if i not in self.db[which].keys():
-                    continue
-                if type(self.db[which][i]) is not type(set()):
-                    continue
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.difference(self.db[which][i])
+    @synchronizedOn(0)
+    def zrem(self,which,var,member):
+
+        v = self.__check(which,var,"zset")
+        rc = v.remove(member) if v is not None else 0
+        if rc:
+            self.totalChangeOperations += 1
+            self.__changed()
         self.totalOperations += 1
-        return list(result) if result else []
+        return rc
 
-    @synchronized(lock)
-    def sdiffstore(self,which,var,listOfVars):
+    @synchronizedOn(0)
+    def zcard(self,which,var):
 
-        result = None
-        for i in listOfVars:
-                if i not in self.db[which].keys():
-                    continue
-                if type(self.db[which][i]) is not type(set()):
-                    continue
-                if result is None:
-                    result = self.db[which][i]
-                else:
-                    result = result.difference(self.db[which][i])
-        self.db[which][var] = result
+        v = self.__check(which,var,"zset")
+        self.totalOperations += 1
+        return len(v) if v is not None else 0
+
+    @synchronizedOn(0)
+    def zscore(self,which,var,member):
+
+        v = self.__check(which,var,"zset")
+        self.totalOperations += 1
+        return v.score(member) if v is not None else None
+
+    @synchronizedOn(0)
+    def zrank(self,which,var,member):
+
+        v = self.__check(which,var,"zset")
+        self.totalOperations += 1
+        return v.rank(member) if v is not None else None
+
+    @synchronizedOn(0)
+    def zrange(self,which,var,s,e):
+
+        # Return the (member,score) pairs from rank s through e.
+        v = self.__check(which,var,"zset")
+        self.totalOperations += 1
+        return v.range(s,e) if v is not None else []
+
+    @synchronizedOn(0)
+    def zrangebyscore(self,which,var,min,max,minEx=False,maxEx=False,offset=0,count=-1):
+
+        # Return the (member,score) pairs with scores between min and max.
+        v = self.__check(which,var,"zset")
+        self.totalOperations += 1
+        if v is None:
+            return []
+        return v.rangeByScore(min,max,minEx,maxEx,offset,count)
+
+    @synchronizedOn(0)
+    def hset(self,which,var,field,val):
+
+        # Set the field, creating the hash if need be.
+        v = self.__check(which,var,"hash")
+        if v is None:
+            v = self.db[which][var] = Hash()
+        rc = v.set(field,val)
 
         # Increment the total op. count.
         self.totalOperations += 1
         self.totalChangeOperations += 1
 
         # Update the database change flag and the version number.
-        self.changed = 1
-        self.version += 1
+        self.__changed()
 
+        # Return 1 if the field is new.
+        return rc
 
-    @synchronized(lock)
-    def spop(self,which,var):
+    @synchronizedOn(0)
+    def hget(self,which,var,field):
 
-        result = None
-        try:
-            result = self.db[which][var].pop()
-            self.totalChangeOperations += 1
-            self.changed = 1
-            self.version += 1
-        except KeyError:
-            pass
-        except NameError:
-            pass
+        v = self.__check(which,var,"hash")
         self.totalOperations += 1
-        return result
+        return v.get(field) if v is not None else None
 
-    @synchronized(lock)
-    def smove(self,which,frm,to,member):
+    @synchronizedOn(0)
+    def hmget(self,which,var,fields):
 
-        # The from and destination variables, if they exist must be sets.
+        # Return the values of the fields, None for any that aren't there.
+        v = self.__check(which,var,"hash")
         self.totalOperations += 1
-        if frm in self.db[which].keys() and type(self.db[which][frm]) != type(set()):
-            return -1
-        if to in self.db[which].keys() and type(self.db[which][to]) != type(set()):
-            return -1
+        if v is None:
+            return [None] * len(fields)
+        return [v.get(f) for f in fields]
 
-        # Ok,so far. Set the default return to it failing.
-        result = 0
+    @synchronizedOn(0)
+    def hgetall(self,which,var):
 
-        # Does the from variable exist and does the member exist in it?
-        if frm in self.db[which].keys() and member in self.db[which][frm]:
-            self.db[which][frm].remove(member)
-            if to not in self.db[which].keys():
-                self.db[which][to] = set()
-            self.db[which][to].add(member)
-            result = 1
+        # Return the (field,value) pairs.
+        v = self.__check(which,var,"hash")
+        self.totalOperations += 1
+        return v.items() if v is not None else []
 
-            # Increment the total op. count.
+    @synchronizedOn(0)
+    def hincrby(self,which,var,field,incr):
+
+        v = self.__check(which,var,"hash")
+        if v is None:
+            v = self.db[which][var] = Hash()
+        rc = v.incr(field,incr)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+        # Return the new value.
+        return rc
+
+    @synchronizedOn(0)
+    def hdel(self,which,var,field):
+
+        v = self.__check(which,var,"hash")
+        rc = v.remove(field) if v is not None else 0
+        if rc:
             self.totalChangeOperations += 1
+            self.__changed()
+        self.totalOperations += 1
+        return rc
 
-            # Update the database change flag and the version number.
-            self.changed = 1
-            self.version += 1
+    @synchronizedOn(0)
+    def pfadd(self,which,var,members):
 
-        return result
+        # Add the members, creating the HyperLogLog if need be.
+        v = self.__check(which,var,"hll")
+        rc = 0
+        if v is None:
+            v = self.db[which][var] = HyperLogLog()
+            rc = 1
+        for m in members:
+            rc |= v.add(m)
+        if rc:
+            self.totalChangeOperations += 1
+            self.__changed()
+        self.totalOperations += 1
+
+        # Return 1 if the estimate may have changed.
+        return rc
+
+    @synchronizedOn(0)
+    def pfcount(self,which,listOfVars):
+        """
+        Return the estimated number of different members added to the HyperLogLogs,
+        taken together. Variables that don't exist are skipped.
+        """
+        hlls = [v for v in [self.__check(which,i,"hll") for i in listOfVars] if v is not None]
+        self.totalOperations += 1
+        if not hlls:
+            return 0
+        if len(hlls) == 1:
+            return hlls[0].count()
+        h = hlls[0].copy()
+        for v in hlls[1:]:
+            h.merge(v)
+        return h.count()
+
+    @synchronizedOn(0)
+    def pfmerge(self,which,var,listOfVars):
+        """
+        Merge the HyperLogLogs into var, creating it if need be.
+        """
+        srcs = [self.__check(which,i,"hll") for i in listOfVars]
+        h = self.__check(which,var,"hll")
+        if h is None:
+            h = self.db[which][var] = HyperLogLog()
+        for v in srcs:
+            if v is not None and v is not h:
+                h.merge(v)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+    @synchronizedOn(0)
+    def bfreserve(self,which,var,errorRate,capacity):
+
+        # Make an empty Bloom filter; the variable must not exist.
+        if var in self.db[which]:
+            raise ERR("-ERR item exists")
+        self.db[which][var] = BloomFilter(capacity,errorRate)
+
+        # Increment the total op. count.
+        self.totalOperations += 1
+        self.totalChangeOperations += 1
+
+        # Update the database change flag and the version number.
+        self.__changed()
+
+    @synchronizedOn(0)
+    def bfadd(self,which,var,items):
+        """
+        Add the items to a Bloom filter, creating it with the default size if need
+        be. Returns whether the filter changed, and a list with a 1 for each item
+        that wasn't there and a 0 for each that probably was.
+        """
+        v = self.__check(which,var,"bloom")
+        c = 0
+        if v is None:
+            v = self.db[which][var] = BloomFilter()
+            c = 1
+        rc = [v.add(i) for i in items]
+        changed = c or 1 in rc
+        if changed:
+            self.totalChangeOperations += 1
+            self.__changed()
+        self.totalOperations += 1
+        return changed,rc
+
+    @synchronizedOn(0)
+    def bfexists(self,which,var,items):
+        """
+        Return a list with a 1 for each item that is probably in a Bloom filter and a
+        0 for each that isn't.
+        """
+        v = self.__check(which,var,"bloom")
+        self.totalOperations += 1
+        if v is None:
+            return [0] * len(items)
+        return [1 if i in v else 0 for i in items]
 
-    @synchronized(lock)
+    @synchronizedOn(0)
     def randomkey(self,which):
 
         try:
@@ -997,7 +1727,7 @@ class DB(object):
         self.totalOperations += 1
         return rc
 
-    @synchronized(lock)
+    @synchronizedAll
     def loadFromIni(self,which,iniFile="mdb.txt"):
 
         # Define a worker function...
@@ -1005,7 +1735,7 @@ class DB(object):
             # Make sure we have a default dictionary to insert these updates. 
             if which is None:
                 which = "0"
-            if which not in self.db.keys():
+            if which not in self.db:
                 self.db[which] = {}
                 self.expiredb[wnicn] = {}
             cdb = self.db[which]
@@ -1036,7 +1766,7 @@ class DB(object):
                         processFile(which,xn[1])
                     elif xn[0].startswith("@select"):
                         which = xn[1]
-                        if which not in self.db.keys():
+                        if which not in self.db:
                             self.db[which] = {}
                             self.expiredb[which] = {}
                         cdb = self.db[which]
@@ -1057,8 +1787,8 @@ class DB(object):
 
         # Read the ini file in, filling in the table
         processFile(which,iniFile)
-        self.changed = 1
-        self.version += 1
+        self.__newLocks()
+        self.__changed()
 
     def _loadFromDump(self,dmp):
         """
@@ -1068,11 +1798,34 @@ class DB(object):
 
         # Restore the variables part of the system. Note that we would never set the changed
         # variable for this - we have it in a file already!
-        self.db = pickle.load(dmp)
-
-        # Do the same for the epxiry dictionary
+        #
+        # The dump is either the pickled database followed by the pickled expiry dictionary,
+        # or (as _saveToDump() writes it now) the list of database names followed by the
+        # pickled database and expiry dictionary for each one.
         c = 0
-        temp = pickle.load(dmp)
+        names = pickle.load(dmp)
+        if type(names) is type({}):
+            self.db = names
+            temp = pickle.load(dmp)
+        else:
+            self.db = {}
+            temp = {}
+            for i in names:
+                self.db[i] = pickle.load(dmp)
+                temp[i] = pickle.load(dmp)
+        self.__newLocks()
+
+        # Put the lists and sets in the form their size calls for (the limits may
+        # have changed since the dump was written, and dumps before the compact
+        # forms hold every list as a Python list).
+        for d in self.db.itervalues():
+            for k,v in d.iteritems():
+                t = type(v)
+                if t is list and (len(v) > self.listMaxEntries or
+                                  any(len(x) > self.listMaxValue for x in v)):
+                    d[k] = deque(v)
+                elif t is tuple or t is set or t is IntSet:
+                    d[k] = self.__packSet(v)
 
         # Now fixup any outstanding expired items or will be expiring. If there are expiry items, this will result in the
         # databae being changed.
@@ -1096,7 +1849,7 @@ class DB(object):
         self.changed = c
         if c: self.version += 1
 
-    @synchronized(lock)
+    @synchronizedAll
     def loadFromDump(self,dump=None):
         """
         Load the database and expire table from files.
@@ -1111,7 +1864,7 @@ class DB(object):
         self._loadFromDump(rdump)
         rdump.close()
 
-    @synchronized(lock)
+    @synchronizedAll
     def replace(self,vers,pdata):
         """
         Replace the database and expre tables from a string.
@@ -1127,45 +1880,67 @@ class DB(object):
         self.changed = 1
         self.totalOperations += 1
 
-    def _saveToDump(self,dmp):
+    def _saveToDump(self,dmp,lock=True):
         """
         Internal routine to save the data and expire information
         to file-like objects. The data is stored in pickled
         format.
-        """
-        # Save the data information
-        pickle.dump(self.db,dmp)
 
-        # Do the same for the expiry dictionary
-        pickle.dump(self.expiredb,dmp)
+        Each database is saved holding only its own lock (unless lock is False,
+        when the caller has the whole database locked), so clients can work on
+        the others while it is saved.
+        """
+        # Save the names of the databases, then the data and expiry information
+        # of each one in turn.
+        names = self.db.keys()
+        pickle.dump(names,dmp)
+        for i in names:
+            l = self.lockFor(i) if lock else None
+            if l: l.acquire()
+            try:
+                pickle.dump(self.db.get(i,{}),dmp)
+                pickle.dump(self.expiredb.get(i,{}),dmp)
+            finally:
+                if l: l.release()
 
         # Update various stats and flags.
         self.timeofLastSave = time.time()
         self.changed = 0
         self.totalOperations += 1
 
-    @synchronized(lock)
     def saveToDump(self,dump=None):
         """
         Visible funtion to save the database and expire tables
         to files.
         """
-        # Dump the variables part of the database
+        # Dump the variables part of the database. It is written to a file of its
+        # own and then put in place, so a save that fails part way (or one made by
+        # another process at the same time) doesn't leave a broken dump behind.
+        # Something that isn't a plain file (/dev/null, say) is written as it is.
         df = dump or self.dbfile
-        dfile = open(df,"w")
+        tmp = "%s.%d" % (df,os.getpid())
+        if os.path.exists(df) and not os.path.isfile(df):
+            tmp = df
+        dfile = open(tmp,"w")
 
         # Do it!
-        self._saveToDump(dfile)
-        dfile.close()
+        try:
+            self._saveToDump(dfile)
+            dfile.close()
+            if tmp != df: os.rename(tmp,df)
+        except:
+            dfile.close()
+            if tmp != df: os.remove(tmp)
+            raise
 
         # Log that we saved it!
         logging.debug("Dumped database to backing store.")
 
 
-    @synchronized(lock)
+    @synchronizedAll
     def getdb(self):
         w = StringIO()
-        self._saveToDump(w)
+        self._saveToDump(w,lock=False)
         contents = w.getvalue()
         w.close()
         return self.version,contents
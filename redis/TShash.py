@@ -0,0 +1,152 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from TSexcept import ERR
+
+# Hashes.
+#
+# A hash maps field names to string values, so an object can be kept in one variable
+# rather than in a variable per field. Most hashes are small, and a dictionary holding
+# a handful of fields costs several times what the fields themselves do. So a small
+# hash keeps its fields and values in one flat list:
+#
+#       [field1, value1, field2, value2, ...]
+#
+# which is looked through from the front. That is as quick as a dictionary for a few
+# dozen fields and takes a fraction of the memory. Once the hash has more than
+# maxEntries fields, or is given a field or value longer than maxValue bytes, it
+# changes over to a dictionary for good.
+#
+class Hash(object):
+    """
+    A hash of fields to values. data is the flat list while the hash is small and
+    the dictionary after that.
+    """
+    __slots__ = ("data",)
+
+    # Past these the flat list is changed for a dictionary. The server sets them
+    # from the config file.
+    maxEntries = 64
+    maxValue = 64
+
+    def __init__(self,pairs=()):
+        self.data = []
+        for field,value in pairs:
+            self.set(field,value)
+
+    def __len__(self):
+        d = self.data
+        return len(d) if type(d) is dict else len(d) >> 1
+
+    def __contains__(self,field):
+        return self.get(field) is not None
+
+    def __iter__(self):
+        # The (field,value) pairs.
+        d = self.data
+        if type(d) is dict:
+            return d.iteritems()
+        return iter(zip(d[::2],d[1::2]))
+
+    # Pickle a hash as its (field,value) pairs, so how it is held doesn't end up
+    # in the dump file. The pairs are put in a tuple, since pickle skips
+    # __setstate__ for an empty state.
+    def __getstate__(self):
+        return (list(self),)
+
+    def __setstate__(self,state):
+        self.__init__(state[0])
+
+    def __repr__(self):
+        return "<Hash %d fields>" % len(self)
+
+    def encoding(self):
+        """
+        Return how the hash is held: "compact" for the flat list, "dict" otherwise.
+        """
+        return "dict" if type(self.data) is dict else "compact"
+
+    def _find(self,field):
+        # Return the index of a field in the flat list, or -1.
+        d = self.data
+        i = 0
+        n = len(d)
+        while i < n:
+            if d[i] == field:
+                return i
+            i += 2
+        return -1
+
+    def get(self,field):
+        """
+        Return the value of a field, or None.
+        """
+        d = self.data
+        if type(d) is dict:
+            return d.get(field)
+        i = self._find(field)
+        return d[i+1] if i >= 0 else None
+
+    def set(self,field,value):
+        """
+        Set the value of a field. Returns 1 if the field is new, 0 if it was there.
+        """
+        d = self.data
+        if type(d) is list:
+            i = self._find(field)
+            if i >= 0 and len(value) <= self.maxValue:
+                d[i+1] = value
+                return 0
+            if i < 0 and len(d) < 2*self.maxEntries and len(field) <= self.maxValue \
+                    and len(value) <= self.maxValue:
+                d.append(field)
+                d.append(value)
+                return 1
+
+            # It's outgrown the list.
+            d = self.data = dict(zip(d[::2],d[1::2]))
+        rc = 0 if field in d else 1
+        d[field] = value
+        return rc
+
+    def incr(self,field,by):
+        """
+        Add by to the integer value of a field (one that isn't there counts as 0),
+        returning the new value.
+        """
+        v = self.get(field)
+        try:
+            v = int(v) + by if v is not None else by
+        except ValueError:
+            raise ERR("-ERR hash value is not an integer")
+        self.set(field,str(v))
+        return v
+
+    def remove(self,field):
+        """
+        Remove a field. Returns 1 if it was there, 0 if it wasn't.
+        """
+        d = self.data
+        if type(d) is dict:
+            return 1 if d.pop(field,None) is not None else 0
+        i = self._find(field)
+        if i < 0:
+            return 0
+        del d[i:i+2]
+        return 1
+
+    def items(self):
+        """
+        Return a list of the (field,value) pairs.
+        """
+        return list(self)
@@ -0,0 +1,211 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from array import array
+from bisect import bisect_left
+from hashlib import md5
+from math import log, sqrt
+from struct import unpack
+
+# HyperLogLogs.
+#
+# A HyperLogLog estimates how many different members have been added to it (unique
+# visitors, say) without keeping the members. Each member is hashed to 64 bits: the low
+# P bits pick one of M registers, and the register remembers the longest run of zero
+# bits seen in the rest of the hash. From the registers the number of members can be
+# worked out to within about 0.8%, however many there are, in a fixed 16KB.
+#
+# Most HyperLogLogs see few members and leave most registers at 0, so to begin with only
+# the registers that aren't 0 are kept, in a sorted array of
+#
+#       register number << 6 | register value
+#
+# once there are more than maxSparse of them the registers are held in a bytearray, one
+# byte each. A byte rather than the 6 bits a register needs means a count can total up
+# the registers with bytearray.count() instead of a Python loop.
+#
+# The estimate is the one in Otmar Ertl's "New cardinality estimation algorithms for
+# HyperLogLog sketches", which is worked out from how many registers hold each value
+# and needs no corrections for small or large counts.
+#
+P = 14
+M = 1 << P
+Q = 64 - P
+ALPHA = 0.5 / log(2)
+
+def hashOf(member):
+    """
+    Return the 64 bit hash of a member. It doesn't change from one run (or
+    machine) to the next, so a saved HyperLogLog can go on being added to.
+    """
+    return unpack("<Q",md5(member).digest()[:8])[0]
+
+def _sigma(x):
+    if x == 1.0:
+        return float("inf")
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        zp = z
+        z += x * y
+        y += y
+        if z == zp:
+            return z
+
+def _tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = sqrt(x)
+        zp = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == zp:
+            return z / 3.0
+
+def estimate(c):
+    """
+    Return the estimated number of members given c, the number of registers that
+    hold each value 0 to Q+1.
+    """
+    m = float(M)
+    z = m * _tau((m - c[Q+1]) / m)
+    for k in xrange(Q,0,-1):
+        z = 0.5 * (z + c[k])
+    z += m * _sigma(c[0] / m)
+    return int(round(ALPHA * m * m / z))
+
+class HyperLogLog(object):
+    """
+    A HyperLogLog. regs is the sorted array of the registers that aren't 0 while
+    it is sparse and the bytearray of all of them after that. card is the last
+    count, kept until a register changes.
+    """
+    __slots__ = ("regs","card")
+
+    # Past this many registers the array is changed for a bytearray. The server
+    # sets it from the config file.
+    maxSparse = 3000
+
+    def __init__(self):
+        self.regs = array("I")
+        self.card = None
+
+    # Pickle the registers as a string or a list, which doesn't depend on the size
+    # of the machine's integers.
+    def __getstate__(self):
+        r = self.regs
+        return (str(r),) if type(r) is bytearray else (r.tolist(),)
+
+    def __setstate__(self,state):
+        r = state[0]
+        self.regs = bytearray(r) if type(r) is str else array("I",r)
+        self.card = None
+
+    def __repr__(self):
+        return "<HyperLogLog %s>" % self.encoding()
+
+    def encoding(self):
+        """
+        Return how the registers are held: "sparse" or "dense".
+        """
+        return "dense" if type(self.regs) is bytearray else "sparse"
+
+    def _toDense(self):
+        d = bytearray(M)
+        for v in self.regs:
+            d[v >> 6] = v & 63
+        self.regs = d
+
+    def _set(self,i,r):
+        # Raise register i to r. Returns 1 if it changed, 0 if it was already there.
+        regs = self.regs
+        if type(regs) is bytearray:
+            if regs[i] >= r:
+                return 0
+            regs[i] = r
+        else:
+            k = bisect_left(regs,i << 6)
+            if k < len(regs) and regs[k] >> 6 == i:
+                if regs[k] & 63 >= r:
+                    return 0
+                regs[k] = i << 6 | r
+            elif len(regs) < self.maxSparse:
+                regs.insert(k,i << 6 | r)
+            else:
+                self._toDense()
+                self.regs[i] = r
+        self.card = None
+        return 1
+
+    def add(self,member):
+        """
+        Add a member. Returns 1 if a register changed, 0 if not.
+        """
+        x = hashOf(member)
+
+        # The register value is one more than the number of zero bits at the bottom
+        # of what is left of the hash.
+        w = (x >> P) | (1 << Q)
+        return self._set(x & (M - 1),(w & -w).bit_length())
+
+    def merge(self,other):
+        """
+        Add the members of another HyperLogLog to this one, by taking the larger of
+        each pair of registers.
+        """
+        o = other.regs
+        if type(o) is bytearray:
+            if type(self.regs) is not bytearray:
+                self._toDense()
+            regs = self.regs
+            for i,r in enumerate(o):
+                if r > regs[i]:
+                    regs[i] = r
+            self.card = None
+        else:
+            for v in o:
+                self._set(v >> 6,v & 63)
+
+    def copy(self):
+        """
+        Return a copy.
+        """
+        h = HyperLogLog()
+        h.regs = self.regs[:]
+        h.card = self.card
+        return h
+
+    def counts(self):
+        """
+        Return how many registers hold each value, 0 to Q+1.
+        """
+        regs = self.regs
+        if type(regs) is bytearray:
+            return [regs.count(chr(k)) for k in xrange(Q+2)]
+        c = [0] * (Q+2)
+        for v in regs:
+            c[v & 63] += 1
+        c[0] += M - len(regs)
+        return c
+
+    def count(self):
+        """
+        Return the estimated number of members.
+        """
+        if self.card is None:
+            self.card = estimate(self.counts())
+        return self.card
@@ -0,0 +1,184 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from array import array
+from bisect import bisect_left
+from itertools import imap
+
+# Sets of integers.
+#
+# A set whose members are all integers (user ids, say) is held as a sorted array of
+# machine integers: 8 bytes a member, against the 70 or more each string costs in a
+# Python set. Membership is a binary search, and intersections, unions and
+# differences of two of them are done by walking the arrays side by side.
+#
+# Members are still strings as far as the clients are concerned. Only a string that
+# is the usual way of writing its number (no leading zeros, + sign or spaces) can be
+# held, so that it reads back exactly as it was given.
+#
+TYPECODE = "l"
+MAXVAL = 2**(array(TYPECODE).itemsize*8 - 1) - 1
+MINVAL = -MAXVAL - 1
+
+def toInt(s):
+    """
+    Return the integer a member stands for, or None if it can't be held in an
+    IntSet.
+    """
+    if not s or len(s) > 20:
+        return None
+    try:
+        n = int(s)
+    except ValueError:
+        return None
+    if n < MINVAL or n > MAXVAL or str(n) != s:
+        return None
+    return n
+
+def fromSorted(a):
+    # Return an IntSet holding the sorted array a, which must have no duplicates.
+    s = IntSet.__new__(IntSet)
+    s.a = a
+    return s
+
+class IntSet(object):
+    """
+    A set of integer members, held in a sorted array. It is used like a Python set
+    of the members' strings.
+    """
+    __slots__ = ("a",)
+
+    def __init__(self,ints=()):
+        self.a = array(TYPECODE,sorted(set(ints)))
+
+    def __len__(self):
+        return len(self.a)
+
+    def __contains__(self,member):
+        n = toInt(member)
+        return n is not None and self._find(n) >= 0
+
+    def __iter__(self):
+        return imap(str,self.a)
+
+    # Pickle as a list of the numbers, which doesn't depend on the size of the
+    # machine's integers. It is put in a tuple, since pickle skips __setstate__
+    # for an empty state.
+    def __getstate__(self):
+        return (self.a.tolist(),)
+
+    def __setstate__(self,state):
+        self.a = array(TYPECODE,state[0])
+
+    def __repr__(self):
+        return "<IntSet %d members>" % len(self.a)
+
+    def _find(self,n):
+        # Return the index of n in the array, or -1.
+        a = self.a
+        i = bisect_left(a,n)
+        return i if i < len(a) and a[i] == n else -1
+
+    def add(self,n):
+        """
+        Add the integer n. Returns 1 if it is new, 0 if it was there.
+        """
+        a = self.a
+        i = bisect_left(a,n)
+        if i < len(a) and a[i] == n:
+            return 0
+        a.insert(i,n)
+        return 1
+
+    def remove(self,member):
+        """
+        Remove a member. Returns 1 if it was there, 0 if it wasn't.
+        """
+        n = toInt(member)
+        i = self._find(n) if n is not None else -1
+        if i < 0:
+            return 0
+        self.a.pop(i)
+        return 1
+
+    def pop(self):
+        """
+        Remove and return a member (the largest).
+        """
+        return str(self.a.pop())
+
+    def intersection(self,other):
+        """
+        Return an IntSet of the members also in other.
+        """
+        if type(other) is not IntSet:
+            return fromSorted(array(TYPECODE,[n for n in self.a if str(n) in other]))
+
+        # Go through the smaller array, finding each member in the larger one. The
+        # search only looks past where the last one was found.
+        a,b = self.a,other.a
+        if len(a) > len(b):
+            a,b = b,a
+        rc = array(TYPECODE)
+        j = 0
+        nb = len(b)
+        for n in a:
+            j = bisect_left(b,n,j)
+            if j == nb:
+                break
+            if b[j] == n:
+                rc.append(n)
+        return fromSorted(rc)
+
+    def union(self,other):
+        """
+        Return the members in either set: an IntSet if other is one, a set if not.
+        """
+        if type(other) is not IntSet:
+            return set(self).union(other)
+        a,b = self.a,other.a
+        rc = array(TYPECODE)
+        i = j = 0
+        na,nb = len(a),len(b)
+        while i < na and j < nb:
+            x,y = a[i],b[j]
+            if x < y:
+                rc.append(x)
+                i += 1
+            elif y < x:
+                rc.append(y)
+                j += 1
+            else:
+                rc.append(x)
+                i += 1
+                j += 1
+        rc.extend(a[i:])
+        rc.extend(b[j:])
+        return fromSorted(rc)
+
+    def difference(self,other):
+        """
+        Return an IntSet of the members not in other.
+        """
+        if type(other) is not IntSet:
+            return fromSorted(array(TYPECODE,[n for n in self.a if str(n) not in other]))
+        a,b = self.a,other.a
+        rc = array(TYPECODE)
+        j = 0
+        nb = len(b)
+        for n in a:
+            while j < nb and b[j] < n:
+                j += 1
+            if j == nb or b[j] != n:
+                rc.append(n)
+        return fromSorted(rc)
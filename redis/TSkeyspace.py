@@ -0,0 +1,178 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from fnmatch import translate
+
+from decorators import synchronized
+
+# Keyspaces.
+#
+# Each database is a dictionary of variable names to values. KEYS has to find the
+# names that match a glob pattern like "session:*", and looking at every name in the
+# database to do it takes as long as there are names, however few of them match. Most
+# patterns start with some fixed text, though, so a Keyspace keeps a sorted list of
+# the names as well, and finds the ones starting with that text by a binary search.
+#
+# Keeping track of the names makes every change to a Keyspace cost more, so a
+# database stays a plain dictionary until the first KEYS on it, and is made a
+# Keyspace then.
+#
+# The index is only made the first time it is needed. After that the names added and
+# removed are kept track of, and put into the index the next time it is used; a lot
+# of them at once and it is made again.
+#
+# Patterns are turned into regular expressions once and kept, the most recently used
+# GLOBCACHE of them.
+#
+GLOBCACHE = 256
+
+globs = OrderedDict()
+globLock = threading.Lock()
+
+WILD = re.compile(r"[*?[]")
+
+@synchronized(globLock)
+def compileGlob(pattern):
+    """
+    Return the match function of the regular expression for a glob pattern.
+    """
+    m = globs.pop(pattern,None)
+    if m is None:
+        m = re.compile(translate(pattern)).match
+        if len(globs) >= GLOBCACHE:
+            globs.popitem(False)
+    globs[pattern] = m
+    return m
+
+def literalPrefix(pattern):
+    """
+    Return the fixed text a glob pattern starts with, all of it if it has no
+    wildcards.
+    """
+    w = WILD.search(pattern)
+    return pattern[:w.start()] if w else pattern
+
+class Keyspace(dict):
+    """
+    A database: a dictionary of variable names to values, with an index of the
+    names, in order. index is None until it is first needed; added and removed are
+    the names it doesn't have yet and the names it has that are gone.
+    """
+    __slots__ = ("index","added","removed")
+
+    def __init__(self,*args,**kw):
+        dict.__init__(self,*args,**kw)
+        self.index = None
+        self.added = set()
+        self.removed = set()
+
+    # Pickle a keyspace as a plain dictionary of its variables, without the index,
+    # and without making a dictionary of them first. It is made a Keyspace again by
+    # the next KEYS after it is loaded.
+    def __reduce__(self):
+        return (dict,(),None,None,self.iteritems())
+
+    def _add(self,key):
+        if key in self.removed:
+            self.removed.discard(key)
+        else:
+            self.added.add(key)
+
+    def _remove(self,key):
+        if key in self.added:
+            self.added.discard(key)
+        else:
+            self.removed.add(key)
+
+    def __setitem__(self,key,value):
+        if self.index is not None and key not in self:
+            self._add(key)
+        dict.__setitem__(self,key,value)
+
+    def __delitem__(self,key):
+        dict.__delitem__(self,key)
+        if self.index is not None:
+            self._remove(key)
+
+    def pop(self,key,*default):
+        if self.index is not None and key in self:
+            self._remove(key)
+        return dict.pop(self,key,*default)
+
+    def popitem(self):
+        key,value = dict.popitem(self)
+        if self.index is not None:
+            self._remove(key)
+        return key,value
+
+    def setdefault(self,key,value=None):
+        if key not in self:
+            self[key] = value
+        return self[key]
+
+    def update(self,*args,**kw):
+        for key,value in dict(*args,**kw).iteritems():
+            self[key] = value
+
+    def clear(self):
+        dict.clear(self)
+        self.index = None
+        self.added.clear()
+        self.removed.clear()
+
+    def sortedKeys(self):
+        """
+        Return the index: the names, in order. It must not be changed.
+        """
+        index = self.index
+        if index is None or len(self.added) + len(self.removed) > len(index) >> 4:
+            index = self.index = sorted(self)
+        else:
+            for key in self.removed:
+                del index[bisect_left(index,key)]
+            for key in self.added:
+                insort(index,key)
+        self.added.clear()
+        self.removed.clear()
+        return index
+
+    def match(self,pattern):
+        """
+        Return a list of the names that match a glob pattern.
+        """
+        prefix = literalPrefix(pattern)
+        if prefix == pattern:
+            return [pattern] if pattern in self else []
+        m = compileGlob(pattern)
+        if not prefix:
+            return filter(m,self)
+
+        # Go through the names starting with the prefix. For "prefix*" that is
+        # all there is to it.
+        index = self.sortedKeys()
+        every = pattern == prefix + "*"
+        rc = []
+        i = bisect_left(index,prefix)
+        n = len(index)
+        while i < n:
+            key = index[i]
+            if not key.startswith(prefix):
+                break
+            if every or m(key):
+                rc.append(key)
+            i += 1
+        return rc
@@ -0,0 +1,193 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import asyncore
+import select
+import logging
+import time
+import heapq
+from itertools import count
+from errno import ENOENT, EINTR
+
+# The event loop.
+#
+# asyncore.loop() uses select(), which can't watch more than FD_SETSIZE (normally
+# 1024) sockets and asks every dispatcher whether it is readable and writable on each
+# pass, whether anything happened on it or not. The Poller keeps the interest for
+# each socket registered with epoll (or poll, where there is no epoll) and only
+# changes it when a dispatcher's readable()/writable() answer changes. Each pass of
+# the loop costs time in proportion to the sockets that had something happen on them,
+# not the number of connections.
+#
+# Interest in writing is only registered while a dispatcher has output waiting, so
+# idle connections never wake the loop up.
+#
+# The Poller also runs timed calls (see callLater()). When the server runs single
+# threaded, starting saves of the database, queueing changes for the slaves, expiring
+# variables and the shutdown timer are all done this way, on the same thread that
+# serves clients. The save itself is made by a child process and the changes are sent
+# by the slaves' dispatchers, so neither keeps the clients waiting.
+#
+class Timer(object):
+    """
+    A call scheduled on the Poller. It can be cancelled up until the time it runs.
+    """
+    def __init__(self,when,func,args):
+        self.when = when
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Poller(object):
+    """
+    Runs asyncore dispatchers with epoll or poll. New dispatchers must be handed to
+    update() once they are created; after that the Poller keeps track of them by
+    itself.
+    """
+    def __init__(self,map=None):
+        self.map = asyncore.socket_map if map is None else map
+        if hasattr(select,"epoll"):
+            self.poller = select.epoll()
+            self.name = "epoll"
+            self.scale = 1.0
+        else:
+            self.poller = select.poll()
+            self.name = "poll"
+            self.scale = 1000.0
+
+        # The event mask registered for each file descriptor.
+        self.masks = {}
+
+        # Timed calls, as a heap of (when, sequence no., Timer). The sequence number
+        # keeps calls due at the same time in the order they were made.
+        self.timers = []
+        self.seq = count()
+
+    def callAt(self,when,func,*args):
+        """
+        Call func(*args) from the loop at the unix time when. Returns a Timer.
+        """
+        t = Timer(when,func,args)
+        heapq.heappush(self.timers,(when,self.seq.next(),t))
+        return t
+
+    def callLater(self,delay,func,*args):
+        """
+        Call func(*args) from the loop after delay seconds. A delay of 0 runs it
+        once the events of the current pass have been handled. Returns a Timer.
+        """
+        return self.callAt(time.time()+delay,func,*args)
+
+    def runTimers(self):
+        """
+        Run the timed calls that are due.
+        """
+        now = time.time()
+        while self.timers and self.timers[0][0] <= now:
+            t = heapq.heappop(self.timers)[2]
+            if t.cancelled:
+                continue
+            try:
+                t.func(*t.args)
+            except Exception,e:
+                logging.exception(e)
+
+    def update(self,obj):
+        """
+        Make the events we wait for on a dispatcher's socket match its readable()
+        and writable() answers.
+        """
+        fd = obj._fileno
+        if fd is None or self.map.get(fd) is not obj:
+            return
+        mask = 0
+        if obj.readable():
+            mask |= select.POLLIN | select.POLLPRI
+        # accepting sockets should not be writable
+        if obj.writable() and not obj.accepting:
+            mask |= select.POLLOUT
+
+        old = self.masks.get(fd)
+        if old == mask:
+            return
+        self.masks[fd] = mask
+        if old is not None:
+            try:
+                self.poller.modify(fd,mask)
+                return
+            except (IOError,OSError),e:
+                # The descriptor was closed and re-used since we last saw it.
+                if e.args[0] != ENOENT: raise
+        self.poller.register(fd,mask)
+
+    def forget(self,fd):
+        """
+        Stop watching a file descriptor.
+        """
+        if self.masks.pop(fd,None) is not None:
+            try:
+                self.poller.unregister(fd)
+            except (IOError,OSError,KeyError):
+                # A closed descriptor drops out of epoll by itself.
+                pass
+
+    def poll(self,timeout=None):
+        """
+        Wait up to timeout seconds (forever if None) for something to happen, and
+        run the dispatchers it happened to, then any timed calls that are due.
+        """
+        # Don't sleep past the next timed call.
+        if self.timers:
+            wait = max(0.0,self.timers[0][0] - time.time())
+            if timeout is None or wait < timeout:
+                timeout = wait
+        try:
+            events = self.poller.poll(-1 if timeout is None else timeout*self.scale)
+        except (IOError,OSError,select.error),e:
+            if e.args[0] == EINTR:
+                return
+            raise
+        for fd,flags in events:
+            obj = self.map.get(fd)
+            if obj is None:
+                self.forget(fd)
+                continue
+            asyncore.readwrite(obj,flags)
+
+            # Handling the event may have closed the dispatcher or changed what it
+            # is waiting for.
+            if self.map.get(fd) is obj and obj._fileno is not None:
+                self.update(obj)
+            else:
+                self.forget(fd)
+        self.runTimers()
+
+    def run(self,timeout=30.0):
+        """
+        Run until there are no more dispatchers.
+        """
+        logging.debug("Poller.run: using %s" % self.name)
+        while self.map:
+            self.poll(timeout)
+
+def newPoller(map=None):
+    """
+    Return a Poller, or None if this platform has neither epoll nor poll (in which
+    case asyncore.loop() has to do).
+    """
+    if hasattr(select,"epoll") or hasattr(select,"poll"):
+        return Poller(map)
+    return None
@@ -0,0 +1,235 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from TSexcept import ERR
+
+# Per-connection request framing.
+#
+# A client is free to send us a command in pieces (a partial TCP read) or to send
+# us many commands back to back without waiting for the replies (pipelining). The
+# RequestBuffer collects everything read from the socket and hands back each complete
+# command, as a list of its arguments, in the order they were sent.
+#
+# Two request formats are understood, and can be mixed on the same connection:
+#
+#   inline:      <cmd> <arg1> <arg2> ...\r\n
+#                <cmd> <arg1> ... <len>\r\n<bulk data>\r\n     (for the bulk commands)
+#
+#   multi-bulk:  *<argc>\r\n$<len1>\r\n<arg1>\r\n ... $<lenN>\r\n<argN>\r\n
+#
+# In the multi-bulk form every argument, including the command name, is length
+# prefixed, so arguments may contain spaces, CR-LFs or any binary data.
+#
+# A line (a command line, or the header of a multi-bulk command or argument) may be
+# at most MAXINLINE bytes long. Past that we stop waiting for the end of it, report
+# an error and throw the rest of it away as it arrives, so a client can't make us
+# hold any amount of data that never turns into a command.
+#
+# A multi-bulk command may have at most MAXARGS arguments, each at most MAXBULK bytes
+# long (the longest string a variable can hold).
+#
+MAXINLINE = 64*1024
+MAXARGS = 1024*1024
+MAXBULK = 512*1024*1024
+
+class RequestBuffer(object):
+    """
+    Input buffer for one connection. Data is added with feed() as it arrives and
+    complete commands are pulled out with next(). Anything that is left over is
+    kept for the next read.
+    """
+    def __init__(self,bulkCmds):
+        # The commands whose last argument is the length of a "bulk" payload that
+        # follows the command line.
+        self.bulkCmds = bulkCmds
+
+        # The data not yet consumed, and where in it the next command starts.
+        self.buf = ""
+        self.pos = 0
+
+        # Data read since the last time we looked at the buffer. It is kept as a
+        # list of pieces, and only joined to the buffer once there is enough of it
+        # to finish the command we are waiting on (need is that number of bytes).
+        # This way a large value arriving over many reads is copied just once.
+        self.chunks = []
+        self.chunkLen = 0
+        self.need = 0
+
+        # State of a multi-bulk command we are part way through: the arguments
+        # collected so far and how many there are still to come.
+        self.args = None
+        self.argsLeft = 0
+
+        # True while we are throwing away a line that was too long.
+        self.skipping = False
+
+    def feed(self,data):
+        """
+        Add data read from the socket to the buffer.
+        """
+        self.chunks.append(data)
+        self.chunkLen += len(data)
+
+    def pending(self):
+        """
+        Returns the number of bytes received but not yet consumed.
+        """
+        return len(self.buf) - self.pos + self.chunkLen
+
+    def _fill(self):
+        # Join what has been read to the unconsumed part of the buffer. Returns
+        # False if we know there still isn't enough data to finish a command.
+        if self.pending() < self.need:
+            return False
+        if self.chunks:
+            # Throw away the commands we have already handed out, so the buffer
+            # never grows beyond the partial command we are waiting on.
+            self.chunks.insert(0,self.buf[self.pos:])
+            self.buf = "".join(self.chunks)
+            self.pos = 0
+            self.chunks = []
+            self.chunkLen = 0
+        self.need = 0
+        return True
+
+    def next(self):
+        """
+        Return the next complete command as a list of arguments, or None if
+        the buffer doesn't hold a complete command yet. A badly formed command
+        is skipped over and reported by raising ERR.
+        """
+        if not self._fill():
+            return None
+        if self.skipping and not self._skip():
+            return None
+        if self.args is not None:
+            return self._multiBulk()
+        buf = self.buf
+
+        # Find the end of the command line. Empty multi-bulk commands are just
+        # ignored, however many of them there are, so we may go round a few times.
+        while True:
+            eol = buf.find("\r\n",self.pos)
+            if eol == -1:
+                if len(buf) - self.pos > MAXINLINE:
+                    self._tooLong()
+                self.need = len(buf) - self.pos + 1
+                return None
+            if eol - self.pos > MAXINLINE:
+                self.pos = eol + 2
+                raise ERR("-ERR Protocol error: too big inline request")
+            if buf[self.pos] != "*":
+                break
+
+            # This is the length prefixed form.
+            try:
+                count = int(buf[self.pos+1:eol])
+                if count > MAXARGS: raise ValueError
+            except ValueError:
+                self.pos = eol + 2
+                raise ERR("-ERR Protocol error: invalid multibulk length")
+            self.pos = eol + 2
+            if count > 0:
+                self.args = []
+                self.argsLeft = count
+                return self._multiBulk()
+
+        # Split out the command line. Do it the hard way because we don't want to
+        # touch, the possibly binary, data.
+        parts = buf[self.pos:eol].split(" ")
+        if len(parts) > 1 and len(parts[1]) == 0: del parts[1]
+        end = eol + 2
+
+        # See if we have "mass" data for the call. If we do, we need to determine the
+        # size from the message. The size must be an integer, and if it is we will
+        # take exactly that many bytes (plus the ending \r\n) as the last argument. We
+        # have to be careful with the mass data because it might have embedded \r\n!
+        if len(parts) > 1 and parts[0].lower() in self.bulkCmds:
+            try:
+                size = int(parts[-1])
+            except ValueError,e:
+                self.pos = end
+                raise ERR("-ERR length in message is not an integer [%s]" % (e.__str__()))
+            if size < 0 or size > MAXBULK:
+                self.pos = end
+                raise ERR("-ERR invalid bulk length")
+            if len(buf) < end + size + 2:
+                # Not all here yet, wait for the rest of it.
+                self.need = end + size + 2 - self.pos
+                return None
+            parts[-1] = buf[end:end+size]
+            end += size + 2
+
+        self.pos = end
+        return parts
+
+    def _tooLong(self):
+        # The line we are waiting on the end of is too long. Throw away what we have
+        # of it, and the rest of it as it comes (see _skip()).
+        self.args = None
+        self.buf = self.buf[-1:]
+        self.pos = 0
+        self.skipping = True
+        raise ERR("-ERR Protocol error: too big inline request")
+
+    def _skip(self):
+        # Throw away data up to the end of the line that was too long. Returns True
+        # once it is gone. The last byte is kept, in case it is the CR of the CR-LF.
+        eol = self.buf.find("\r\n",self.pos)
+        if eol == -1:
+            self.buf = self.buf[-1:]
+            self.pos = 0
+            self.need = len(self.buf) + 1
+            return False
+        self.pos = eol + 2
+        self.skipping = False
+        return True
+
+    def _multiBulk(self):
+        # Collect the arguments of a multi-bulk command. Each one is taken straight
+        # out of the buffer at its offset, rather than by splitting up the data, and
+        # we pick up where we left off if the command is spread over several reads.
+        buf = self.buf
+        view = memoryview(buf)
+        while self.argsLeft:
+            pos = self.pos
+            eol = buf.find("\r\n",pos)
+            if eol == -1:
+                if len(buf) - pos > MAXINLINE:
+                    self._tooLong()
+                self.need = len(buf) - pos + 1
+                return None
+            if buf[pos] != "$":
+                self.args = None
+                self.pos = eol + 2
+                raise ERR("-ERR Protocol error: expected '$', got '%s'" % buf[pos])
+            try:
+                size = int(buf[pos+1:eol])
+                if size < 0 or size > MAXBULK: raise ValueError
+            except ValueError:
+                self.args = None
+                self.pos = eol + 2
+                raise ERR("-ERR Protocol error: invalid bulk length")
+            start = eol + 2
+            if len(buf) < start + size + 2:
+                # Not all here yet, wait for the rest of it.
+                self.need = start + size + 2 - pos
+                return None
+            self.args.append(view[start:start+size].tobytes())
+            self.pos = start + size + 2
+            self.argsLeft -= 1
+
+        # We have the whole command.
+        args = self.args
+        self.args = None
+        return args
@@ -0,0 +1,85 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+# Reply encoding.
+#
+# Building a reply by adding strings together copies everything built so far each
+# time something is added, which gets very slow for replies with many elements. A
+# Reply instead collects the pieces of the reply in a list; they are only joined
+# together (or handed to the socket as they are) when the reply is sent.
+#
+# Values larger than BIGVALUE are kept as pieces of their own so they are never
+# copied on their way to the client. Smaller ones are formatted together with
+# their length header so the list stays short.
+#
+BIGVALUE = 4096
+
+class Reply(object):
+    """
+    A reply to a command, held as a list of string pieces. Unlike the plain
+    string replies returned by most commands, every line in a Reply already
+    ends with its CR-LF.
+    """
+    def __init__(self):
+        self.parts = []
+
+    def header(self,count):
+        """
+        Start a multi-bulk reply of count elements: *<count>\\r\\n
+        """
+        self.parts.append("*%d\r\n" % count)
+        return self
+
+    def bulk(self,val):
+        """
+        Add a bulk value, $<len>\\r\\n<value>\\r\\n, or $-1\\r\\n if val is None.
+        """
+        if val is None:
+            self.parts.append("$-1\r\n")
+        elif len(val) > BIGVALUE:
+            self.parts.append("$%d\r\n" % len(val))
+            self.parts.append(val)
+            self.parts.append("\r\n")
+        else:
+            self.parts.append("$%d\r\n%s\r\n" % (len(val),val))
+        return self
+
+    def integer(self,val):
+        """
+        Add an integer, :<val>\\r\\n
+        """
+        self.parts.append(":%d\r\n" % val)
+        return self
+
+    def getvalue(self):
+        """
+        Return the whole reply as one string.
+        """
+        return "".join(self.parts)
+
+    def __repr__(self):
+        return "<Reply %d parts>" % len(self.parts)
+
+def multiBulk(items,count=None):
+    """
+    Build the multi-bulk reply for a sequence of values:
+
+        *<count>\\r\\n$<len1>\\r\\n<value1>\\r\\n....
+
+    items can be any iterable; count must be given if it has no len().
+    """
+    r = Reply()
+    r.header(len(items) if count is None else count)
+    for i in items:
+        r.bulk(i)
+    return r
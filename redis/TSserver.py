@@ -12,17 +12,25 @@
 """
 
 import asyncore
+import os
 import threading
 import time
 import Queue
 from os.path import exists,isfile
 import logging
 import socket
+import cPickle as pickle
 from cStringIO import StringIO
 
 
 from TSdb import DB
 from TSconn import PyNoSql
+from TScomm import SlaveLink
+from TSloop import newPoller
+
+# How often, in seconds, a single threaded server looks to see whether the process
+# saving the database in the background has finished.
+DUMPPOLL = 0.1
 
 def Dumper(server):
     """
@@ -82,6 +90,18 @@ def TimerTask(server):
     # Finished.
     logging.debug("Timer: stopped.")
 
+# When the server runs single threaded (threaded=False) there are no Dumper, slaveDriver
+# or Timer threads. Their work is done by calls scheduled on the event loop instead, in
+# between client commands, so none of it has to fight the clients for the database lock.
+#
+#   Dumper      -> server.triggerDump() schedules one save of the database, which is
+#                  done by a child process (see dumpNow())
+#   slaveDriver -> server.addToQueue() schedules a call that queues everything on the
+#                  slaves' SlaveLinks, which the loop sends without waiting on them
+#   Timer       -> server.serverClose() schedules the close 15 seconds out
+#
+# Variable expiration is scheduled on the loop by the database itself. Since nothing
+# but the loop's thread touches the database, it runs without its lock.
 
 class server(asyncore.dispatcher):
     """
@@ -123,13 +143,35 @@ class server(asyncore.dispatcher):
     # to dump the database to backing store.
     mark = 0
 
-    def __init__(self, ip="localhost:6379",initfile="MDB.TXT",dbfile="TSnosql-rdump.db",master=True):
+    # The most output, in bytes, we will hold for a client that isn't reading its replies.
+    # Past this we stop reading commands from it until it catches up.
+    outputLimit = 32*1024*1024
+
+    def __init__(self, ip="localhost:6379",initfile="MDB.TXT",dbfile="TSnosql-rdump.db",master=True,threaded=True):
 
         # Initialize the class that makes this object work.
         asyncore.dispatcher.__init__(self)
 
+        # The event loop that runs us and all the client connections. Running single
+        # threaded needs it for the timed calls.
+        self.loop = newPoller()
+        if not threaded and self.loop is None:
+            logging.warning("server.__init__: no event loop available, running threaded")
+            threaded = True
+        self.threaded = threaded
+
+        # Calls scheduled on the loop for a save or for sending changes to slaves, if
+        # any are outstanding (single threaded only).
+        self.dumpCall = None
+        self.sendCall = None
+
+        # The process saving the database in the background, if there is one, and
+        # whether another save was asked for while it ran (single threaded only).
+        self.dumpPid = None
+        self.dumpAgain = False
+
         # Setup the data base - it is shared by all instances.
-        self.db = DB(dbfile)
+        self.db = DB(dbfile,scheduler=None if threaded else self.loop,threaded=threaded)
         self.mark = self.db.totalChangeOperations
 
         # Remember if we assume master or slave operation
@@ -152,20 +194,21 @@ class server(asyncore.dispatcher):
             logging.debug("server.__init__: Created empty cache database")
             self.db.saveToDump()
 
-        # Start the background slave queueing support...
-        queThread = threading.Thread(target=slaveDriver,name="slaveDriver",args=(self,))
-        queThread.daemon = True
-        queThread.start()
+        if threaded:
+            # Start the background slave queueing support...
+            queThread = threading.Thread(target=slaveDriver,name="slaveDriver",args=(self,))
+            queThread.daemon = True
+            queThread.start()
 
-        # Start the background db dumper..
-        saveThread = threading.Thread(target=Dumper,name="Dumper",args=(self,))
-        saveThread.daemon = True
-        saveThread.start()
+            # Start the background db dumper..
+            saveThread = threading.Thread(target=Dumper,name="Dumper",args=(self,))
+            saveThread.daemon = True
+            saveThread.start()
 
-        # Start the timer task
-        timerThread = threading.Thread(target=TimerTask,name="Timer",args=(self,))
-        timerThread.daemon = True
-        timerThread.start()
+            # Start the timer task
+            timerThread = threading.Thread(target=TimerTask,name="Timer",args=(self,))
+            timerThread.daemon = True
+            timerThread.start()
 
         # Create the socket and bind to the address.
         host,port = ip.split(":")
@@ -174,7 +217,7 @@ class server(asyncore.dispatcher):
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.set_reuse_addr()
         self.bind( (host, int(port)) )
-        self.listen(5)
+        self.listen(1024)
 
     def handle_accept(self):
         """
@@ -190,6 +233,7 @@ class server(asyncore.dispatcher):
             self.NoTotalClients += 1
             self.NoCurrentClients += 1
             self.clientList[client[1]] = PyNoSql(client[0],client[1],self,self.db)
+            if self.loop: self.loop.update(self.clientList[client[1]])
 
     def handle_close(self):
         pass
@@ -199,10 +243,61 @@ class server(asyncore.dispatcher):
         # in the server being shut down.
         for i in self.clientList.keys() :
             # Close it down....
-            clientList[i].closeFlag = True
+            self.clientList[i].closeFlag = True
 
         # Trigger timer event. We give everyone plenty of time and then force all the rest...
-        self.timerSema.release()
+        if self.threaded:
+            self.timerSema.release()
+        else:
+            self.loop.callLater(15,self.close)
+
+    def triggerDump(self):
+        """
+        Have the database written to backing store in the background.
+        """
+        if self.threaded:
+            self.dumpSema.set()
+        elif self.dumpCall is None:
+            # One save covers any number of requests made before it runs.
+            self.dumpCall = self.loop.callLater(0,self.dumpNow)
+
+    def dumpNow(self):
+        # The single threaded Dumper. Pickling the database takes time in proportion
+        # to its size, and every client would wait for it, so it is done by a child
+        # process. The child has a copy of the database as it is now, which nothing
+        # else changes, and the pages of it are only really copied as we change them.
+        self.dumpCall = None
+        if self.dumpPid is not None:
+            # A save is running; do another for the changes since, once it is done.
+            self.dumpAgain = True
+            return
+        when = time.time()
+        pid = os.fork()
+        if pid == 0:
+            rc = 1
+            try:
+                self.db.saveToDump()
+                rc = 0
+            except Exception,e:
+                logging.exception(e.__str__())
+            os._exit(rc)
+        self.dumpPid = pid
+        self.loop.callLater(DUMPPOLL,self.dumpWait,when)
+
+    def dumpWait(self,when):
+        # See if the child saving the database has finished.
+        pid,status = os.waitpid(self.dumpPid,os.WNOHANG)
+        if pid == 0:
+            self.loop.callLater(DUMPPOLL,self.dumpWait,when)
+            return
+        self.dumpPid = None
+        if status == 0:
+            self.db.timeofLastSave = when
+        else:
+            logging.error("server.dumpWait: saving the database failed")
+        if self.dumpAgain:
+            self.dumpAgain = False
+            self.triggerDump()
 
     def clientClose(self):
         # Reduce the current client count.
@@ -214,8 +309,13 @@ class server(asyncore.dispatcher):
             self.close()
 
     def start(self):
-        # Start everything running...
-        asyncore.loop()
+        # Start everything running...if there is no epoll or poll on this
+        # platform we fall back on asyncore's select() loop.
+        if self.loop:
+            self.loop.update(self)
+            self.loop.run()
+        else:
+            asyncore.loop()
 
     def getStats(self):
         # Return the following as a list:
@@ -240,10 +340,25 @@ class server(asyncore.dispatcher):
             #   <whichdb> <op> <arg1>...
             #
             self.queue.put([self.db.version,args])
+            self.scheduleSend()
 
     def addToQueueNoVersion(self,*args):
         if len(self.remoteList):
             self.queue.put([-1,args])
+            self.scheduleSend()
+
+    def scheduleSend(self):
+        # Single threaded, the changes are sent to the slaves once the loop is done
+        # with the commands it is running now.
+        if not self.threaded and self.sendCall is None:
+            self.sendCall = self.loop.callLater(0,self.sendNow)
+
+    def sendNow(self):
+        # The single threaded slaveDriver: send everything that has been queued.
+        self.sendCall = None
+        while not self.queue.empty():
+            self.writeToAll(self.queue.get())
+            self.queue.task_done()
 
     def writeToAll(self,cmd):
         """
@@ -251,6 +366,9 @@ class server(asyncore.dispatcher):
         to all the other servers in the cluster of memcache-like servers. The names of the
         other servers come directly from the database.
         """
+        if not self.threaded:
+            self.queueToAll(cmd)
+            return
 
         # Collect the server list from the database. In this way other parts of the
         # cluster can change the server list and we will take it from there!
@@ -294,6 +412,29 @@ class server(asyncore.dispatcher):
                 del c
                 del self.remoteList[i]
 
+    def queueToAll(self,cmd):
+        # The single threaded writeToAll(): queue the command on each slave's
+        # SlaveLink. A slave's answer is read when it comes, so nothing here waits.
+        contents = pickle.dumps(cmd)
+        msg = "DO %d\r\n" % (len(contents)) + contents + "\r\n"
+        for i in self.remoteList.keys():
+            c = self.remoteList[i]
+            if not isinstance(c,SlaveLink):
+                # The slave has just been sent its copy of the database.
+                c = self.remoteList[i] = SlaveLink(c,self,i)
+            logging.debug("Queueing operation '%s' for %s:%d" % (cmd,c.host,c.port))
+            c.write(msg)
+            if i in self.remoteVersion:
+                self.remoteVersion[i] += 1
+
+    def close(self):
+        # Closing the server closes the links to the slaves too, once the changes
+        # queued for them have been sent, so the loop can finish.
+        asyncore.dispatcher.close(self)
+        for c in self.remoteList.values():
+            if isinstance(c,SlaveLink):
+                c.closeWhenSent()
+
     def isConnected(self,host,port):
         """
         See if the (host,port) is connecte to a remote server and the remote end is
@@ -301,7 +442,7 @@ class server(asyncore.dispatcher):
         """
         rc = 0
         try:
-            if (host,port) in self.remoteList.keys():
+            if (host,port) in self.remoteList:
                 if self.remoteList[host,port].ping() == "pong":
                     rc = 1
         except :
@@ -318,6 +459,9 @@ class server(asyncore.dispatcher):
         """
         Add this connection to the remote services table. Returns handle to the data class.
         """
+        old = self.remoteList.get((host,port))
+        if old is not None and old is not commObj:
+            old.disconnect()
         self.remoteList[host,port] = commObj
         self.remoteVersion[host,port] = 0
 
@@ -331,6 +475,6 @@ class server(asyncore.dispatcher):
         """
         Renove a connection from the list.
         """
-        if (host,port) in self.remoteList.keys():
+        if (host,port) in self.remoteList:
           del self.remoteList[host,port]
           del self.remoteVersion[host,port]
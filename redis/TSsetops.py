@@ -0,0 +1,119 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+from TSintset import IntSet, fromSorted
+
+# Set algebra.
+#
+# The intersection, union and difference of set variables, for SINTER, SUNION, SDIFF
+# and the commands that store their results. A set variable can be held as a set, a
+# tuple or an IntSet; these functions take any of them.
+#
+# The result is always a new object the caller is free to store or change. It is
+# built up in place in one copy, rather than making a new set at each step:
+#
+#   - an intersection starts from the smallest set, so the copy is as small as it can
+#     be and each step only looks up that many members. It stops as soon as the result
+#     is empty. Five sets of a million members intersected with one of ten members
+#     takes 50 lookups, whatever order they are given in.
+#   - a union starts from a copy of the largest set and adds the others to it.
+#   - a difference takes members out of a copy of the first set, stopping once it is
+#     empty.
+#
+# IntSets combined only with other IntSets give an IntSet, worked out by walking the
+# arrays side by side.
+#
+def _copy(s):
+    # A copy of a set variable's value, as a set (or an IntSet if it is one).
+    if type(s) is IntSet:
+        return fromSorted(s.a[:])
+    return set(s)
+
+def _allInts(sets):
+    for s in sets:
+        if type(s) is not IntSet:
+            return False
+    return True
+
+def inter(sets):
+    """
+    Return the intersection of the sets. A missing set (None) makes it empty.
+    """
+    if not sets or None in sets:
+        return set()
+    sets = sorted(sets,key=len)
+    if _allInts(sets):
+        result = _copy(sets[0])
+        for s in sets[1:]:
+            if not result:
+                break
+            result = result.intersection(s)
+        return result
+
+    result = set(sets[0])
+    for s in sets[1:]:
+        if not result:
+            break
+        if type(s) is set:
+            result &= s
+        else:
+            # Go through our (smaller) copy, asking the tuple or IntSet about each.
+            result = set([m for m in result if m in s])
+    return result
+
+def union(sets):
+    """
+    Return the union of the sets, leaving out any that are missing (None).
+    """
+    sets = sorted([s for s in sets if s is not None],key=len,reverse=True)
+    if not sets:
+        return set()
+    if _allInts(sets):
+        result = _copy(sets[0])
+        for s in sets[1:]:
+            result = result.union(s)
+        return result
+
+    result = set(sets[0])
+    for s in sets[1:]:
+        result.update(s)
+    return result
+
+def diff(sets):
+    """
+    Return the members of the first set that are in none of the others. A missing
+    set (None) is taken as empty.
+    """
+    if not sets or not sets[0]:
+        return set()
+    first = sets[0]
+    others = [s for s in sets[1:] if s]
+    if _allInts(others) and type(first) is IntSet:
+        result = _copy(first)
+        for s in others:
+            if not result:
+                break
+            result = result.difference(s)
+        return result
+
+    result = set(first)
+    for s in others:
+        if not result:
+            break
+        if type(s) is set and len(s) <= len(result):
+            result -= s
+        else:
+            # Taking a large set away from a small one means looking at every member
+            # of the large one; look at ours instead.
+            result = set([m for m in result if m not in s])
+    return result
@@ -0,0 +1,294 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import random
+
+from TSexcept import ERR
+
+# Sorted sets.
+#
+# A sorted set is a set of members, each with a score, kept in order of score (and
+# of member, for members with the same score). The members and their scores are held
+# in a dictionary, so finding the score of a member is quick, and in a skiplist,
+# which keeps them in order.
+#
+# A skiplist is a linked list in which each node also has, with falling probability,
+# links that jump over 4, 16, 64... nodes. Searching starts on the longest jumps and
+# drops down a level each time it would overshoot, so finding a place in the list,
+# adding or removing a member takes O(log n) time. Each link also records how many
+# nodes it jumps over (its span); adding up the spans along the way gives the rank of
+# a member, and lets us find the member at a given rank, in O(log n) as well.
+#
+MAXLEVEL = 32
+
+class Node(object):
+    """
+    A node of the skiplist: a member, its score, and the links to the next node
+    at each of the node's levels along with how far they go.
+    """
+    __slots__ = ("member","score","next","span")
+
+    def __init__(self,member,score,level):
+        self.member = member
+        self.score = score
+        self.next = [None] * level
+        self.span = [0] * level
+
+def randomLevel():
+    # Each level up has a 1 in 4 chance of being used.
+    level = 1
+    while level < MAXLEVEL and random.random() < 0.25:
+        level += 1
+    return level
+
+def formatScore(score):
+    """
+    Return a score the way it is sent to a client: whole numbers without a
+    decimal point, the rest as the shortest string that reads back the same.
+    """
+    if abs(score) < 1e17 and score == int(score):
+        return "%d" % score
+    return repr(score)
+
+def parseScore(s):
+    """
+    Return a score given in a command as a float.
+    """
+    try:
+        score = float(s)
+    except ValueError:
+        score = None
+    if score is None or score != score:
+        raise ERR("-ERR value is not a valid float")
+    return score
+
+def parseBound(s):
+    """
+    Return the (score,exclusive) pair for one end of a range of scores. A
+    leading ( makes the end exclusive, e.g. (5 is "greater than 5"; -inf and
+    +inf are the ends of everything.
+    """
+    if s.startswith("("):
+        return parseScore(s[1:]),True
+    return parseScore(s),False
+
+class SortedSet(object):
+    """
+    A set of members ordered by score. Ranks count from 0, at the lowest score.
+    """
+    def __init__(self,pairs=()):
+        # The score of each member.
+        self.scores = {}
+
+        # The skiplist. The head node has no member; it holds the links into the list
+        # at every level.
+        self.head = Node(None,None,MAXLEVEL)
+        self.level = 1
+        for member,score in pairs:
+            self.add(member,score)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self,member):
+        return member in self.scores
+
+    def __iter__(self):
+        # The (member,score) pairs, in order.
+        x = self.head.next[0]
+        while x:
+            yield x.member,x.score
+            x = x.next[0]
+
+    # Pickle a sorted set as its (member,score) pairs. The skiplist is rebuilt when
+    # it is loaded (pickling it as it is would recurse down the whole list). The
+    # pairs are put in a tuple, since pickle skips __setstate__ for an empty state.
+    def __getstate__(self):
+        return (list(self),)
+
+    def __setstate__(self,state):
+        self.__init__(state[0])
+
+    def __repr__(self):
+        return "<SortedSet %d members>" % len(self)
+
+    def _insert(self,member,score):
+        # Put a new member in the skiplist. Find the node it goes after on every
+        # level, and the rank of each of those nodes.
+        update = [None] * MAXLEVEL
+        rank = [0] * MAXLEVEL
+        x = self.head
+        for i in xrange(self.level-1,-1,-1):
+            rank[i] = 0 if i == self.level-1 else rank[i+1]
+            y = x.next[i]
+            while y and (y.score < score or (y.score == score and y.member < member)):
+                rank[i] += x.span[i]
+                x = y
+                y = x.next[i]
+            update[i] = x
+
+        # Pick the number of levels for the node; if it is taller than the list
+        # so far, the head links over the whole list on the new levels.
+        level = randomLevel()
+        if level > self.level:
+            for i in xrange(self.level,level):
+                update[i] = self.head
+                self.head.span[i] = len(self.scores)
+            self.level = level
+
+        # Link it in, splitting the span of the links it goes under.
+        x = Node(member,score,level)
+        for i in xrange(level):
+            p = update[i]
+            x.next[i] = p.next[i]
+            p.next[i] = x
+            x.span[i] = p.span[i] - (rank[0] - rank[i])
+            p.span[i] = rank[0] - rank[i] + 1
+
+        # Links on higher levels now jump over one more node.
+        for i in xrange(level,self.level):
+            update[i].span[i] += 1
+
+    def _delete(self,member,score):
+        # Take a member out of the skiplist.
+        update = [None] * MAXLEVEL
+        x = self.head
+        for i in xrange(self.level-1,-1,-1):
+            y = x.next[i]
+            while y and (y.score < score or (y.score == score and y.member < member)):
+                x = y
+                y = x.next[i]
+            update[i] = x
+        x = x.next[0]
+        for i in xrange(self.level):
+            p = update[i]
+            if p.next[i] is x:
+                p.span[i] += x.span[i] - 1
+                p.next[i] = x.next[i]
+            else:
+                p.span[i] -= 1
+        while self.level > 1 and self.head.next[self.level-1] is None:
+            self.level -= 1
+
+    def add(self,member,score):
+        """
+        Add a member with a score, or change the score of a member already in the
+        set. Returns 1 if the member is new, 0 if it was there.
+        """
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return 0
+            self._delete(member,old)
+        self._insert(member,score)
+        self.scores[member] = score
+        return 0 if old is not None else 1
+
+    def incr(self,member,by):
+        """
+        Add by to the score of a member (one not in the set has a score of 0),
+        returning the new score.
+        """
+        score = self.scores.get(member,0.0) + by
+        self.add(member,score)
+        return score
+
+    def remove(self,member):
+        """
+        Remove a member. Returns 1 if it was in the set, 0 if it wasn't.
+        """
+        score = self.scores.pop(member,None)
+        if score is None:
+            return 0
+        self._delete(member,score)
+        return 1
+
+    def score(self,member):
+        """
+        Return the score of a member, or None.
+        """
+        return self.scores.get(member)
+
+    def rank(self,member):
+        """
+        Return the rank of a member, or None if it isn't in the set.
+        """
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        rank = 0
+        x = self.head
+        for i in xrange(self.level-1,-1,-1):
+            y = x.next[i]
+            while y and (y.score < score or (y.score == score and y.member <= member)):
+                rank += x.span[i]
+                x = y
+                y = x.next[i]
+            if x.member == member and x is not self.head:
+                return rank - 1
+        return None
+
+    def _byRank(self,rank):
+        # Return the node at a rank (counting from 0).
+        traversed = 0
+        x = self.head
+        for i in xrange(self.level-1,-1,-1):
+            while x.next[i] and traversed + x.span[i] <= rank + 1:
+                traversed += x.span[i]
+                x = x.next[i]
+            if traversed == rank + 1:
+                return x
+        return None
+
+    def range(self,start,end):
+        """
+        Return the (member,score) pairs from rank start through rank end. Negative
+        ranks count back from the highest score (-1 being the last).
+        """
+        n = len(self.scores)
+        if start < 0: start = max(n + start,0)
+        if end < 0: end = n + end
+        if end >= n: end = n - 1
+        if start > end:
+            return []
+        x = self._byRank(start)
+        rc = []
+        for i in xrange(end - start + 1):
+            rc.append((x.member,x.score))
+            x = x.next[0]
+        return rc
+
+    def rangeByScore(self,min,max,minEx=False,maxEx=False,offset=0,count=-1):
+        """
+        Return the (member,score) pairs with scores from min to max, leaving out
+        scores equal to min (or max) if minEx (or maxEx) is set. Skip the first offset
+        of them, and return at most count (all of them if count is negative).
+        """
+        # Find the last node before the range.
+        x = self.head
+        for i in xrange(self.level-1,-1,-1):
+            y = x.next[i]
+            while y and (y.score < min or (minEx and y.score == min)):
+                x = y
+                y = x.next[i]
+        x = x.next[0]
+
+        rc = []
+        while x and offset > 0:
+            x = x.next[0]
+            offset -= 1
+        while x and count != 0 and (x.score < max or (not maxEx and x.score == max)):
+            rc.append((x.member,x.score))
+            x = x.next[0]
+            count -= 1
+        return rc
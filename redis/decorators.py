@@ -1,13 +1,79 @@
 # -*- coding: utf-8 -*-
 
-# A decorator that will wrap a function in a lock()/unlock() operation.
+from functools import wraps
+
+# A decorator that will wrap a function in a lock()/unlock() operation. The
+# original function is kept as the unsynchronized attribute of the wrapper, for
+# code that knows it is the only thread around and doesn't need the lock.
 def synchronized(lock):
     def syncwrap(f):
+        @wraps(f)
         def syncwrapfunc(*args, **kw):
             lock.acquire()
             try:
                 return f(*args, **kw)
             finally:
                 lock.release()
+        syncwrapfunc.unsynchronized = f
+        return syncwrapfunc
+    return syncwrap
+
+# Decorators for methods of an object made up of several named parts, each of
+# which has a lock of its own. The object has a lock for itself as a whole, obj.lock,
+# the dictionary of the locks of its parts, obj.locks, and a method that returns
+# the lock of a part, making it if need be, obj.lockFor(name).
+#
+# To keep from deadlocking, locks are always taken in the same order: the lock of
+# the whole object first, if it is needed, then the locks of the parts sorted by
+# name.
+def synchronizedOn(*argNos):
+    """
+    Lock the parts named by the method's arguments at positions argNos (not
+    counting self) around a call.
+    """
+    def syncwrap(f):
+        if len(argNos) == 1:
+            n = argNos[0]
+            @wraps(f)
+            def syncwrapfunc(self, *args, **kw):
+                lock = self.locks.get(args[n]) or self.lockFor(args[n])
+                lock.acquire()
+                try:
+                    return f(self, *args, **kw)
+                finally:
+                    lock.release()
+        else:
+            @wraps(f)
+            def syncwrapfunc(self, *args, **kw):
+                locks = [self.lockFor(i) for i in sorted(set([args[n] for n in argNos]))]
+                for lock in locks:
+                    lock.acquire()
+                try:
+                    return f(self, *args, **kw)
+                finally:
+                    for lock in reversed(locks):
+                        lock.release()
+        syncwrapfunc.unsynchronized = f
         return syncwrapfunc
     return syncwrap
+
+def synchronizedAll(f):
+    """
+    Lock the whole object, and every one of its parts, around a call.
+    """
+    @wraps(f)
+    def syncwrapfunc(self, *args, **kw):
+        self.lock.acquire()
+        try:
+            locks = [self.locks[i] for i in sorted(self.locks.keys())]
+            for lock in locks:
+                lock.acquire()
+            try:
+                return f(self, *args, **kw)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        finally:
+            self.lock.release()
+    syncwrapfunc.unsynchronized = f
+    return syncwrapfunc
@@ -176,6 +176,12 @@ class nosql(object):
                 self.disconnect()
             raise CONNECTERROR("Error %s while writing to socket. %s." % tuple(e.args))
 
+    def _write_command(self, *args):
+        # Send a command in the multi-bulk form, in which each argument is sent with
+        # its length, so it can hold spaces or any other bytes.
+        args = [a if isinstance(a, basestring) else str(a) for a in args]
+        self._write('*%d\r\n' % len(args) + ''.join(['$%d\r\n%s\r\n' % (len(a), a) for a in args]))
+
     def _read(self):
         try:
             return self._fp.readline()
@@ -399,6 +405,130 @@ class nosql(object):
             self.lock.release()
         return rc
 
+    def append(self, name, value):
+        """
+            Add value to the end of the string variable 'name', creating it if it
+            doesn't exist.\r\n
+            Protocol::
+
+                    Client to server:   APPEND <name> <length of value>\\r\\n<value>\\r\\n
+
+                    Server to client:   :<new length>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type value: string
+            @param value: value to add
+
+            @rtype: integer
+            @return: the new length of the string.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            value = value if isinstance(value, basestring) else str(value)
+            self._write('APPEND %s %d\r\n%s\r\n' % (name, len(value), value))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def setrange(self, name, offset, value):
+        """
+            Overwrite part of the string variable 'name' with value, starting at offset.
+            A string shorter than offset is padded with zero bytes first.\r\n
+            Protocol::
+
+                    Client to server:   SETRANGE <name> <offset> <length of value>\\r\\n<value>\\r\\n
+
+                    Server to client:   :<new length>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type offset: integer
+            @param offset: where to start writing
+
+            @type value: string
+            @param value: value to write
+
+            @rtype: integer
+            @return: the new length of the string.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            value = value if isinstance(value, basestring) else str(value)
+            self._write('SETRANGE %s %s %d\r\n%s\r\n' % (name, offset, len(value), value))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def getrange(self, name, start, end):
+        """
+            Return bytes start through end of the string variable 'name'. Negative
+            positions count back from the end.\r\n
+            Protocol::
+
+                    Client to server:   GETRANGE <name> <start> <end>\\r\\n
+
+                    Server to client:   $<length of value>\\r\\n<value>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type start: integer
+            @param start: first byte to return
+
+            @type end: integer
+            @param end: last byte to return
+
+            @rtype: string
+            @return: the bytes asked for, "" if there are none.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('GETRANGE %s %s %s\r\n' % (name, start, end))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def strlen(self, name):
+        """
+            Return the length of the string variable 'name', 0 if it doesn't exist.\r\n
+            Protocol::
+
+                    Client to server:   STRLEN <name>\\r\\n
+
+                    Server to client:   :<length>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @rtype: integer
+            @return: the length of the string.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('STRLEN %s\r\n' % name)
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
     def mget(self, *args):
         """
             Get the values assigned to multiple variables.\r\n
@@ -434,6 +564,47 @@ class nosql(object):
             self.lock.release()
         return rc
 
+    def mset(self, mapping, preserve=False):
+        """
+            Set several string variables at once (MSET form). Conditionally set them
+            only if none of them already exist (MSETNX form).\r\n
+            Protocol::
+
+                    Client to server:   MSET <name1> <value1> ... <nameN> <valueN>\\r\\n
+
+                                        MSETNX <name1> <value1> ... <nameN> <valueN>\\r\\n
+
+                                        sent in the multi-bulk form, each name and value
+                                        as $<length>\\r\\n<string>\\r\\n
+
+                    Server to client:   +OK\\r\\n          (MSET)
+
+                                        :1\\r\\n or :0\\r\\n  (MSETNX)
+
+                                        -ERR <error message>\\r\\n
+
+            @type mapping: dictionary
+            @param mapping: the variable names and the values to assign them
+
+            @type preserve: boolean
+            @param preserve: if True, don't set any of the variables if one exists
+
+            @rtype: string or integer
+            @return: OK for MSET; for MSETNX 1 if the variables were set, 0 if not.
+        """
+        args = ['MSETNX' if preserve else 'MSET']
+        for k, v in mapping.iteritems():
+            args.append(k)
+            args.append(v)
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write_command(*args)
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
     def version(self):
         """
             Return the version of the server.\r\n
@@ -490,6 +661,66 @@ class nosql(object):
             self.lock.release()
         return rc
 
+    def incrbyfloat(self, name, amount):
+        """
+            Increment a string variable, which must be a number in string format, by a
+            floating point value. Return the new value. If the variable doesn't initially
+            exist it is assumed to be 0.\r\n
+            Protocol::
+
+                    Client to server:   INCRBYFLOAT <name> <amount>\\r\\n
+
+                    Server to client:   $<len of value>\\r\\n<value>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable to increment
+
+            @type amount: float, integer or string
+            @param amount: amount to increment
+
+            @rtype: float
+            @return: new, incremented value.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            amount = repr(amount) if isinstance(amount, float) else amount
+            self._write('INCRBYFLOAT %s %s\r\n' % (name, amount))
+            rc = float(self.get_response())
+        finally:
+            self.lock.release()
+        return rc
+
+    def mincrby(self, pairs):
+        """
+            Increment several string variables, which must be integers in string format,
+            at once. If any of them can't be incremented, none of them are. Variables that
+            don't exist are assumed to be 0.\r\n
+            Protocol::
+
+                    Client to server:   MINCRBY <name1> <amount1> <name2> <amount2> ...\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n:<value1>\\r\\n ...\\r\\n:<valueN>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type pairs: list
+            @param pairs: (name, amount) tuples.
+
+            @rtype: list
+            @return: the new values, in the same order.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('MINCRBY %s\r\n' % ' '.join(['%s %d' % (name, amount) for name, amount in pairs]))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
     def decr(self, name, amount=1):
         """
             Decrement a string variable, which must be an integer in string format, by some value (default is one).
@@ -626,10 +857,9 @@ class nosql(object):
             Protocol::
                     Client to server:   KEYS <pattern>\\r\\n
 
-                    Server to client:   $<length of value>\\r\\n<value>\\r\\n
+                    Server to client:   *<No.entries>\\r\\n<key1>\\r\\n<key2>\\r\\n ...\\r\\n<keyN>\\r\\n
 
-                                        where <value> is a string with the format of
-                                        <key1> <key2> ... <keyN>
+                                        where each <keyN> is $<length of name>\\r\\n<name>
 
                                         -ERR <error message>\\r\\n
 
@@ -640,8 +870,8 @@ class nosql(object):
         self.connect()
         try:
             self.lock.acquire()
-            self._write('KEYS %s\r\n' % pattern)
-            rc = self.get_response().split()
+            self._write_command('KEYS', pattern)
+            rc = self.get_response()
         finally:
             self.lock.release()
         return rc
@@ -841,7 +1071,8 @@ class nosql(object):
         """
             Create or add to a list variable. If the list variable already
             exists, if tail = True the value is pushed on the right. Otherwise
-            the value is pushed onto the head.\r\n
+            the value is pushed onto the head. A list or tuple of values pushes
+            each of them, one after the other, in one command.\r\n
             Protocol::
 
                     Client to server:   RPUSH <name> <value>\\r\\n
@@ -859,8 +1090,8 @@ class nosql(object):
             @type name: string
             @param name: name of the variable
 
-            @type value: string
-            @param value: new value to be added to list
+            @type value: string, or list or tuple of strings
+            @param value: new value(s) to be added to list
 
             @type tail: boolean
             @param tail: If False, value is pushed on tail end. If True on head end.
@@ -871,9 +1102,12 @@ class nosql(object):
         self.connect()
         try:
             self.lock.acquire()
-            value = value if isinstance(value, basestring) else str(value)
-            self._write('%s %s %s\r\n%s\r\n' % (
-                'LPUSH' if tail else 'RPUSH', name, len(value), value))
+            if isinstance(value, (list, tuple)):
+                self._write_command('LPUSH' if tail else 'RPUSH', name, *value)
+            else:
+                value = value if isinstance(value, basestring) else str(value)
+                self._write('%s %s %s\r\n%s\r\n' % (
+                    'LPUSH' if tail else 'RPUSH', name, len(value), value))
             rc = self.get_response()
         finally:
             self.lock.release()
@@ -1139,7 +1373,8 @@ class nosql(object):
 
     def sadd(self, name, value):
         """
-            Add the value to the set variable 'name'.\r\n
+            Add the value to the set variable 'name'. A list or tuple of values adds
+            each of them in one command.\r\n
             Protocol::
 
                     Client to server:   SADD <name> <length-of-value>\\r\\n<value>\\r\\n
@@ -1153,17 +1388,20 @@ class nosql(object):
             @type name: string
             @param name: name of set variable
 
-            @type value: string
-            @param value: value to put in set.
+            @type value: string, or list or tuple of strings
+            @param value: value(s) to put in set.
 
             @rtype: integer
-            @return: 0 if the element was already in the set, 1 if it was added.
+            @return: the number of values added; those already in the set aren't counted.
         """
         self.connect()
         try:
             self.lock.acquire()
-            value = value if isinstance(value, basestring) else str(value)
-            self._write('SADD %s %s\r\n%s\r\n' % (name, len(value), value))
+            if isinstance(value, (list, tuple)):
+                self._write_command('SADD', name, *value)
+            else:
+                value = value if isinstance(value, basestring) else str(value)
+                self._write('SADD %s %s\r\n%s\r\n' % (name, len(value), value))
             rc = self.get_response()
         finally:
             self.lock.release()
@@ -1197,7 +1435,8 @@ class nosql(object):
 
     def srem(self, name, value):
         """
-            Remove a specific member from a set.\r\n
+            Remove a specific member from a set. A list or tuple of members removes
+            each of them in one command.\r\n
             Protocol::
 
                     Client to server:   SREM <name> <length-of-value>\\r\\n<value>\\r\\n
@@ -1211,17 +1450,20 @@ class nosql(object):
             @type name: string
             @param name: name of set variable
 
-            @type value: string
-            @param value: member to remove from set
+            @type value: string, or list or tuple of strings
+            @param value: member(s) to remove from set
 
             @rtype: integer
-            @return: 0 if the value was in the set. 1 otherwise
+            @return: the number of members that were in the set and were removed.
         """
         self.connect()
         try:
             self.lock.acquire()
-            value = value if isinstance(value, basestring) else str(value)
-            self._write('SREM %s %s\r\n%s\r\n' % (name, len(value), value))
+            if isinstance(value, (list, tuple)):
+                self._write_command('SREM', name, *value)
+            else:
+                value = value if isinstance(value, basestring) else str(value)
+                self._write('SREM %s %s\r\n%s\r\n' % (name, len(value), value))
             rc = self.get_response()
         finally:
             self.lock.release()
@@ -1529,6 +1771,854 @@ class nosql(object):
         return rc
 
 
+    def zadd(self, name, score, member):
+        """
+            Add a member with a score to the sorted set variable 'name', or change the
+            score of a member already in it.\r\n
+            Protocol::
+
+                    Client to server:   ZADD <name> <score> <length-of-member>\\r\\n<member>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type score: float, integer or string
+            @param score: score of the member
+
+            @type member: string
+            @param member: member to put in the sorted set
+
+            @rtype: integer
+            @return: 1 if the member was added, 0 if it was there and its score was changed.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            member = member if isinstance(member, basestring) else str(member)
+            self._write('ZADD %s %s %s\r\n%s\r\n' % (name, score, len(member), member))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def zincrby(self, name, member, amount=1):
+        """
+            Add amount to the score of a member of the sorted set variable 'name'. A member
+            that isn't in the set is added with amount as its score.\r\n
+            Protocol::
+
+                    Client to server:   ZINCRBY <name> <amount> <length-of-member>\\r\\n<member>\\r\\n
+
+                    Server to client:   $<len of score>\\r\\n<score>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type member: string
+            @param member: member whose score is changed
+
+            @type amount: float, integer or string
+            @param amount: amount to add to the score
+
+            @rtype: float
+            @return: the new score of the member.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            member = member if isinstance(member, basestring) else str(member)
+            self._write('ZINCRBY %s %s %s\r\n%s\r\n' % (name, amount, len(member), member))
+            rc = float(self.get_response())
+        finally:
+            self.lock.release()
+        return rc
+
+    def zrem(self, name, member):
+        """
+            Remove a member from the sorted set variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   ZREM <name> <length-of-member>\\r\\n<member>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type member: string
+            @param member: member to remove
+
+            @rtype: integer
+            @return: 1 if the member was removed, 0 if it wasn't in the set.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            member = member if isinstance(member, basestring) else str(member)
+            self._write('ZREM %s %s\r\n%s\r\n' % (name, len(member), member))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def zcard(self, name):
+        """
+            Return the number of members in the sorted set variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   ZCARD <name>\\r\\n
+
+                    Server to client:   :<number>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @rtype: integer
+            @return: number of members in the sorted set.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('ZCARD %s\r\n' % name)
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def zscore(self, name, member):
+        """
+            Return the score of a member of the sorted set variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   ZSCORE <name> <length-of-member>\\r\\n<member>\\r\\n
+
+                    Server to client:   $<len of score>\\r\\n<score>\\r\\n
+
+                                        $-1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type member: string
+            @param member: member to look up
+
+            @rtype: float
+            @return: None, if the member isn't in the set, or its score.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            member = member if isinstance(member, basestring) else str(member)
+            self._write('ZSCORE %s %s\r\n%s\r\n' % (name, len(member), member))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return None if rc is None else float(rc)
+
+    def zrank(self, name, member):
+        """
+            Return the rank of a member of the sorted set variable 'name', counting from 0
+            for the member with the lowest score.\r\n
+            Protocol::
+
+                    Client to server:   ZRANK <name> <length-of-member>\\r\\n<member>\\r\\n
+
+                    Server to client:   :<rank>\\r\\n
+
+                                        $-1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type member: string
+            @param member: member to look up
+
+            @rtype: integer
+            @return: None, if the member isn't in the set, or its rank.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            member = member if isinstance(member, basestring) else str(member)
+            self._write('ZRANK %s %s\r\n%s\r\n' % (name, len(member), member))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def _zpairs(self, rc, withscores):
+        # Turn the flat member, score, member, score... reply into a list of
+        # (member, score) tuples.
+        if not withscores:
+            return rc
+        return [(rc[i], float(rc[i+1])) for i in range(0, len(rc), 2)]
+
+    def zrange(self, name, start, end, withscores=False):
+        """
+            Return the members of the sorted set variable 'name' from rank start to rank
+            end, in order of score. Negative ranks count back from the end of the set.\r\n
+            Protocol::
+
+                    Client to server:   ZRANGE <name> <start> <end> [WITHSCORES]\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n<entry1>\\r\\n<entry2>\\r\\n ...\\r\\n<entryN>\\r\\n
+
+                                                where <entryN> is $<len of value>\\r\\n<value>
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type start: integer or string
+            @param start: rank of the first member to return
+
+            @type end: integer or string
+            @param end: rank of the last member to return
+
+            @type withscores: boolean
+            @param withscores: if True, return (member, score) tuples
+
+            @rtype: list
+            @return: the members, or (member, score) tuples, in the range.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('ZRANGE %s %s %s%s\r\n' % (name, start, end, ' WITHSCORES' if withscores else ''))
+            rc = self._zpairs(self.get_response(), withscores)
+        finally:
+            self.lock.release()
+        return rc
+
+    def zrangebyscore(self, name, min, max, start=None, num=None, withscores=False):
+        """
+            Return the members of the sorted set variable 'name' with scores from min to
+            max, in order of score. A bound given as a string starting with '(' leaves
+            out that score; '-inf' and '+inf' may be used as bounds.\r\n
+            Protocol::
+
+                    Client to server:   ZRANGEBYSCORE <name> <min> <max> [WITHSCORES] [LIMIT <start> <num>]\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n<entry1>\\r\\n<entry2>\\r\\n ...\\r\\n<entryN>\\r\\n
+
+                                                where <entryN> is $<len of value>\\r\\n<value>
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of sorted set variable
+
+            @type min: float, integer or string
+            @param min: lowest score to return
+
+            @type max: float, integer or string
+            @param max: highest score to return
+
+            @type start: integer
+            @param start: number of members in the range to skip
+
+            @type num: integer
+            @param num: most members to return
+
+            @type withscores: boolean
+            @param withscores: if True, return (member, score) tuples
+
+            @rtype: list
+            @return: the members, or (member, score) tuples, in the range.
+        """
+        stmt = ['ZRANGEBYSCORE', name, str(min), str(max)]
+        if withscores:
+            stmt.append('WITHSCORES')
+        if start is not None and num is not None:
+            stmt.append('LIMIT %s %s' % (start, num))
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write(' '.join(stmt) + '\r\n')
+            rc = self._zpairs(self.get_response(), withscores)
+        finally:
+            self.lock.release()
+        return rc
+
+    def hset(self, name, field, value):
+        """
+            Set a field of the hash variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   HSET <name> <field> <length-of-value>\\r\\n<value>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @type field: string
+            @param field: name of the field
+
+            @type value: string
+            @param value: value of the field
+
+            @rtype: integer
+            @return: 1 if the field is new, 0 if it was there and its value was changed.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            value = value if isinstance(value, basestring) else str(value)
+            self._write('HSET %s %s %s\r\n%s\r\n' % (name, field, len(value), value))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def hget(self, name, field):
+        """
+            Return the value of a field of the hash variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   HGET <name> <field>\\r\\n
+
+                    Server to client:   $<len of value>\\r\\n<value>\\r\\n
+
+                                        $-1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @type field: string
+            @param field: name of the field
+
+            @rtype: string
+            @return: None, if the field isn't there, or its value.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('HGET %s %s\r\n' % (name, field))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def hmget(self, name, *fields):
+        """
+            Return the values of several fields of the hash variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   HMGET <name> <field1> <field2> ... <fieldN>\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n<entry1>\\r\\n<entry2>\\r\\n ...\\r\\n<entryN>\\r\\n
+
+                                                where <entryN> is $<len of value>\\r\\n<value> or $-1
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @type fields: string
+            @param fields: one or more field names.
+
+            @rtype: list
+            @return: the value of each field, None for those that aren't there.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('HMGET %s %s\r\n' % (name, ' '.join(fields)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def hgetall(self, name):
+        """
+            Return the fields of the hash variable 'name' and their values.\r\n
+            Protocol::
+
+                    Client to server:   HGETALL <name>\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n<field1>\\r\\n<value1>\\r\\n ...\\r\\n<valueN>\\r\\n
+
+                                                where each entry is $<len>\\r\\n<string>
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @rtype: dictionary
+            @return: the fields and their values.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('HGETALL %s\r\n' % name)
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return dict(zip(rc[::2], rc[1::2]))
+
+    def hincrby(self, name, field, amount=1):
+        """
+            Add amount to the integer value of a field of the hash variable 'name'.
+            A field that isn't there is set to amount.\r\n
+            Protocol::
+
+                    Client to server:   HINCRBY <name> <field> <amount>\\r\\n
+
+                    Server to client:   :<value>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @type field: string
+            @param field: name of the field
+
+            @type amount: integer
+            @param amount: amount to add to the value
+
+            @rtype: integer
+            @return: the new value of the field.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('HINCRBY %s %s %s\r\n' % (name, field, amount))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def hdel(self, name, field):
+        """
+            Remove a field from the hash variable 'name'.\r\n
+            Protocol::
+
+                    Client to server:   HDEL <name> <field>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of hash variable
+
+            @type field: string
+            @param field: name of the field
+
+            @rtype: integer
+            @return: 1 if the field was removed, 0 if it wasn't there.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('HDEL %s %s\r\n' % (name, field))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def setbit(self, name, offset, value):
+        """
+            Set or clear one bit of the string variable 'name', growing it with zero
+            bytes if need be. Bit 0 is the high bit of the first byte.\r\n
+            Protocol::
+
+                    Client to server:   SETBIT <name> <offset> <0|1>\\r\\n
+
+                    Server to client:   :<old value>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type offset: integer
+            @param offset: number of the bit
+
+            @type value: integer
+            @param value: 0 or 1
+
+            @rtype: integer
+            @return: the old value of the bit.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('SETBIT %s %s %s\r\n' % (name, offset, value))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def getbit(self, name, offset):
+        """
+            Return one bit of the string variable 'name'. Bits past the end are 0.\r\n
+            Protocol::
+
+                    Client to server:   GETBIT <name> <offset>\\r\\n
+
+                    Server to client:   :<value>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type offset: integer
+            @param offset: number of the bit
+
+            @rtype: integer
+            @return: 0 or 1
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('GETBIT %s %s\r\n' % (name, offset))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bitcount(self, name, start=None, end=None):
+        """
+            Count the bits set in the string variable 'name', or in bytes start through
+            end of it. Negative positions count back from the end.\r\n
+            Protocol::
+
+                    Client to server:   BITCOUNT <name> [<start> <end>]\\r\\n
+
+                    Server to client:   :<count>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of variable
+
+            @type start: integer
+            @param start: first byte to count
+
+            @type end: integer
+            @param end: last byte to count
+
+            @rtype: integer
+            @return: the number of bits set.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            if start is None:
+                self._write('BITCOUNT %s\r\n' % name)
+            else:
+                self._write('BITCOUNT %s %s %s\r\n' % (name, start, end if end is not None else -1))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bitop(self, op, dest, *keys):
+        """
+            Store the AND, OR or XOR of several string variables, or the NOT of one,
+            in 'dest'. Shorter strings are padded with zero bytes.\r\n
+            Protocol::
+
+                    Client to server:   BITOP <op> <dest> <name1> <name2> ... <nameN>\\r\\n
+
+                    Server to client:   :<len>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type op: string
+            @param op: AND, OR, XOR or NOT
+
+            @type dest: string
+            @param dest: name of the variable to store the result in
+
+            @type keys: string
+            @param keys: names of the variables to combine
+
+            @rtype: integer
+            @return: the length of the result.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BITOP %s %s %s\r\n' % (op, dest, ' '.join(keys)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def pfadd(self, name, *members):
+        """
+            Add members to the HyperLogLog 'name', creating it if need be.\r\n
+            Protocol::
+
+                    Client to server:   PFADD <name> <member1> <member2> ... <memberN>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of HyperLogLog variable
+
+            @type members: string
+            @param members: the members to add
+
+            @rtype: integer
+            @return: 1 if the estimated count may have changed, 0 if not.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('PFADD %s %s\r\n' % (name, ' '.join(members)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def pfcount(self, *names):
+        """
+            Return the estimated number of different members added to one or more
+            HyperLogLogs, taken together.\r\n
+            Protocol::
+
+                    Client to server:   PFCOUNT <name1> <name2> ... <nameN>\\r\\n
+
+                    Server to client:   :<count>\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type names: string
+            @param names: names of HyperLogLog variables
+
+            @rtype: integer
+            @return: the estimated count.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('PFCOUNT %s\r\n' % ' '.join(names))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def pfmerge(self, dest, *names):
+        """
+            Merge HyperLogLogs into 'dest', creating it if need be.\r\n
+            Protocol::
+
+                    Client to server:   PFMERGE <dest> <name1> <name2> ... <nameN>\\r\\n
+
+                    Server to client:   +OK\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type dest: string
+            @param dest: name of the variable to merge into
+
+            @type names: string
+            @param names: names of HyperLogLog variables to merge
+
+            @rtype: string
+            @return: 'OK'
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('PFMERGE %s %s\r\n' % (dest, ' '.join(names)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bfreserve(self, name, error_rate, capacity):
+        """
+            Make an empty Bloom filter 'name', sized to hold 'capacity' items with the
+            given rate of false positives.\r\n
+            Protocol::
+
+                    Client to server:   BF.RESERVE <name> <error rate> <capacity>\\r\\n
+
+                    Server to client:   +OK\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of Bloom filter variable, which must not exist
+
+            @type error_rate: float
+            @param error_rate: the chance of an item that wasn't added being reported as there
+
+            @type capacity: integer
+            @param capacity: the number of items the filter is meant to hold
+
+            @rtype: string
+            @return: OK
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BF.RESERVE %s %r %s\r\n' % (name, float(error_rate), capacity))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bfadd(self, name, item):
+        """
+            Add an item to the Bloom filter 'name', creating it if need be.\r\n
+            Protocol::
+
+                    Client to server:   BF.ADD <name> <item>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of Bloom filter variable
+
+            @type item: string
+            @param item: the item to add
+
+            @rtype: integer
+            @return: 1 if the item wasn't there, 0 if it probably was.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BF.ADD %s %s\r\n' % (name, item))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bfmadd(self, name, *items):
+        """
+            Add several items to the Bloom filter 'name', creating it if need be.\r\n
+            Protocol::
+
+                    Client to server:   BF.MADD <name> <item1> <item2> ... <itemN>\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n:<1 or 0>\\r\\n ...
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of Bloom filter variable
+
+            @type items: string
+            @param items: the items to add
+
+            @rtype: list
+            @return: 1 for each item that wasn't there, 0 for each that probably was.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BF.MADD %s %s\r\n' % (name, ' '.join(items)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bfexists(self, name, item):
+        """
+            Check whether an item has been added to the Bloom filter 'name'.\r\n
+            Protocol::
+
+                    Client to server:   BF.EXISTS <name> <item>\\r\\n
+
+                    Server to client:   :0\\r\\n
+
+                                        :1\\r\\n
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of Bloom filter variable
+
+            @type item: string
+            @param item: the item to look for
+
+            @rtype: integer
+            @return: 1 if the item is probably there, 0 if it isn't.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BF.EXISTS %s %s\r\n' % (name, item))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
+    def bfmexists(self, name, *items):
+        """
+            Check whether several items have been added to the Bloom filter 'name'.\r\n
+            Protocol::
+
+                    Client to server:   BF.MEXISTS <name> <item1> <item2> ... <itemN>\\r\\n
+
+                    Server to client:   *<No.entries>\\r\\n:<1 or 0>\\r\\n ...
+
+                                        -ERR <error message>\\r\\n
+
+            @type name: string
+            @param name: name of Bloom filter variable
+
+            @type items: string
+            @param items: the items to look for
+
+            @rtype: list
+            @return: 1 for each item that is probably there, 0 for each that isn't.
+        """
+        self.connect()
+        try:
+            self.lock.acquire()
+            self._write('BF.MEXISTS %s %s\r\n' % (name, ' '.join(items)))
+            rc = self.get_response()
+        finally:
+            self.lock.release()
+        return rc
+
     def select(self, db):
         """
             All database operations following this one will use the new database
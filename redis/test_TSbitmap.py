@@ -0,0 +1,129 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import logging
+import random
+import unittest
+
+import TSbitmap as bitmap
+from TSdb import DB
+from TSexcept import ERR
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+def bits(s):
+    # The bits of a string, bit 0 first, one at a time.
+    return [(ord(c) >> (7 - i)) & 1 for c in s for i in xrange(8)]
+
+def fromBits(b):
+    return "".join([chr(int("".join(map(str,b[i:i+8])),2)) for i in xrange(0,len(b),8)])
+
+class BitmapTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(4)
+
+    def randomString(self,n):
+        return "".join([chr(random.randrange(256)) for i in xrange(n)])
+
+    def testSetAndGet(self):
+        b = bytearray()
+        self.assertEqual(bitmap.setbit(b,0,1),0)
+        self.assertEqual(str(b),"\x80")
+        self.assertEqual(bitmap.setbit(b,7,1),0)
+        self.assertEqual(bitmap.setbit(b,7,1),1)
+        self.assertEqual(str(b),"\x81")
+
+        # Setting a bit past the end grows it with zero bytes.
+        self.assertEqual(bitmap.setbit(b,23,1),0)
+        self.assertEqual(str(b),"\x81\x00\x01")
+        self.assertEqual(bitmap.setbit(b,0,0),1)
+        self.assertEqual(str(b),"\x01\x00\x01")
+        for s in (str(b),b):
+            self.assertEqual([bitmap.getbit(s,i) for i in xrange(24)],bits(str(b)))
+            self.assertEqual(bitmap.getbit(s,24),0)
+            self.assertEqual(bitmap.getbit(s,bitmap.MAXOFFSET),0)
+
+    def testPopcount(self):
+        for n in (0,1,7,8,100):
+            s = self.randomString(n)
+            self.assertEqual(bitmap.popcount(s),sum(bits(s)))
+            self.assertEqual(bitmap.popcount(bytearray(s)),sum(bits(s)))
+        self.assertEqual(bitmap.popcount("\xff" * 10),80)
+
+    def testBitop(self):
+        ops = {"and":lambda x,y: x & y,"or":lambda x,y: x | y,"xor":lambda x,y: x ^ y}
+        for i in xrange(50):
+            values = [self.randomString(random.randrange(6)) for j in xrange(random.randrange(1,4))]
+            n = max([len(v) for v in values])
+            padded = [bits(v + "\0" * (n - len(v))) for v in values]
+            for op,f in ops.iteritems():
+                want = reduce(lambda a,b: [f(x,y) for x,y in zip(a,b)],padded)
+                self.assertEqual(bitmap.bitop(op,values),fromBits(want))
+            self.assertEqual(bitmap.bitop("not",values[:1]),fromBits([1 - x for x in bits(values[0])]))
+
+        # Leading zero bytes are kept.
+        self.assertEqual(bitmap.bitop("and",["\x00\x01","\x00\xff"]),"\x00\x01")
+        self.assertEqual(bitmap.bitop("not",["\xff\xff"]),"\x00\x00")
+        self.assertEqual(bitmap.bitop("or",["",""]),"")
+        self.assertEqual(bitmap.bitop("or",[]),"")
+
+    def testParse(self):
+        self.assertEqual(bitmap.parseOffset("0"),0)
+        self.assertEqual(bitmap.parseOffset(str(bitmap.MAXOFFSET)),bitmap.MAXOFFSET)
+        for s in ("-1",str(bitmap.MAXOFFSET + 1),"x",""):
+            self.assertRaises(ERR,bitmap.parseOffset,s)
+        self.assertEqual(bitmap.parseBit("1"),1)
+        for s in ("2","-1","01",""):
+            self.assertRaises(ERR,bitmap.parseBit,s)
+
+class BitcountTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.db = DB(threaded=False)
+        self.db.flushAll()
+        self.value = "\xff\xf0\x00\x01\x80"
+        for i,b in enumerate(bits(self.value)):
+            if b:
+                self.db.setbit("0","b",i,1)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def testRanges(self):
+        # Negative offsets count back from the end; ones before the start of the
+        # string are byte 0, and ones past the end the last byte.
+        v = self.value
+        n = len(v)
+        for s in xrange(-n-2,n+2):
+            for e in xrange(-n-2,n+2):
+                a = max(n + s,0) if s < 0 else s
+                z = max(n + e,0) if e < 0 else e
+                self.assertEqual(self.db.bitcount("0","b",s,e),sum(bits(v[a:z+1])),(s,e))
+        self.assertEqual(self.db.bitcount("0","b"),sum(bits(v)))
+        self.assertEqual(self.db.bitcount("0","missing"),0)
+
+    def testBitop(self):
+        self.db.setbit("0","c",47,1)
+        self.assertEqual(self.db.bitop("0","and","d",["b","c"]),6)
+        self.assertEqual(self.db.get("0","d"),"\0" * 6)
+        self.assertEqual(self.db.bitop("0","or","d",["b","c","missing"]),6)
+        self.assertEqual(self.db.get("0","d"),self.value + "\x01")
+
+        # An empty result deletes the variable.
+        self.assertEqual(self.db.bitop("0","or","d",["missing"]),0)
+        self.assertRaises(KeyError,self.db.get,"0","d")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import pickle
+import unittest
+
+from TSbloom import BloomFilter, MAXBITS, parseCapacity, parseErrorRate
+from TSexcept import ERR
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class BloomFilterTest(unittest.TestCase):
+
+    def falsePositives(self,f,n):
+        # The fraction of n items never added that the filter says it has.
+        return sum([1 for i in xrange(n) if "other:%d" % i in f]) / float(n)
+
+    def testErrorRate(self):
+        # Filled to capacity a filter is wrong about items it hasn't seen at close
+        # to the rate it was made for, and never about ones it has.
+        for capacity,errorRate in ((1000,0.01),(2000,0.001),(500,0.1)):
+            f = BloomFilter(capacity,errorRate)
+            items = ["item:%d" % i for i in xrange(capacity)]
+            for item in items:
+                f.add(item)
+            for item in items:
+                self.assertTrue(item in f)
+            rate = self.falsePositives(f,20000)
+            self.assertTrue(rate < 2 * errorRate,(capacity,errorRate,rate))
+
+    def testEmpty(self):
+        f = BloomFilter(1000,0.01)
+        self.assertEqual(self.falsePositives(f,1000),0.0)
+
+    def testAdd(self):
+        f = BloomFilter()
+        self.assertEqual((f.capacity,f.errorRate),(BloomFilter.defaultCapacity,BloomFilter.defaultErrorRate))
+        self.assertEqual(f.add("a"),1)
+        self.assertEqual(f.add("a"),0)
+        self.assertEqual(f.add("b"),1)
+        self.assertEqual(f.count,2)
+
+    def testSize(self):
+        # About 9.6 bits and 7 hashes an item for 1%, a whole number of bytes.
+        f = BloomFilter(1000,0.01)
+        self.assertEqual(f.m,9592)
+        self.assertEqual(f.k,7)
+        self.assertEqual(len(f.bits),f.m >> 3)
+
+    def testTooLarge(self):
+        # Refused before anything is allocated.
+        self.assertRaises(ERR,BloomFilter,MAXBITS,0.5)
+        self.assertRaises(ERR,BloomFilter,10**9,0.01)
+
+    def testPickle(self):
+        f = BloomFilter(100,0.01)
+        for i in xrange(50):
+            f.add("item:%d" % i)
+        copy = pickle.loads(pickle.dumps(f,pickle.HIGHEST_PROTOCOL))
+        self.assertEqual((copy.m,copy.k,copy.count,copy.capacity,copy.errorRate),
+                         (f.m,f.k,f.count,f.capacity,f.errorRate))
+        self.assertEqual(copy.bits,f.bits)
+        self.assertTrue("item:7" in copy)
+        self.assertEqual(copy.add("item:7"),0)
+
+    def testParse(self):
+        self.assertEqual(parseErrorRate("0.01"),0.01)
+        for s in ("0","1","-0.5","x",""):
+            self.assertRaises(ERR,parseErrorRate,s)
+        self.assertEqual(parseCapacity("10"),10)
+        for s in ("0","-1","1.5","x"):
+            self.assertRaises(ERR,parseCapacity,s)
+
+if __name__ == "__main__":
+    unittest.main()
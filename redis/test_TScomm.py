@@ -0,0 +1,84 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import logging
+import socket
+import unittest
+
+from TScomm import SlaveComm, SlaveLink
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class Server(object):
+    """
+    Just enough of a server for a SlaveLink: its table of slaves.
+    """
+    def __init__(self):
+        self.loop = None
+        self.outputLimit = 1 << 20
+        self.remoteList = {}
+        self.removed = []
+
+    def removeConnection(self,host,port):
+        self.removed.append((host,port))
+        del self.remoteList[host,port]
+
+class SlaveLinkTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.key = ("localhost","6400")
+        self.server = Server()
+        self.slave,sock = socket.socketpair()
+        self.slave.settimeout(1.0)
+        comm = SlaveComm("localhost",6400)
+        comm._sock = sock
+        self.link = self.server.remoteList[self.key] = SlaveLink(comm,self.server,self.key)
+
+    def tearDown(self):
+        self.link.close()
+        self.slave.close()
+        logging.disable(logging.NOTSET)
+
+    def testSend(self):
+        self.link.write("DO 3\r\nabc\r\n")
+        self.link.write("DO 1\r\nd\r\n")
+        self.assertEqual(self.slave.recv(100),"DO 3\r\nabc\r\nDO 1\r\nd\r\n")
+        self.assertFalse(self.link.writable())
+
+        # Answers split across reads are fine.
+        self.slave.sendall("+O")
+        self.link.handle_read()
+        self.slave.sendall("K\r\n+OK\r\n")
+        self.link.handle_read()
+        self.assertEqual(self.server.removed,[])
+
+    def testError(self):
+        # An error from the slave drops it.
+        self.link.write("DO 1\r\nd\r\n")
+        self.slave.sendall("-ERR version mismatch\r\n")
+        self.link.handle_read()
+        self.assertEqual(self.server.removed,[self.key])
+        self.assertEqual(self.server.remoteList,{})
+
+    def testTooFarBehind(self):
+        # A slave that doesn't read what it is sent is dropped once too much is
+        # waiting for it.
+        self.server.outputLimit = 1 << 16
+        for i in xrange(200):
+            self.link.write("x" * 4096)
+            if self.server.removed: break
+        self.assertEqual(self.server.removed,[self.key])
+
+if __name__ == "__main__":
+    unittest.main()
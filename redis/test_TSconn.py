@@ -0,0 +1,138 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import logging
+import unittest
+from collections import deque
+
+from TSconn import PyNoSql, SENDSIZE
+from TSdb import DB
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class Socket(object):
+    """
+    A socket that takes at most limit bytes a send, and keeps what it was sent.
+    """
+    def __init__(self,limit):
+        self.limit = limit
+        self.data = []
+
+    def send(self,s):
+        s = str(s)[:self.limit]
+        self.data.append(s)
+        return len(s)
+
+class Connection(PyNoSql):
+    """
+    A connection with output queued, without a server or a real socket.
+    """
+    def __init__(self,limit,pieces):
+        self.socket = Socket(limit)
+        self.outq = deque(pieces)
+        self.outOffset = 0
+        self.outBytes = sum(map(len,pieces))
+
+class Server(object):
+    """
+    Just enough of a server for a connection to run commands: it has the changes
+    written out after every one and keeps what would go to the slaves. dumpError
+    is raised when a save is asked for, if it is set.
+    """
+    def __init__(self):
+        self.mark = 0
+        self.updateCount = 1
+        self.halting = False
+        self.outputLimit = 1 << 30
+        self.queued = []
+        self.dumps = 0
+        self.dumpError = None
+
+    def addToQueue(self,*args):
+        self.queued.append(args)
+
+    addToQueueNoVersion = addToQueue
+
+    def triggerDump(self):
+        if self.dumpError:
+            raise self.dumpError
+        self.dumps += 1
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def connection(self):
+        c = Connection(1 << 30,[])
+        c.db = DB(threaded=False)
+        c.server = Server()
+        c.whichdb = "0"
+        c.auth = True
+        c.master = True
+        c.closeFlag = False
+        return c
+
+    def testBatch(self):
+        c = self.connection()
+        c.parseBatch([["set","a","1"],["get","a"],["get","b"]])
+        self.assertEqual("".join(c.outq),"+OK\r\n$1\r\n1\r\n$-1\r\n")
+        self.assertEqual(c.server.queued,[("0","mset","a","1"),("0","bgsave")])
+        self.assertEqual(c.server.dumps,1)
+
+    def testSaveFails(self):
+        # A save that can't be started is the reply to the SET that made it due,
+        # and the rest of the replies are still sent.
+        c = self.connection()
+        c.server.dumpError = IOError("no room")
+        c.parseBatch([["set","a","1"],["set","b","2"],["get","a"]])
+        out = "".join(c.outq).split("\r\n")
+        self.assertEqual(out[0],"+OK")
+        self.assertTrue(out[1].startswith("-ERR"))
+        self.assertEqual(out[2:],["$1","1",""])
+        self.assertEqual(c.db.get("0","b"),"2")
+
+class WriteTest(unittest.TestCase):
+
+    def connection(self,limit,pieces):
+        return Connection(limit,pieces)
+
+    def drain(self,c):
+        n = 0
+        while c.outq:
+            c.handle_write()
+            n += 1
+            self.assertTrue(n < 1000)
+        self.assertEqual(c.outBytes,0)
+        self.assertEqual(c.outOffset,0)
+        return "".join(c.socket.data)
+
+    def testPartialSmallPieces(self):
+        pieces = ["+OK","\r\n"] * 50
+        c = self.connection(32,pieces)
+        c.handle_write()
+        self.assertEqual(c.outOffset,2)
+        self.assertEqual(self.drain(c),"".join(pieces))
+
+    def testPartialLargePiece(self):
+        pieces = ["x" * (SENDSIZE + 100),"\r\n","$3\r\n","abc","\r\n"]
+        c = self.connection(SENDSIZE,pieces)
+        c.handle_write()
+        self.assertEqual(c.outOffset,SENDSIZE)
+        self.assertEqual(self.drain(c),"".join(pieces))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import pickle
+import unittest
+
+from TSexcept import ERR
+from TShash import Hash
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class HashTest(unittest.TestCase):
+
+    def fill(self,n):
+        h = Hash()
+        for i in xrange(n):
+            self.assertEqual(h.set("f%d" % i,"v%d" % i),1)
+        return h
+
+    def check(self,h,fields):
+        # h holds exactly the fields given, in whichever form.
+        self.assertEqual(len(h),len(fields))
+        self.assertEqual(dict(h.items()),fields)
+        for f,v in fields.iteritems():
+            self.assertEqual(h.get(f),v)
+            self.assertTrue(f in h)
+        self.assertFalse("missing" in h)
+
+    def testCompact(self):
+        h = self.fill(Hash.maxEntries)
+        self.assertEqual(h.encoding(),"compact")
+        self.assertEqual(h.set("f0","new"),0)
+        self.assertEqual(h.remove("f1"),1)
+        self.assertEqual(h.remove("f1"),0)
+        fields = dict(("f%d" % i,"v%d" % i) for i in xrange(2,Hash.maxEntries))
+        fields["f0"] = "new"
+        self.check(h,fields)
+        self.assertEqual(h.encoding(),"compact")
+
+    def testTooManyFields(self):
+        n = Hash.maxEntries + 1
+        h = self.fill(n)
+        self.assertEqual(h.encoding(),"dict")
+        self.check(h,dict(("f%d" % i,"v%d" % i) for i in xrange(n)))
+
+        # It doesn't go back once it has changed over.
+        for i in xrange(n-1):
+            h.remove("f%d" % i)
+        self.assertEqual(h.encoding(),"dict")
+        self.check(h,{"f%d" % (n-1):"v%d" % (n-1)})
+
+    def testLongValue(self):
+        big = "x" * (Hash.maxValue + 1)
+        for field,value in ((big,"v"),("f",big),("f0",big)):
+            h = self.fill(3)
+            h.set(field,value)
+            self.assertEqual(h.encoding(),"dict")
+            fields = {"f0":"v0","f1":"v1","f2":"v2"}
+            fields[field] = value
+            self.check(h,fields)
+
+    def testIncr(self):
+        h = Hash([("n","5"),("s","abc")])
+        self.assertEqual(h.incr("n",3),8)
+        self.assertEqual(h.incr("m",-2),-2)
+        self.assertEqual(h.get("n"),"8")
+        self.assertEqual(h.get("m"),"-2")
+        self.assertRaises(ERR,h.incr,"s",1)
+
+    def testPickle(self):
+        for h in (self.fill(3),self.fill(Hash.maxEntries + 1),Hash()):
+            copy = pickle.loads(pickle.dumps(h,pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(copy.encoding(),h.encoding())
+            self.assertEqual(sorted(copy),sorted(h))
+            copy.set("new","1")
+            self.assertEqual(copy.get("new"),"1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import pickle
+import unittest
+
+from TShll import HyperLogLog, M
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+def filled(members):
+    h = HyperLogLog()
+    for m in members:
+        h.add(m)
+    return h
+
+def registers(h):
+    # All M registers of h, whichever way they are held.
+    r = h.regs
+    if type(r) is bytearray:
+        return str(r)
+    d = bytearray(M)
+    for v in r:
+        d[v >> 6] = v & 63
+    return str(d)
+
+def members(start,stop):
+    return ["member:%d" % i for i in xrange(start,stop)]
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def testSmall(self):
+        h = HyperLogLog()
+        self.assertEqual(h.count(),0)
+        self.assertEqual(h.add("a"),1)
+        self.assertEqual(h.add("a"),0)
+        self.assertEqual(h.count(),1)
+        h = filled(members(0,100))
+        self.assertTrue(abs(h.count() - 100) <= 1)
+        self.assertEqual(h.encoding(),"sparse")
+
+    def testDense(self):
+        # Once there are more than maxSparse registers in use it changes over to
+        # the bytearray, keeping the registers it had.
+        h = HyperLogLog()
+        i = 0
+        while h.encoding() == "sparse":
+            h.add("member:%d" % i)
+            i += 1
+        self.assertEqual(len(h.regs),M)
+        self.assertTrue(i > HyperLogLog.maxSparse)
+        self.assertEqual(registers(h),registers(filled(members(0,i))))
+        self.assertTrue(abs(h.count() - i) < 0.03 * i)
+
+    def testAccuracy(self):
+        # The standard error is about 0.8%; these are well inside four times that.
+        h = HyperLogLog()
+        n = 0
+        for stop in (1000,10000,100000):
+            for m in members(n,stop):
+                h.add(m)
+            n = stop
+            self.assertTrue(abs(h.count() - n) < 0.03 * n,(h.count(),n))
+
+            # Adding them again changes nothing.
+            for m in members(0,100):
+                self.assertEqual(h.add(m),0)
+            self.assertTrue(abs(h.count() - n) < 0.03 * n)
+
+    def testMerge(self):
+        # Merging gives the registers adding all the members to one would, whether
+        # each side is sparse or dense.
+        small = members(0,500),members(300,800)
+        large = members(1000,6000),members(4000,12000)
+        for a,b in [small,large,(small[0],large[0]),(large[0],small[0])]:
+            x,y = filled(a),filled(b)
+            xe,ye = x.encoding(),y.encoding()
+            x.merge(y)
+            self.assertEqual(registers(x),registers(filled(a + b)),(xe,ye))
+            self.assertEqual(y.encoding(),ye)
+            n = len(set(a) | set(b))
+            self.assertTrue(abs(x.count() - n) < 0.03 * n)
+
+    def testCopy(self):
+        for h in (filled(members(0,10)),filled(members(0,5000))):
+            c = h.copy()
+            self.assertEqual(c.count(),h.count())
+            c.merge(filled(members(10000,20000)))
+            self.assertNotEqual(registers(c),registers(h))
+
+    def testPickle(self):
+        for h in (HyperLogLog(),filled(members(0,10)),filled(members(0,5000))):
+            copy = pickle.loads(pickle.dumps(h,pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(copy.encoding(),h.encoding())
+            self.assertEqual(registers(copy),registers(h))
+            self.assertEqual(copy.count(),h.count())
+            copy.add("new")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import logging
+import pickle
+import random
+import unittest
+
+from TSdb import DB
+from TSintset import IntSet, MAXVAL, MINVAL, toInt
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class IntSetTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(2)
+
+    def sample(self,n):
+        return [random.randrange(-200,200) for i in xrange(n)]
+
+    def testToInt(self):
+        self.assertEqual(toInt("42"),42)
+        self.assertEqual(toInt("-7"),-7)
+        self.assertEqual(toInt(str(MAXVAL)),MAXVAL)
+        self.assertEqual(toInt(str(MINVAL)),MINVAL)
+        for s in ("","007","+1"," 1","1.0","x",str(MAXVAL+1),str(MINVAL-1)):
+            self.assertEqual(toInt(s),None)
+
+    def testMembers(self):
+        ints = self.sample(100)
+        s = IntSet(ints)
+        self.assertEqual(len(s),len(set(ints)))
+        self.assertEqual(sorted(s),sorted(str(n) for n in set(ints)))
+        self.assertTrue(str(ints[0]) in s)
+        self.assertFalse("1000" in s)
+        self.assertFalse("x" in s)
+        self.assertEqual(s.add(1000),1)
+        self.assertEqual(s.add(1000),0)
+        self.assertEqual(s.remove("1000"),1)
+        self.assertEqual(s.remove("1000"),0)
+        self.assertEqual(s.remove("x"),0)
+        self.assertEqual(s.pop(),str(max(ints)))
+
+    def testAlgebra(self):
+        # The set operations give what they would on Python sets of the strings,
+        # whether the other set is an IntSet or not.
+        for i in xrange(20):
+            a,b = self.sample(random.randrange(50)),self.sample(random.randrange(50))
+            x,y = IntSet(a),IntSet(b)
+            sa,sb = set(x),set(y)
+            for other in (y,sb):
+                self.assertEqual(set(x.intersection(other)),sa & sb)
+                self.assertEqual(set(x.union(other)),sa | sb)
+                self.assertEqual(set(x.difference(other)),sa - sb)
+            self.assertEqual(list(x.union(y).a),sorted(set(a) | set(b)))
+
+    def testPickle(self):
+        for s in (IntSet(self.sample(10)),IntSet()):
+            copy = pickle.loads(pickle.dumps(s,pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(list(copy.a),list(s.a))
+            copy.add(5)
+            self.assertTrue("5" in copy)
+
+class UpgradeTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.db = DB(threaded=False)
+        self.db.flushAll()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def held(self,var):
+        return type(self.db.db["0"][var])
+
+    def testNotAnInteger(self):
+        self.assertEqual(self.db.sadd("0","s",["1","2","3"]),3)
+        self.assertTrue(self.held("s") is IntSet)
+        self.assertEqual(self.db.sadd("0","s",["a"]),1)
+        self.assertTrue(self.held("s") is tuple)
+        self.assertEqual(sorted(self.db.smembers("0","s")),["1","2","3","a"])
+
+    def testTooBig(self):
+        n = self.db.intsetMaxEntries
+        self.assertEqual(self.db.sadd("0","s",[str(i) for i in xrange(n)]),n)
+        self.assertTrue(self.held("s") is IntSet)
+        self.assertEqual(self.db.sadd("0","s",[str(n)]),1)
+        self.assertTrue(self.held("s") is set)
+        self.assertEqual(set(self.db.smembers("0","s")),set(str(i) for i in xrange(n+1)))
+        self.assertEqual(self.db.sadd("0","s",["0"]),0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import logging
+import pickle
+import random
+import unittest
+from fnmatch import fnmatchcase
+
+from TSdb import DB
+from TSkeyspace import Keyspace, literalPrefix
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+PATTERNS = ["*","k1*","k1?","k*2","*1","k[12]*","k1[!0-4]","u:*:x","u:1:x","k","","nothing*"]
+
+class KeyspaceTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(5)
+
+    def name(self):
+        if random.random() < 0.2:
+            return "u:%d:%s" % (random.randrange(20),random.choice("xy"))
+        return "k%d" % random.randrange(300)
+
+    def change(self,ks):
+        # Change the keyspace in one of the ways a dictionary can be changed.
+        how = random.randrange(10)
+        key = self.name()
+        if how < 4:
+            ks[key] = how
+        elif how == 4:
+            ks.setdefault(key,how)
+        elif how == 5:
+            ks.update([(self.name(),how) for i in xrange(3)])
+        elif how == 6:
+            ks.pop(key,None)
+        elif how == 7 and ks:
+            ks.popitem()
+        elif key in ks:
+            del ks[key]
+
+    def check(self,ks):
+        for pattern in PATTERNS:
+            want = sorted([k for k in ks.keys() if fnmatchcase(k,pattern)])
+            self.assertEqual(sorted(ks.match(pattern)),want,pattern)
+
+    def testMatch(self):
+        # Matching after every few changes uses the index as it is kept up to date;
+        # after a lot of them it is made again.
+        ks = Keyspace()
+        for n in (1,5,50,2000):
+            for i in xrange(20):
+                for j in xrange(n):
+                    self.change(ks)
+                self.check(ks)
+                self.assertEqual(ks.sortedKeys(),sorted(ks.keys()))
+
+    def testClear(self):
+        ks = Keyspace((("k%d" % i,i) for i in xrange(10)))
+        self.check(ks)
+        ks.clear()
+        self.assertEqual(ks.match("k*"),[])
+        ks["k1"] = 1
+        self.assertEqual(ks.match("k*"),["k1"])
+
+    def testPickle(self):
+        # A keyspace is saved as a plain dictionary.
+        ks = Keyspace((("k%d" % i,i) for i in xrange(10)))
+        ks.match("k*")
+        copy = pickle.loads(pickle.dumps(ks,pickle.HIGHEST_PROTOCOL))
+        self.assertTrue(type(copy) is dict)
+        self.assertEqual(copy,dict(ks))
+
+    def testLiteralPrefix(self):
+        self.assertEqual(literalPrefix("abc*d"),"abc")
+        self.assertEqual(literalPrefix("a?"),"a")
+        self.assertEqual(literalPrefix("[ab]"),"")
+        self.assertEqual(literalPrefix("abc"),"abc")
+
+class KeysTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.db = DB(threaded=False)
+        self.db.flushAll()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def testFirstKeys(self):
+        # A database is a plain dictionary until KEYS is used on it.
+        self.db.set("0","k1","a")
+        self.db.set("0","k2","b")
+        self.assertTrue(type(self.db.db["0"]) is dict)
+        self.assertEqual(sorted(self.db.keys("0","k*")),["k1","k2"])
+        self.assertTrue(type(self.db.db["0"]) is Keyspace)
+
+        # The variables set and deleted after that are found, or not.
+        self.db.set("0","k3","c")
+        self.db.remove("0","k1")
+        self.assertEqual(sorted(self.db.keys("0","k*")),["k2","k3"])
+
+        self.db.select("1")
+        self.assertTrue(type(self.db.db["1"]) is dict)
+
+if __name__ == "__main__":
+    unittest.main()
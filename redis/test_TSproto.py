@@ -0,0 +1,132 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import unittest
+
+from TSexcept import ERR
+from TSproto import RequestBuffer, MAXINLINE, MAXARGS, MAXBULK
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+BULK = frozenset(["set","sadd"])
+
+class RequestBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.r = RequestBuffer(BULK)
+
+    def commands(self,*pieces):
+        # Feed the pieces in turn, and return every command (or the error for a
+        # bad one) that comes out.
+        rc = []
+        for p in pieces:
+            self.r.feed(p)
+            while True:
+                try:
+                    parts = self.r.next()
+                except ERR,e:
+                    rc.append(e.__str__())
+                    continue
+                if parts is None:
+                    break
+                rc.append(parts)
+        return rc
+
+    def testInline(self):
+        self.assertEqual(self.commands("PING\r\n"),[["PING"]])
+        self.assertEqual(self.commands("GET  a\r\n"),[["GET","a"]])
+        self.assertEqual(self.commands("SET a 5\r\nab\r\nc\r\n"),[["SET","a","ab\r\nc"]])
+        self.assertEqual(self.r.pending(),0)
+
+    def testPartial(self):
+        # A command sent a byte at a time comes out once it is all there.
+        data = "SET key 11\r\nhello world\r\nGET key\r\n"
+        rc = self.commands(*list(data))
+        self.assertEqual(rc,[["SET","key","hello world"],["GET","key"]])
+        self.assertEqual(self.r.pending(),0)
+
+    def testPartialBulk(self):
+        self.assertEqual(self.commands("SET a 10\r\n01234"),[])
+        self.assertEqual(self.r.pending(),len("SET a 10\r\n01234"))
+        self.assertEqual(self.commands("56789\r"),[])
+        self.assertEqual(self.commands("\nPING"),[["SET","a","0123456789"]])
+        self.assertEqual(self.commands("\r\n"),[["PING"]])
+
+    def testPipelined(self):
+        data = "".join(["SET k%d 2\r\nv%d\r\n" % (i,i % 10) for i in xrange(1000)])
+        rc = self.commands(data)
+        self.assertEqual(len(rc),1000)
+        self.assertEqual(rc[0],["SET","k0","v0"])
+        self.assertEqual(rc[999],["SET","k999","v9"])
+
+    def testBadBulkLength(self):
+        # The bad command is reported and the ones after it still run.
+        rc = self.commands("SET a x\r\nSET b -1\r\nPING\r\n")
+        self.assertTrue(rc[0].startswith("-ERR length in message is not an integer"))
+        self.assertEqual(rc[1],"-ERR invalid bulk length")
+        self.assertEqual(rc[2],["PING"])
+
+    def testTooLong(self):
+        # A line that doesn't end is given up on once it is too long, and thrown
+        # away as the rest of it arrives.
+        rc = self.commands("GET " + "x" * MAXINLINE,"x" * 1000,"x\r","\nPING\r\n")
+        self.assertEqual(rc,["-ERR Protocol error: too big inline request",["PING"]])
+        self.assertEqual(self.r.pending(),0)
+
+        rc = self.commands("GET %s\r\nPING\r\n" % ("x" * MAXINLINE))
+        self.assertEqual(rc,["-ERR Protocol error: too big inline request",["PING"]])
+
+    def mb(self,*args):
+        return "*%d\r\n" % len(args) + "".join(["$%d\r\n%s\r\n" % (len(a),a) for a in args])
+
+    def testMultiBulk(self):
+        rc = self.commands(self.mb("SET","a key","a\r\nvalue"),self.mb("PING"))
+        self.assertEqual(rc,[["SET","a key","a\r\nvalue"],["PING"]])
+        self.assertEqual(self.commands(self.mb("SET","e","")),[["SET","e",""]])
+
+    def testMultiBulkPartial(self):
+        data = self.mb("SET","k","v" * 100) + self.mb("GET","k")
+        rc = self.commands(*[data[i:i+7] for i in xrange(0,len(data),7)])
+        self.assertEqual(rc,[["SET","k","v" * 100],["GET","k"]])
+        self.assertEqual(self.r.pending(),0)
+
+    def testMixed(self):
+        # Inline and multi-bulk commands can follow each other on one connection.
+        data = "PING\r\n" + self.mb("GET","a b") + "SET c 1\r\nx\r\n" + self.mb("DEL","c")
+        rc = self.commands(data)
+        self.assertEqual(rc,[["PING"],["GET","a b"],["SET","c","x"],["DEL","c"]])
+
+    def testEmpty(self):
+        # Empty commands are ignored, however many of them are sent.
+        rc = self.commands("*0\r\n" * 5000 + "*-1\r\n" + "PING\r\n")
+        self.assertEqual(rc,[["PING"]])
+        self.assertEqual(self.commands("*0\r\n" * 3),[])
+        self.assertEqual(self.r.pending(),0)
+
+    def testBadLengths(self):
+        # Each bad command is reported, and the ones after it still run.
+        rc = self.commands("*x\r\nPING\r\n")
+        self.assertEqual(rc,["-ERR Protocol error: invalid multibulk length",["PING"]])
+        rc = self.commands("*%d\r\nPING\r\n" % (MAXARGS+1))
+        self.assertEqual(rc,["-ERR Protocol error: invalid multibulk length",["PING"]])
+        rc = self.commands("*1\r\n$x\r\nPING\r\n")
+        self.assertEqual(rc,["-ERR Protocol error: invalid bulk length",["PING"]])
+        rc = self.commands("*1\r\n$-1\r\nPING\r\n")
+        self.assertEqual(rc,["-ERR Protocol error: invalid bulk length",["PING"]])
+        rc = self.commands("*1\r\n$%d\r\nPING\r\n" % (MAXBULK+1))
+        self.assertEqual(rc,["-ERR Protocol error: invalid bulk length",["PING"]])
+        rc = self.commands("*2\r\n$3\r\nGET\r\n+a\r\nPING\r\n")
+        self.assertEqual(rc,["-ERR Protocol error: expected '$', got '+'",["PING"]])
+
+if __name__ == "__main__":
+    unittest.main()
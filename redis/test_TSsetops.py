@@ -0,0 +1,92 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import random
+import unittest
+
+from TSintset import IntSet
+from TSsetops import diff, inter, union
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class SetOpsTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(3)
+
+    def members(self,ints):
+        # Some members, all integers if ints is set.
+        n = random.choice((0,1,5,20,100))
+        if ints:
+            return [str(random.randrange(-50,150)) for i in xrange(n)]
+        return [random.choice(("a","b","c","%d" % i,"x%d" % i)) for i in xrange(n)]
+
+    def variable(self):
+        # A set variable's value in one of the ways it can be held, or None for a
+        # variable that doesn't exist.
+        kind = random.choice(("set","tuple","intset","intset","none"))
+        if kind == "none":
+            return None
+        if kind == "intset":
+            return IntSet([int(m) for m in self.members(True)])
+        members = self.members(random.random() < 0.5)
+        return set(members) if kind == "set" else tuple(set(members))
+
+    def check(self,op,expected):
+        for i in xrange(300):
+            sets = [self.variable() for j in xrange(random.randrange(1,5))]
+            before = [None if s is None else sorted(s) for s in sets]
+            result = op(sets)
+            self.assertEqual(set(result),expected([set(s) if s is not None else None for s in sets]))
+
+            # The result is a new object: changing it leaves the variables alone.
+            if type(result) is IntSet:
+                result.add(1000)
+            else:
+                result.add("new")
+            self.assertEqual([None if s is None else sorted(s) for s in sets],before)
+
+    def testInter(self):
+        def expected(sets):
+            if None in sets:
+                return set()
+            return set.intersection(*sets)
+        self.check(inter,expected)
+
+    def testUnion(self):
+        def expected(sets):
+            return set().union(*[s for s in sets if s is not None])
+        self.check(union,expected)
+
+    def testDiff(self):
+        def expected(sets):
+            if sets[0] is None:
+                return set()
+            return sets[0].difference(*[s for s in sets[1:] if s is not None])
+        self.check(diff,expected)
+
+    def testIntSets(self):
+        # IntSets combined only with IntSets give an IntSet.
+        a,b = IntSet([1,2,3]),IntSet([2,3,4])
+        for op in (inter,union,diff):
+            self.assertTrue(type(op([a,b])) is IntSet)
+        self.assertTrue(type(inter([a,set(["2"])])) is set)
+
+    def testEmpty(self):
+        self.assertEqual(inter([]),set())
+        self.assertEqual(union([]),set())
+        self.assertEqual(diff([]),set())
+        self.assertEqual(union([None,None]),set())
+
+if __name__ == "__main__":
+    unittest.main()
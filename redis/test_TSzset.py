@@ -0,0 +1,101 @@
+# -*- coding: iso-8859-1 -*-
+
+"""
+    Copyright (c) 2009 Charles E. R. Wegrzyn
+    All Right Reserved.
+
+    chuck.wegrzyn at gmail.com
+
+    This application is free software and subject to the Version 1.0
+    of the Common Public Attribution License.
+
+"""
+
+import pickle
+import random
+import unittest
+
+from TSexcept import ERR
+from TSzset import SortedSet, formatScore, parseBound
+
+# Run with: python -m unittest discover -s redis -p "test_*.py"
+
+class SortedSetTest(unittest.TestCase):
+
+    def setUp(self):
+        # A sorted set and, to check it against, a dictionary of the same scores.
+        random.seed(1)
+        self.z = SortedSet()
+        self.scores = {}
+        for i in xrange(500):
+            member = "m%d" % random.randrange(300)
+            score = float(random.randrange(50))
+            if random.random() < 0.2:
+                self.z.remove(member)
+                self.scores.pop(member,None)
+            else:
+                self.z.add(member,score)
+                self.scores[member] = score
+
+    def expected(self):
+        # The (member,score) pairs in order of score, then member.
+        return [(m,s) for s,m in sorted((s,m) for m,s in self.scores.iteritems())]
+
+    def testOrder(self):
+        self.assertEqual(len(self.z),len(self.scores))
+        self.assertEqual(list(self.z),self.expected())
+
+    def testRank(self):
+        for i,(member,score) in enumerate(self.expected()):
+            self.assertEqual(self.z.rank(member),i)
+        self.assertEqual(self.z.rank("missing"),None)
+
+    def testRange(self):
+        pairs = self.expected()
+        n = len(pairs)
+        for start,end in [(0,-1),(0,0),(5,9),(-3,-1),(n-1,n+10),(-n-5,2),(10,5)]:
+            s = max(n + start,0) if start < 0 else start
+            e = n + end if end < 0 else end
+            self.assertEqual(self.z.range(start,end),pairs[s:e+1])
+
+    def testRangeByScore(self):
+        pairs = self.expected()
+        for lo,hi in [(0,49),(10,20),(20,10),(-1,0),(49,100)]:
+            for minEx in (False,True):
+                for maxEx in (False,True):
+                    want = [(m,s) for m,s in pairs
+                            if (s > lo if minEx else s >= lo) and (s < hi if maxEx else s <= hi)]
+                    self.assertEqual(self.z.rangeByScore(lo,hi,minEx,maxEx),want)
+                    self.assertEqual(self.z.rangeByScore(lo,hi,minEx,maxEx,2,3),want[2:5])
+
+    def testAdd(self):
+        z = SortedSet()
+        self.assertEqual(z.add("a",1.0),1)
+        self.assertEqual(z.add("a",1.0),0)
+        self.assertEqual(z.add("a",3.0),0)
+        self.assertEqual(z.add("b",2.0),1)
+        self.assertEqual(z.incr("b",5.0),7.0)
+        self.assertEqual(z.incr("c",0.5),0.5)
+        self.assertEqual(list(z),[("c",0.5),("a",3.0),("b",7.0)])
+        self.assertEqual(z.remove("a"),1)
+        self.assertEqual(z.remove("a"),0)
+        self.assertEqual(z.range(0,-1),[("c",0.5),("b",7.0)])
+
+    def testPickle(self):
+        for z in (self.z,SortedSet()):
+            copy = pickle.loads(pickle.dumps(z,pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(list(copy),list(z))
+            copy.add("new",1.0)
+            self.assertEqual(copy.rank("new"),[m for m,s in copy].index("new"))
+
+    def testScores(self):
+        self.assertEqual(formatScore(3.0),"3")
+        self.assertEqual(formatScore(-2.5),"-2.5")
+        self.assertEqual(formatScore(float("inf")),"inf")
+        self.assertEqual(parseBound("(5"),(5.0,True))
+        self.assertEqual(parseBound("-inf"),(float("-inf"),False))
+        self.assertRaises(ERR,parseBound,"nan")
+        self.assertRaises(ERR,parseBound,"x")
+
+if __name__ == "__main__":
+    unittest.main()